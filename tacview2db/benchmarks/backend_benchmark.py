@@ -0,0 +1,271 @@
+"""
+Ingest throughput and dashboard statistics of the SQLite and DuckDB backends.
+
+A synthetic mission (1M events by default) is generated with
+benchmarks.generate_tacview and imported into a new database of each backend,
+timing the database stages (writes, flushes, commits and engagements) apart
+from parsing, which costs the same on both. Each database is then scaled to
+--total events (10M by default) by copying the mission's rows in SQL as new
+missions, which takes minutes where importing them would take hours.
+
+On the scaled databases every named StatsReader query in the README is run
+across all missions and for one mission, followed by a mission's timeline
+and a page of its events, with the result cache off. mission_events across
+all missions is streamed and counted rather than held in memory. The best
+time of --repeat runs is reported, and the results of both engines must
+match.
+
+Run from the tacview2db directory (needs the duckdb package):
+
+    python -m benchmarks.backend_benchmark [-n 1000000] [--total 10000000] [-r 3]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.generate_tacview import generate_tacview
+from models.database import BACKENDS, open_database
+from models.stats import STATS_QUERIES
+from services.profiling import StageProfiler
+from services.tacview_engine import process_tacview_file
+
+# Stages of an import that are spent in the database rather than in parsing.
+DATABASE_STAGES = ("write", "flush", "commit", "engagements")
+
+# Columns shifted for each copy of the mission, by table: the column holding a row id
+# of the table its name starts with. ParentObject.tacview_id holds a SecondaryObject id.
+ID_COLUMNS = {
+    "Mission": {"id": "Mission"},
+    "Event": {"id": "Event", "mission_id": "Mission"},
+    "PrimaryObject": {"id": "PrimaryObject", "event_id": "Event"},
+    "SecondaryObject": {"id": "SecondaryObject", "event_id": "Event"},
+    "ParentObject": {
+        "id": "ParentObject",
+        "event_id": "Event",
+        "tacview_id": "SecondaryObject",
+    },
+    "Engagement": {
+        "id": "Engagement",
+        "mission_id": "Mission",
+        "fired_event_id": "Event",
+        "hit_event_id": "Event",
+        "destroyed_event_id": "Event",
+    },
+}
+
+
+def database_path(directory: str, backend: str) -> str:
+    return os.path.join(
+        directory, f"backend.{'duckdb' if backend == 'duckdb' else 'db'}"
+    )
+
+
+def timed_import(directory: str, backend: str, source: str, profile: str) -> tuple:
+    """
+    Import the file into a new database and return (seconds, seconds in the database stages).
+    """
+    path = database_path(directory, backend)
+    for name in os.listdir(directory):
+        if name.startswith("backend."):
+            os.remove(os.path.join(directory, name))
+    db = open_database(path, backend, profile)
+    profiler = StageProfiler()
+    try:
+        start = time.perf_counter()
+        process_tacview_file(db, source, profiler=profiler)
+        seconds = time.perf_counter() - start
+    finally:
+        db.close_connection()
+    stages = profiler.files[source]["stages"]
+    return seconds, sum(stages.get(stage, 0.0) for stage in DATABASE_STAGES)
+
+
+def scale_database(db, total: int) -> int:
+    """
+    Copy the rows of the imported mission as new missions until the database
+    holds at least total events, with the same SQL on both backends.
+
+    Returns:
+        The number of events in the database
+    """
+    conn = db.conn
+    counts = {
+        table: conn.execute(f'SELECT MAX(id) FROM "{table}"').fetchone()[0] or 0
+        for table in ID_COLUMNS
+    }
+    columns = {
+        table: [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        for table in ID_COLUMNS
+    }
+    copies = -(-total // counts["Event"])
+    for copy in range(1, copies):
+        for table, shifted in ID_COLUMNS.items():
+            values = []
+            for column in columns[table]:
+                if column not in shifted:
+                    values.append(f'"{column}"')
+                elif column == "tacview_id":
+                    offset = copy * counts[shifted[column]]
+                    values.append(
+                        f'CAST(CAST("{column}" AS INTEGER) + {offset} AS TEXT)'
+                    )
+                else:
+                    values.append(f'"{column}" + {copy * counts[shifted[column]]}')
+            conn.execute(
+                f'INSERT INTO "{table}" ({", ".join(columns[table])}) '
+                f'SELECT {", ".join(values)} FROM "{table}" WHERE id <= {counts[table]}'
+            )
+        conn.commit()
+    return conn.execute('SELECT COUNT(*) FROM "Event"').fetchone()[0]
+
+
+def database_size(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for name in os.listdir(directory)
+        if name.startswith("backend.")
+    )
+
+
+def statistics(reader, mission_id: int) -> dict:
+    """
+    Return the functions running each statistic, by label.
+    """
+    runs = {}
+    for name in STATS_QUERIES:
+        if name == "mission_events":
+            runs[f"{name} (all, streamed)"] = lambda name=name: [
+                (sum(1 for _ in reader.stream(name)),)
+            ]
+        else:
+            runs[f"{name} (all)"] = lambda name=name: reader.query(name)
+        runs[f"{name} (mission)"] = lambda name=name: reader.query(name, mission_id)
+    runs["timeline (mission, 60s)"] = lambda: reader.timeline(mission_id, bucket=60)
+    runs["timeline_events (mission, 1000)"] = lambda: reader.timeline_events(
+        mission_id, start=600, limit=1000
+    )
+    return runs
+
+
+def normalised(rows: list) -> list:
+    # Rows tied in a query's ORDER BY may come back in either order, and sums of
+    # floating point values may differ in the last bits.
+    return sorted(
+        (
+            tuple(
+                round(value, 6) if isinstance(value, float) else value for value in row
+            )
+            for row in rows
+        ),
+        key=repr,
+    )
+
+
+def time_statistics(db, repeat: int) -> dict:
+    """
+    Return (best milliseconds, rows) of each statistic, by label.
+    """
+    missions = db.conn.execute('SELECT COUNT(*) FROM "Mission"').fetchone()[0]
+    results = {}
+    with db.stats_reader(cache_size=0) as reader:
+        for label, run in statistics(reader, missions // 2 + 1).items():
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rows = run()
+                milliseconds = (time.perf_counter() - start) * 1000
+                best = milliseconds if best is None else min(best, milliseconds)
+            results[label] = (best, normalised(rows))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-n",
+        "--events",
+        type=int,
+        default=1_000_000,
+        help="Events in the imported mission (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--total",
+        type=int,
+        default=10_000_000,
+        help="Events each database is scaled to for the statistics (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--sqlite-profile",
+        default="safe",
+        choices=("safe", "bulk"),
+        help="SQLite settings profile of the SQLite database (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="Runs per statistic, best kept."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    ingest = {}
+    scaled = {}
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        source = generate_tacview(
+            os.path.join(directory, "mission.xml"), args.events, seed=args.seed
+        )
+        for backend in BACKENDS:
+            backend_directory = os.path.join(directory, backend)
+            os.mkdir(backend_directory)
+            ingest[backend] = timed_import(
+                backend_directory, backend, source, args.sqlite_profile
+            )
+
+            db = open_database(
+                database_path(backend_directory, backend), backend, args.sqlite_profile
+            )
+            try:
+                start = time.perf_counter()
+                events = scale_database(db, args.total)
+                seconds = time.perf_counter() - start
+                results[backend] = time_statistics(db, args.repeat)
+            finally:
+                db.close_connection()
+            scaled[backend] = (events, seconds, database_size(backend_directory))
+
+    print(f"Import of a {args.events} event mission, {os.cpu_count()} CPUs")
+    print(
+        f"{'backend':<8} {'seconds':>8} {'events/s':>9} {'database s':>11} {'database events/s':>18}"
+    )
+    for backend, (seconds, database_seconds) in ingest.items():
+        print(
+            f"{backend:<8} {seconds:>8.2f} {args.events / seconds:>9.0f} "
+            f"{database_seconds:>11.2f} {args.events / database_seconds:>18.0f}"
+        )
+
+    print()
+    for backend, (events, seconds, size) in scaled.items():
+        print(
+            f"{backend}: scaled to {events} events in {seconds:.1f}s, {size / 1e6:.0f} MB"
+        )
+
+    print()
+    print(f"{'statistic':<34} {'sqlite ms':>10} {'duckdb ms':>10} {'speedup':>8}  rows")
+    different = 0
+    for label, (sqlite_ms, sqlite_rows) in results["sqlite"].items():
+        duckdb_ms, duckdb_rows = results["duckdb"][label]
+        match = sqlite_rows == duckdb_rows
+        different += not match
+        print(
+            f"{label:<34} {sqlite_ms:>10.1f} {duckdb_ms:>10.1f} {sqlite_ms / duckdb_ms:>7.1f}x  "
+            f"{len(sqlite_rows)}{'' if match else ' RESULTS DIFFER'}"
+        )
+    return 1 if different else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
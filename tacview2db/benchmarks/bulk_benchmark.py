@@ -0,0 +1,144 @@
+"""
+Campaign load benchmark of the safe and bulk SQLite profiles.
+
+A campaign of synthetic missions (1M events over 10 files by default) is
+generated with benchmarks.generate_tacview and loaded into a new database
+with each profile. One more mission is then imported into the loaded
+database, as an incremental import would be, to show the cost of rebuilding
+the indexes of a large database for a small batch.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.bulk_benchmark [-n 1000000] [--files 10] [--normalised]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.generate_tacview import generate_tacview
+from models.database import Database
+from models.schema import normalise_storage
+from services.tacview_engine import process_all_tacview_files
+
+from config import PRAGMA_PROFILES
+
+
+def generate_campaign(directory: str, events: int, files: int, seed: int) -> list:
+    """
+    Write `files` synthetic missions sharing `events` events between them.
+    Each file has its own seed, so each is a different mission.
+    """
+    per_file = max(events // files, 1)
+    return [
+        generate_tacview(
+            os.path.join(directory, f"mission_{number:03d}.xml"),
+            per_file,
+            seed=seed + number,
+        )
+        for number in range(files)
+    ]
+
+
+def timed_import(database_file: str, profile: str, files: list) -> float:
+    db = Database(database_file, profile)
+    start = time.perf_counter()
+    processed, total = process_all_tacview_files(db, False, files)
+    seconds = time.perf_counter() - start
+    db.close_connection()
+    if processed != total:
+        raise RuntimeError(f"{total - processed} files failed to import.")
+    return seconds
+
+
+def benchmark_profile(
+    profile: str, campaign: list, extra_file: str, events: int, normalised: bool
+) -> dict:
+    """
+    Load the campaign into a new database with a profile, then import one more file.
+    """
+    database_file = os.path.join(os.path.dirname(extra_file), f"{profile}.db")
+    if normalised:
+        db = Database(database_file)
+        normalise_storage(db.conn)
+        db.close_connection()
+
+    load_seconds = timed_import(database_file, profile, campaign)
+    extra_seconds = timed_import(database_file, profile, [extra_file])
+    result = {
+        "profile": profile,
+        "load_seconds": round(load_seconds, 3),
+        "events_per_second": round(events / load_seconds, 1),
+        "incremental_seconds": round(extra_seconds, 3),
+        "db_size_mb": round(os.path.getsize(database_file) / 1e6, 3),
+    }
+    for path in glob.glob(database_file + "*"):
+        os.remove(path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-n",
+        "--events",
+        type=int,
+        default=1_000_000,
+        help="Events in the whole campaign (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        default=10,
+        help="Missions the campaign is split into (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--normalised",
+        action="store_true",
+        help="Load into databases using normalised object storage.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Generating {args.events} events in {args.files} files...")
+        campaign = generate_campaign(directory, args.events, args.files, args.seed)
+        extra_file = generate_tacview(
+            os.path.join(directory, "incremental.xml"),
+            max(args.events // args.files, 1),
+            seed=args.seed + args.files,
+        )
+        size_mb = sum(os.path.getsize(file) for file in campaign) / 1e6
+
+        results = [
+            benchmark_profile(
+                profile, campaign, extra_file, args.events, args.normalised
+            )
+            for profile in PRAGMA_PROFILES
+        ]
+
+    print(f"Campaign: {args.events} events, {args.files} files, {size_mb:.1f} MB")
+    print(
+        f"{'profile':<8} {'load s':>9} {'events/s':>10} {'+1 file s':>10} {'DB MB':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['profile']:<8} {result['load_seconds']:>9.2f} "
+            f"{result['events_per_second']:>10.0f} {result['incremental_seconds']:>10.2f} "
+            f"{result['db_size_mb']:>8.2f}"
+        )
+    safe, bulk = (
+        next(result for result in results if result["profile"] == name)
+        for name in ("safe", "bulk")
+    )
+    print(f"Bulk load speedup: {safe['load_seconds'] / bulk['load_seconds']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Kill -9 harness for checkpointed imports.
+
+A synthetic mission (200k events by default) is imported once in a single
+transaction as the reference. It is then imported into a second database
+by a child process that is killed with SIGKILL at a random moment, over and
+over, with each run resuming the last one. After every kill the database is
+checked:
+
+  - PRAGMA integrity_check and foreign_key_check pass
+  - every mission is either complete (in the import manifest) or is the
+    file's checkpointed mission, holding exactly the events its checkpoint
+    counts, so no batch was ever half written
+  - every event has its primary object
+
+Once the kills are done the import is run to the end, and every row of the
+mission, event, object and engagement tables must match the reference.
+
+Run from the tacview2db directory (SIGKILL needs a POSIX system):
+
+    python -m benchmarks.crash_harness [-n 200000] [--kills 10] [--checkpoint 5000] [--gzip]
+"""
+
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import random
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generate_tacview import generate_tacview
+
+# Tables compared with the reference. ImportManifest holds the time of the import, so is left out.
+COMPARED_TABLES = (
+    "Mission",
+    "Event",
+    "PrimaryObject",
+    "SecondaryObject",
+    "ParentObject",
+    "Engagement",
+)
+
+
+def run_import(database_file: str, source: str, checkpoint: int):
+    """
+    Child process: import the file as the command line does, with the given checkpoint interval.
+    """
+    from models.database import Database
+    from services.tacview_engine import process_all_tacview_files
+
+    logging.disable(logging.CRITICAL)
+    db = Database(database_file)
+    try:
+        files, _ = process_all_tacview_files(
+            db, False, [source], quiet=True, checkpoint_events=checkpoint
+        )
+    finally:
+        db.close_connection()
+    return 0 if files == 1 else 1
+
+
+def start_import(database_file: str, source: str, checkpoint: int):
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.crash_harness",
+            "--child",
+            database_file,
+            source,
+            str(checkpoint),
+        ]
+    )
+
+
+def check_database(database_file: str) -> tuple:
+    """
+    Check the invariants of a database left by a killed import.
+
+    Returns:
+        A tuple of (committed events of the checkpointed mission or None, list of problems)
+    """
+    problems = []
+    conn = sqlite3.connect(database_file)
+    try:
+        if conn.execute("PRAGMA integrity_check").fetchone()[0] != "ok":
+            problems.append("integrity_check failed")
+        if conn.execute("PRAGMA foreign_key_check").fetchall():
+            problems.append("foreign_key_check found orphaned rows")
+
+        tables = {
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        if "Mission" not in tables:
+            # Killed before the schema was committed.
+            return None, problems
+        complete = set()
+        if "ImportManifest" in tables:
+            complete = {
+                row[0] for row in conn.execute("SELECT mission_id FROM ImportManifest")
+            }
+        checkpoints = []
+        if "ImportCheckpoint" in tables:
+            checkpoints = conn.execute(
+                "SELECT mission_id, events FROM ImportCheckpoint"
+            ).fetchall()
+
+        committed = None
+        for (mission_id,) in conn.execute("SELECT id FROM Mission"):
+            events = conn.execute(
+                "SELECT COUNT(*) FROM Event WHERE mission_id = ?", (mission_id,)
+            ).fetchone()[0]
+            checkpoint = [
+                events for mission, events in checkpoints if mission == mission_id
+            ]
+            if mission_id in complete:
+                continue
+            if not checkpoint:
+                problems.append(
+                    f"mission {mission_id} has {events} events but no manifest entry or checkpoint"
+                )
+            elif checkpoint[0] != events:
+                problems.append(
+                    f"mission {mission_id} has {events} events, its checkpoint counts {checkpoint[0]}"
+                )
+            else:
+                committed = events
+
+        missing = conn.execute(
+            "SELECT COUNT(*) FROM Event WHERE id NOT IN (SELECT event_id FROM PrimaryObject)"
+        ).fetchone()[0]
+        if missing:
+            problems.append(f"{missing} events have no primary object")
+    finally:
+        conn.close()
+    return committed, problems
+
+
+def table_digests(database_file: str) -> dict:
+    """
+    Return a SHA-256 of every row, in id order, of each compared table.
+    """
+    digests = {}
+    conn = sqlite3.connect(database_file)
+    try:
+        for table in COMPARED_TABLES:
+            digest = hashlib.sha256()
+            for row in conn.execute(f"SELECT * FROM {table} ORDER BY id"):
+                digest.update(repr(row).encode("utf-8"))
+            digests[table] = digest.hexdigest()
+    finally:
+        conn.close()
+    return digests
+
+
+def timed_import(database_file: str, source: str, checkpoint: int) -> float:
+    start = time.perf_counter()
+    child = start_import(database_file, source, checkpoint)
+    if child.wait() != 0:
+        raise RuntimeError(f"Import into {database_file} failed")
+    return time.perf_counter() - start
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        return run_import(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-n",
+        "--events",
+        type=int,
+        default=200_000,
+        help="Events in the mission (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--kills",
+        type=int,
+        default=10,
+        help="Times the import is killed before it is run to the end (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=int,
+        default=5000,
+        metavar="EVENTS",
+        help="Events between checkpoints (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--gzip", action="store_true", help="Import the mission gzip compressed."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    randomness = random.Random(args.seed)
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        source = generate_tacview(
+            os.path.join(directory, "mission.xml"), args.events, seed=args.seed
+        )
+        if args.gzip:
+            with open(source, "rb") as plain, gzip.open(source + ".gz", "wb") as packed:
+                shutil.copyfileobj(plain, packed)
+            source += ".gz"
+
+        reference_file = os.path.join(directory, "reference.db")
+        full_seconds = timed_import(reference_file, source, 0)
+        print(
+            f"Reference: {args.events} events imported in one transaction in {full_seconds:.2f}s"
+        )
+
+        database_file = os.path.join(directory, "killed.db")
+        print(f"{'kill':>4} {'after':>7} {'committed':>10}  check")
+        committed = 0
+        for kill in range(1, args.kills + 1):
+            child = start_import(database_file, source, args.checkpoint)
+            # Killed somewhere in what is left of the import, as each run resumes the last.
+            remaining = full_seconds * (1 - (committed or 0) / args.events)
+            delay = randomness.uniform(0.05, max(remaining, 0.1))
+            try:
+                child.wait(timeout=delay)
+                print(f"{kill:>4} {'-':>7} {'-':>10}  finished before the kill")
+                break
+            except subprocess.TimeoutExpired:
+                os.kill(child.pid, signal.SIGKILL)
+                child.wait()
+            committed, problems = check_database(database_file)
+            failures += bool(problems)
+            print(
+                f"{kill:>4} {delay:>6.2f}s {committed if committed is not None else '-':>10}  "
+                f"{'; '.join(problems) or 'OK'}"
+            )
+
+        resume_seconds = timed_import(database_file, source, args.checkpoint)
+        committed, problems = check_database(database_file)
+        failures += bool(problems)
+        print(
+            f"Final run finished in {resume_seconds:.2f}s: {'; '.join(problems) or 'OK'}"
+        )
+
+        reference = table_digests(reference_file)
+        resumed = table_digests(database_file)
+        different = [
+            table for table in COMPARED_TABLES if reference[table] != resumed[table]
+        ]
+        failures += bool(different)
+        print(
+            "Rows match the reference import."
+            if not different
+            else f"Rows differ from the reference import in {', '.join(different)}."
+        )
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark of per-event field extraction.
+
+Compares building the Event, Primary, Secondary and Parent model objects for
+each <Event> element (the original approach, several find() calls per field)
+with the single-pass extract_event() used by the engine.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.extraction_benchmark [file.xml ...]
+"""
+
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from models.event import Event
+from models.primary import Primary
+from models.secondary import Secondary
+from models.parent import Parent
+from models.records import extract_event
+
+SAMPLE_FILES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "sample_data_files",
+    "*.xml",
+)
+
+
+def extract_with_models(event):
+    event_obj = Event(event)
+    primary_obj = Primary(event)
+    secondary_obj = parent_obj = None
+    if Secondary.xml_object_exists(event):
+        secondary_obj = Secondary(event)
+        if Parent.xml_object_exists(event):
+            parent_obj = Parent(event)
+    return event_obj, primary_obj, secondary_obj, parent_obj
+
+
+def time_extraction(extract, events, repeat: int) -> float:
+    """
+    Return the best CPU time per event in microseconds over several runs.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        for event in events:
+            extract(event)
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(events) * 1_000_000
+
+
+def retained_bytes(extract, events) -> float:
+    """
+    Return the memory held per event when every extracted result is kept,
+    as happens when results are sent back from worker processes.
+    """
+    tracemalloc.start()
+    results = [extract(event) for event in events]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del results
+    return size / len(events)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="*", help="Tacview XML files to extract.")
+    parser.add_argument("-r", "--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    events = []
+    for file in args.files or sorted(glob.glob(SAMPLE_FILES)):
+        events.extend(ET.parse(file).getroot().find("Events").findall("Event"))
+
+    before = time_extraction(extract_with_models, events, args.repeat)
+    after = time_extraction(extract_event, events, args.repeat)
+    before_bytes = retained_bytes(extract_with_models, events)
+    after_bytes = retained_bytes(extract_event, events)
+
+    print(f"Events:             {len(events)}")
+    print(f"Model objects:      {before:8.2f} us/event {before_bytes:8.0f} bytes/event")
+    print(f"extract_event():    {after:8.2f} us/event {after_bytes:8.0f} bytes/event")
+    print(f"Speedup:            {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Generate synthetic Tacview XML debriefings for benchmarking.
+
+The output has the same structure as a Tacview export: a FlightRecording and
+Mission header followed by <Event> elements. Each event has a PrimaryObject
+and, depending on the action, a SecondaryObject (the weapon, the airport, or
+the shooter of a kill) and a ParentObject (the shooter of a hit). Hits are
+mostly by weapons fired earlier in the mission and kills mostly follow a hit,
+so the engagements built from a file have misses, hits and kills as a real
+one does. Events are written as they are generated, and only a bounded pool
+of recent launches and hits is kept, so files with millions of events need no
+more memory than small ones.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.generate_tacview out.xml -n 100000 [--mix HasFired=3,HasLanded=1]
+"""
+
+import argparse
+import random
+from xml.sax.saxutils import escape
+
+# Relative frequency of each action, roughly as found in the sample files.
+DEFAULT_ACTION_MIX = {
+    "HasFired": 30,
+    "HasBeenDestroyed": 29,
+    "HasBeenHitBy": 17,
+    "HasEnteredTheArea": 10,
+    "HasTakenOff": 6,
+    "HasLanded": 5,
+    "HasLeftTheArea": 3,
+}
+
+_AIRCRAFT = (
+    ("Aircraft", "F/A-18C Hornet", "Enemies", "us"),
+    ("Aircraft", "F-16C Fighting Falcon", "Enemies", "us"),
+    ("Aircraft", "A-10C Thunderbolt II", "Enemies", "us"),
+    ("Aircraft", "MiG-29S Fulcrum-C", "Allies", "ru"),
+    ("Aircraft", "Su-25 Frogfoot", "Allies", "ru"),
+    ("Helicopter", "Mi-24V Hind-E", "Allies", "ru"),
+)
+_GROUND = (
+    ("SAM/AAA", "SA-18 Grouse", "Allies", "ru"),
+    ("SAM/AAA", "SA-11 Buk LN 9A310M1", "Allies", "ru"),
+    ("Tank", "T-72B", "Allies", "ru"),
+    ("Vehicle", "BTR-80", "Allies", "ru"),
+)
+_WEAPONS = (
+    ("Missile", "AIM-120C AMRAAM"),
+    ("Missile", "AIM-9X Sidewinder"),
+    ("Missile", "AGM-65D Maverick"),
+    ("Bomb", "GBU-12 Paveway II"),
+    ("Missile", "R-73 Archer"),
+    ("Shell", "30mm HEI"),
+)
+_AIRPORTS = (
+    ("Airport", "Incirlik", "Enemies", "us"),
+    ("Airport", "Aleppo", "Allies", "ru"),
+)
+
+# Recent launches and hits kept for later hits and kills to refer to.
+_POOL_SIZE = 1000
+
+# Share of hits by a weapon whose launch was not recorded, and of kills with no known killer.
+_UNRECORDED_LAUNCHES = 0.1
+_UNKNOWN_KILLERS = 0.1
+
+
+def parse_action_mix(text: str) -> dict:
+    """
+    Parse "HasFired=3,HasLanded=1" into {"HasFired": 3, "HasLanded": 1}.
+    """
+    mix = {}
+    for item in text.split(","):
+        action, _, weight = item.partition("=")
+        mix[action.strip()] = float(weight or 1)
+    return mix
+
+
+class TacviewGenerator:
+    """
+    Writes one synthetic debriefing. A fixed seed always produces the same file.
+    """
+
+    def __init__(
+        self,
+        events: int,
+        action_mix: dict = None,
+        secondary: bool = True,
+        parent: bool = True,
+        seed: int = 0,
+        pilots: int = 40,
+    ):
+        self.events = events
+        self.action_mix = action_mix or DEFAULT_ACTION_MIX
+        self.secondary = secondary
+        self.parent = parent and secondary
+        self.random = random.Random(seed)
+        self.seed = seed
+        # Each pilot flies one airframe in one group for the whole mission.
+        self.units = [
+            (
+                100 + number,
+                *self.random.choice(_AIRCRAFT),
+                f"Pilot {number}",
+                f"Flight {number // 4}",
+            )
+            for number in range(pilots)
+        ] + [
+            (
+                1000 + number,
+                *self.random.choice(_GROUND),
+                "n/a",
+                f"Ground {number // 8}",
+            )
+            for number in range(pilots * 2)
+        ]
+        self.aircraft = self.units[:pilots]
+        self.next_weapon_id = 100000
+        # (weapon, shooter) of launches not yet hit, and (target, shooter) of hits not yet a kill.
+        self.launches = []
+        self.hits = []
+
+    def write(self, file):
+        """
+        Write the debriefing to a text file object.
+        """
+        file.write(self._header())
+        actions = list(self.action_mix)
+        weights = list(self.action_mix.values())
+        time = 0.0
+        for action in self.random.choices(actions, weights, k=self.events):
+            time += self.random.uniform(0.1, 5.0)
+            file.write(self._event(time, action))
+        file.write("\t</Events>\n</TacviewDebriefing>\n")
+
+    def _header(self) -> str:
+        return (
+            '<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n'
+            '<TacviewDebriefing Version="1.2.6">\n'
+            "\t<FlightRecording>\n"
+            "\t\t<Source>DCS 2.8.3.37854</Source>\n"
+            "\t\t<Recorder>tacview2db benchmark generator</Recorder>\n"
+            "\t\t<RecordingTime>2023-03-21T09:23:40.249Z</RecordingTime>\n"
+            "\t\t<Author>benchmark</Author>\n"
+            "\t</FlightRecording>\n"
+            "\t<Mission>\n"
+            f"\t\t<Title>Synthetic {self.events} events seed {self.seed}</Title>\n"
+            "\t\t<MissionTime>2023-06-01T16:15:00Z</MissionTime>\n"
+            f"\t\t<Duration>{self.events * 2.5:.2f}</Duration>\n"
+            "\t</Mission>\n"
+            "\t<Events>\n"
+        )
+
+    def _event(self, time: float, action: str) -> str:
+        choice = self.random.choice
+        aircraft = self.aircraft
+        secondary = parent = None
+
+        if action == "HasFired":
+            primary = choice(aircraft)
+            secondary = self._weapon(primary)
+            self._keep(self.launches, (secondary, primary))
+        elif action == "HasBeenHitBy":
+            primary = choice(self.units)
+            if self.launches and self.random.random() >= _UNRECORDED_LAUNCHES:
+                secondary, parent = self._take(self.launches)
+            else:
+                parent = choice(aircraft)
+                secondary = self._weapon(parent)
+            self._keep(self.hits, (primary, parent))
+        elif action == "HasBeenDestroyed":
+            # As in Tacview's exports, the secondary object of a kill is the killer.
+            if self.hits:
+                primary, secondary = self._take(self.hits)
+            else:
+                primary, secondary = choice(self.units), choice(aircraft)
+            if self.random.random() < _UNKNOWN_KILLERS:
+                secondary = None
+        elif action in ("HasTakenOff", "HasLanded"):
+            primary = choice(aircraft)
+            airport = self.random.randrange(len(_AIRPORTS))
+            secondary = (10 + airport, *_AIRPORTS[airport], None, None)
+        else:
+            primary = choice(aircraft)
+
+        parts = [
+            "\t\t<Event>\n",
+            f"\t\t\t<Time>{time:.2f}</Time>\n",
+            self._object("PrimaryObject", primary),
+            f"\t\t\t<Action>{action}</Action>\n",
+        ]
+        if secondary and self.secondary:
+            parts.append(self._object("SecondaryObject", secondary))
+            if parent and self.parent:
+                parts.append(self._object("ParentObject", parent))
+        parts.append("\t\t</Event>\n")
+        return "".join(parts)
+
+    def _keep(self, pool: list, item: tuple):
+        # Once the pool is full, a random entry makes way, so its memory stays bounded.
+        if len(pool) < _POOL_SIZE:
+            pool.append(item)
+        else:
+            pool[self.random.randrange(_POOL_SIZE)] = item
+
+    def _take(self, pool: list) -> tuple:
+        index = self.random.randrange(len(pool))
+        pool[index], pool[-1] = pool[-1], pool[index]
+        return pool.pop()
+
+    def _weapon(self, shooter: tuple) -> tuple:
+        self.next_weapon_id += 1
+        weapon_type, weapon_name = self.random.choice(_WEAPONS)
+        return (
+            self.next_weapon_id,
+            weapon_type,
+            weapon_name,
+            shooter[3],
+            shooter[4],
+            None,
+            None,
+            shooter[0],
+        )
+
+    @staticmethod
+    def _object(tag: str, unit: tuple) -> str:
+        object_id, object_type, name, coalition, country, pilot, group, *parent = unit
+        lines = [f'\t\t\t<{tag} ID="{object_id}">\n']
+        for element, value in (
+            ("Type", object_type),
+            ("Name", name),
+            ("Pilot", pilot),
+            ("Coalition", coalition),
+            ("Country", country),
+            ("Group", group),
+            ("Parent", parent[0] if parent else None),
+        ):
+            if value is not None:
+                lines.append(f"\t\t\t\t<{element}>{escape(str(value))}</{element}>\n")
+        lines.append(f"\t\t\t</{tag}>\n")
+        return "".join(lines)
+
+
+def generate_tacview(
+    filename: str,
+    events: int,
+    action_mix: dict = None,
+    secondary: bool = True,
+    parent: bool = True,
+    seed: int = 0,
+) -> str:
+    """
+    Write a synthetic Tacview XML debriefing.
+
+    Args:
+        filename: Path of the XML file to write
+        events: Number of <Event> elements
+        action_mix: Relative weight of each action (defaults to DEFAULT_ACTION_MIX)
+        secondary: Include SecondaryObject elements for weapons and airports
+        parent: Include ParentObject elements for the shooter of a hit
+        seed: Random seed, the same seed always produces the same file
+
+    Returns:
+        The filename
+    """
+    generator = TacviewGenerator(events, action_mix, secondary, parent, seed)
+    with open(filename, "w", encoding="utf-8", buffering=1024 * 1024) as file:
+        generator.write(file)
+    return filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("output", help="The XML file to write.")
+    parser.add_argument("-n", "--events", type=int, default=10000)
+    parser.add_argument(
+        "--mix",
+        type=parse_action_mix,
+        help="Action weights, e.g. HasFired=3,HasBeenHitBy=2,HasLanded=1.",
+    )
+    parser.add_argument(
+        "--no-secondary",
+        action="store_true",
+        help="Only write primary objects.",
+    )
+    parser.add_argument(
+        "--no-parent", action="store_true", help="Do not write parent objects."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_tacview(
+        args.output,
+        args.events,
+        args.mix,
+        not args.no_secondary,
+        not args.no_parent,
+        args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
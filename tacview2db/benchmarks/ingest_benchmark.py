@@ -0,0 +1,244 @@
+"""
+End-to-end ingest benchmark on synthetic Tacview files.
+
+For each event count a file is generated with benchmarks.generate_tacview and
+imported into a new database with process_all_tacview_files, in a separate
+process so peak memory is measured per run. Reports events/s, MB/s of XML,
+peak RSS and the final database size, and saves them as JSON.
+
+With --baseline the run is compared to an earlier JSON file and the exit code
+is 1 if events/s dropped by more than --threshold for any event count.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.ingest_benchmark [--sizes 1000,10000] [-o results.json]
+    python -m benchmarks.ingest_benchmark --baseline results.json --threshold 0.1
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.generate_tacview import generate_tacview
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_OUTPUT = "ingest_benchmark.json"
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident set size of this process in MB, or None where
+    the resource module is not available (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return round(peak / 1e6 if sys.platform == "darwin" else peak / 1e3, 1)
+
+
+def run_import(xml_file: str, database_file: str, jobs: int):
+    """
+    Import one file into a new database and print the timing as JSON.
+    Runs in the child process started by benchmark_size().
+    """
+    from models.database import Database
+    from services.tacview_engine import process_all_tacview_files
+
+    logging.disable(logging.CRITICAL)
+    db = Database(database_file)
+    start = time.perf_counter()
+    processed, _ = process_all_tacview_files(db, False, [xml_file], jobs)
+    seconds = time.perf_counter() - start
+    db.close_connection()
+    print(
+        json.dumps(
+            {"seconds": seconds, "processed": processed, "peak_rss_mb": peak_rss_mb()}
+        )
+    )
+
+
+def import_in_child(xml_file: str, database_file: str, jobs: int) -> dict:
+    """
+    Import a file into a new database in a child process and return its measurements.
+    """
+    if os.path.exists(database_file):
+        os.remove(database_file)
+    child = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.ingest_benchmark",
+            "--run",
+            xml_file,
+            database_file,
+            "--jobs",
+            str(jobs),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+        text=True,
+    )
+    measured = json.loads(child.stdout.splitlines()[-1])
+    if measured["processed"] != 1:
+        raise RuntimeError(f"Import of {xml_file} failed.")
+    return measured
+
+
+def benchmark_size(
+    events: int, directory: str, jobs: int, seed: int, repeat: int
+) -> dict:
+    """
+    Generate a file with `events` events, import it in a child process and
+    return the measurements. With repeat > 1 the fastest import is reported.
+    """
+    xml_file = os.path.join(directory, f"synthetic_{events}.xml")
+    database_file = os.path.join(directory, f"synthetic_{events}.db")
+    generate_tacview(xml_file, events, seed=seed)
+
+    runs = [import_in_child(xml_file, database_file, jobs) for _ in range(repeat)]
+    measured = min(runs, key=lambda run: run["seconds"])
+
+    xml_size = os.path.getsize(xml_file)
+    result = {
+        "events": events,
+        "seconds": round(measured["seconds"], 4),
+        "events_per_second": round(events / measured["seconds"], 1),
+        "mb_per_second": round(xml_size / 1e6 / measured["seconds"], 3),
+        "xml_size_mb": round(xml_size / 1e6, 3),
+        "peak_rss_mb": measured["peak_rss_mb"],
+        "db_size_mb": round(os.path.getsize(database_file) / 1e6, 3),
+    }
+    os.remove(xml_file)
+    os.remove(database_file)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def check_regressions(results: list[dict], baseline: dict, threshold: float) -> list:
+    """
+    Compare events/s with a baseline run.
+
+    Returns:
+        A list of (events, baseline events/s, current events/s) that regressed by more than threshold
+    """
+    baseline_rates = {
+        result["events"]: result["events_per_second"] for result in baseline["results"]
+    }
+    regressions = []
+    for result in results:
+        previous = baseline_rates.get(result["events"])
+        if previous and result["events_per_second"] < previous * (1 - threshold):
+            regressions.append(
+                (result["events"], previous, result["events_per_second"])
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [int(size) for size in text.split(",")],
+        default=DEFAULT_SIZES,
+        help="Comma separated event counts (default: 1000,10000,100000,1000000).",
+    )
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=1,
+        help="Import each file this many times and keep the fastest run.",
+    )
+    parser.add_argument("--baseline", help="Earlier results file to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Allowed drop in events/s against the baseline (default: %(default)s).",
+    )
+    parser.add_argument("--run", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_import(*args.run, args.jobs)
+        return 0
+
+    results = []
+    print(
+        f"{'events':>10} {'seconds':>9} {'events/s':>10} {'MB/s':>7} {'RSS MB':>8} {'DB MB':>8}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for events in args.sizes:
+            result = benchmark_size(
+                events, directory, args.jobs, args.seed, args.repeat
+            )
+            results.append(result)
+            rss = result["peak_rss_mb"]
+            print(
+                f"{events:>10} {result['seconds']:>9.2f} {result['events_per_second']:>10.0f} "
+                f"{result['mb_per_second']:>7.2f} {rss if rss is not None else 'n/a':>8} "
+                f"{result['db_size_mb']:>8.2f}"
+            )
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "jobs": args.jobs,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    # Read the baseline before writing, it may be the same file.
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if baseline:
+        regressions = check_regressions(results, baseline, args.threshold)
+        for events, previous, current in regressions:
+            print(
+                f"REGRESSION {events} events: {current:.0f} events/s, "
+                f"baseline {previous:.0f} ({baseline.get('commit')})"
+            )
+        if regressions:
+            return 1
+        print(f"No regression beyond {args.threshold:.0%} against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Cost of logging at DEBUG level to an import, and of a message logged per event.
+
+A synthetic mission (100k events by default) is generated with
+benchmarks.generate_tacview and imported into a new database with logging
+turned off, with the synchronous FileHandler at DEBUG level that
+setup_logging used to attach, and through start_logging's queue and
+background writer at DEBUG level as the command line now logs. The three
+settings take turns, in a different order each round, and the median of
+--repeat imports of each is reported with its difference from no logging.
+
+On a shared host imports vary by more than logging costs, so the budget is
+checked against the work DEBUG logging adds to the writer thread, timed on
+its own: the progress summaries, which wrap every event, and the records
+logged, at the measured cost of a record. The script exits with an error
+if that is more than --budget percent of the import.
+
+It also logs one DEBUG message per event from a single line of code, as a
+per-event message in the writer would, both to the synchronous handler and
+through the queue with its rate limit, and reports the cost per message.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.logging_benchmark [-n 100000] [-r 6] [--budget 3]
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from benchmarks.generate_tacview import generate_tacview
+from models.database import Database
+from models.tacview_logging import start_logging, stop_logging
+from services.tacview_engine import log_progress, process_tacview_file, report_progress
+
+MODES = ("off", "file", "queue")
+
+FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+
+def file_handler(log_file: str) -> logging.Handler:
+    handler = logging.FileHandler(log_file, mode="w")
+    handler.setFormatter(logging.Formatter(FORMAT, "%Y-%m-%d %H:%M:%S"))
+    return handler
+
+
+def configure(mode: str, log_file: str):
+    """
+    Set up logging as mode: "off", "file" (synchronous FileHandler) or "queue" (start_logging).
+    """
+    stop_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    logging.disable(logging.CRITICAL if mode == "off" else logging.NOTSET)
+    if mode == "file":
+        root.addHandler(file_handler(log_file))
+        root.setLevel(logging.DEBUG)
+    elif mode == "queue":
+        start_logging([file_handler(log_file)], logging.DEBUG)
+
+
+def finish(mode: str) -> None:
+    # The queued records are written before the time is taken, so their cost is counted.
+    if mode == "queue":
+        stop_logging()
+    else:
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+
+
+def count_lines(log_file: str) -> int:
+    if not os.path.exists(log_file):
+        return 0
+    with open(log_file, "rb") as log:
+        return sum(1 for _ in log)
+
+
+def timed_import(directory: str, source: str, mode: str) -> tuple:
+    """
+    Import the file into a new database and return (seconds, lines logged).
+    """
+    database_file = os.path.join(directory, "logging.db")
+    log_file = os.path.join(directory, f"{mode}.log")
+    if os.path.exists(database_file):
+        os.remove(database_file)
+    db = Database(database_file)
+    configure(mode, log_file)
+    try:
+        start = time.perf_counter()
+        process_tacview_file(db, source)
+        finish(mode)
+        seconds = time.perf_counter() - start
+    finally:
+        configure("off", log_file)
+        db.close_connection()
+    return seconds, count_lines(log_file)
+
+
+def timed_messages(directory: str, mode: str, messages: int) -> tuple:
+    """
+    Log a DEBUG message per event from one line and return (seconds, lines logged).
+    """
+    log_file = os.path.join(directory, f"messages-{mode}.log")
+    configure(mode, log_file)
+    start = time.perf_counter()
+    for event in range(messages):
+        logging.debug(f"Event {event} written.")
+    finish(mode)
+    seconds = time.perf_counter() - start
+    configure("off", log_file)
+    return seconds, count_lines(log_file)
+
+
+def timed_progress(directory: str, events: int, repeat: int) -> float:
+    """
+    Return the seconds the DEBUG progress summaries add to passing a file's events to the writer.
+    """
+    log_file = os.path.join(directory, "progress.log")
+    records = [None] * events
+    stream = SimpleNamespace(bytes_read=0)
+    configure("queue", log_file)
+    bare = wrapped = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in iter(records):
+            pass
+        seconds = time.perf_counter() - start
+        bare = seconds if bare is None else min(bare, seconds)
+
+        start = time.perf_counter()
+        for _ in report_progress(iter(records), stream, log_progress("mission.xml")):
+            pass
+        seconds = time.perf_counter() - start
+        wrapped = seconds if wrapped is None else min(wrapped, seconds)
+    finish("queue")
+    configure("off", log_file)
+    return wrapped - bare
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-n",
+        "--events",
+        type=int,
+        default=100_000,
+        help="Events in the mission (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=6,
+        help="Imports per setting, the median is kept (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=3.0,
+        help="Highest overhead of queued DEBUG logging, in percent (default: %(default)s).",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    messages = {}
+    with tempfile.TemporaryDirectory() as directory:
+        source = generate_tacview(
+            os.path.join(directory, "mission.xml"), args.events, seed=args.seed
+        )
+        # Settings take turns, so a slow spell of the host is shared between them.
+        runs = {mode: [] for mode in MODES}
+        for number in range(args.repeat):
+            for mode in MODES[number % 3 :] + MODES[: number % 3]:
+                runs[mode].append(timed_import(directory, source, mode))
+        imports = {
+            mode: (
+                statistics.median(seconds for seconds, _ in results),
+                results[0][1],
+            )
+            for mode, results in runs.items()
+        }
+
+        for mode in ("file", "queue"):
+            messages[mode] = timed_messages(directory, mode, args.events)
+        progress_seconds = timed_progress(directory, args.events, args.repeat)
+
+    print(f"Import of a {args.events} event mission, {os.cpu_count()} CPUs")
+    print(f"{'logging':<8} {'seconds':>8} {'events/s':>9} {'overhead':>9} {'lines':>6}")
+    baseline = imports["off"][0]
+    for mode, (seconds, lines) in imports.items():
+        print(
+            f"{mode:<8} {seconds:>8.2f} {args.events / seconds:>9.0f} "
+            f"{(seconds / baseline - 1) * 100:>8.1f}% {lines:>6}"
+        )
+
+    print()
+    print(f"One DEBUG message per event, {args.events} messages")
+    print(f"{'logging':<8} {'seconds':>8} {'us/message':>11} {'lines':>6}")
+    for mode, (seconds, lines) in messages.items():
+        print(
+            f"{mode:<8} {seconds:>8.2f} {seconds / args.events * 1e6:>11.1f} {lines:>6}"
+        )
+
+    # A record that is written costs at most what the synchronous handler takes for one.
+    record_seconds = max(seconds for seconds, _ in messages.values()) / args.events
+    lines = imports["queue"][1]
+    added = progress_seconds + lines * record_seconds
+    overhead = added / baseline * 100
+    print()
+    print(
+        f"Writer thread work of DEBUG logging: {progress_seconds * 1000:.1f} ms of progress "
+        f"summaries and {lines} records at {record_seconds * 1e6:.1f} us, "
+        f"{overhead:.2f}% of the import"
+    )
+    if overhead > args.budget:
+        print(f"That is over the {args.budget}% budget.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
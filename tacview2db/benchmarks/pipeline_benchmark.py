@@ -0,0 +1,158 @@
+"""
+Import throughput of the parse/write pipeline by queue depth and batch size.
+
+A synthetic mission (200k events by default) is generated with
+benchmarks.generate_tacview, optionally gzip compressed, and imported into a
+new database with each pipeline setting: depth 0 parses and writes in
+lock-step in one thread, as before the pipeline, and the others parse in a
+thread of their own ahead of the writer. For each setting the best of
+--repeat imports is reported with its events/s, the time the parser and the
+writer each spent stalled on the other, the mean and peak queue occupancy
+and the peak bytes of parsed events buffered.
+
+Parsing and writing only overlap while SQLite or the decompressor has
+released the GIL, and only on a host with a core for each.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.pipeline_benchmark [-n 200000] [--gzip] [--settings 0 2x1000 8x1000 8x5000] [-r 3]
+"""
+
+import argparse
+import gzip
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.generate_tacview import generate_tacview
+from models.database import Database
+from services.profiling import StageProfiler
+from services.tacview_engine import process_tacview_file
+
+from config import PIPELINE_BATCH_SIZE
+
+DEFAULT_SETTINGS = ("0", "2x1000", "8x1000", "8x5000", "32x250")
+
+
+def parse_setting(setting: str) -> tuple[int]:
+    """
+    Parse "DEPTHxBATCH", or "DEPTH" with the configured batch size.
+    """
+    depth, _, batch = setting.partition("x")
+    return int(depth), int(batch) if batch else PIPELINE_BATCH_SIZE
+
+
+def timed_import(
+    directory: str, source: str, depth: int, batch: int, profile: str
+) -> tuple:
+    """
+    Import the file into a new database and return (seconds, pipeline report or None).
+    The pipeline figures are taken from a StageProfiler, which times every
+    setting alike.
+    """
+    database_file = os.path.join(directory, "pipeline.db")
+    for path in (database_file, database_file + "-wal", database_file + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    db = Database(database_file, profile)
+    profiler = StageProfiler()
+    try:
+        start = time.perf_counter()
+        process_tacview_file(
+            db,
+            source,
+            profiler=profiler,
+            pipeline_depth=depth,
+            pipeline_batch=batch,
+        )
+        seconds = time.perf_counter() - start
+    finally:
+        db.close_connection()
+    return seconds, profiler.files[source].get("pipeline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-n",
+        "--events",
+        type=int,
+        default=200_000,
+        help="Events in the mission (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--gzip", action="store_true", help="Import the mission gzip compressed."
+    )
+    parser.add_argument(
+        "--settings",
+        nargs="+",
+        default=DEFAULT_SETTINGS,
+        metavar="DEPTHxBATCH",
+        help="Queue depths and batch sizes to compare (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--sqlite-profile",
+        default="safe",
+        choices=("safe", "bulk"),
+        help="SQLite settings profile of the database (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="Imports per setting, best kept."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        source = generate_tacview(
+            os.path.join(directory, "mission.xml"), args.events, seed=args.seed
+        )
+        if args.gzip:
+            with open(source, "rb") as plain, gzip.open(source + ".gz", "wb") as packed:
+                shutil.copyfileobj(plain, packed)
+            source += ".gz"
+        size_mb = os.path.getsize(source) / 1e6
+
+        for setting in args.settings:
+            depth, batch = parse_setting(setting)
+            best = min(
+                (
+                    timed_import(directory, source, depth, batch, args.sqlite_profile)
+                    for _ in range(args.repeat)
+                ),
+                key=lambda result: result[0],
+            )
+            results.append((depth, batch, *best))
+
+    print(
+        f"Mission: {args.events} events, {size_mb:.1f} MB{' gzip' if args.gzip else ''}, "
+        f"{os.cpu_count()} CPUs, {args.sqlite_profile} profile"
+    )
+    print(
+        f"{'depth':>5} {'batch':>6} {'seconds':>8} {'events/s':>9} {'speedup':>8} "
+        f"{'parser stall':>13} {'writer stall':>13} {'queue':>10} {'peak KB':>8}"
+    )
+    baseline = results[0][2]
+    for depth, batch, seconds, pipeline in results:
+        if pipeline:
+            stalls = (
+                f"{pipeline['parser_stall']:>12.3f}s {pipeline['writer_stall']:>12.3f}s"
+            )
+            queue = f"{pipeline['mean_occupancy']:.1f}/{pipeline['peak_occupancy']}"
+            buffered = f"{pipeline['peak_buffered_bytes'] / 1024:>8.0f}"
+        else:
+            stalls, queue, buffered = f"{'-':>13} {'-':>13}", "-", f"{'-':>8}"
+        print(
+            f"{depth:>5} {batch if depth else '-':>6} {seconds:>8.2f} "
+            f"{args.events / seconds:>9.0f} {baseline / seconds:>7.2f}x "
+            f"{stalls} {queue:>10} {buffered}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
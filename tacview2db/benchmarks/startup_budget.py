@@ -0,0 +1,119 @@
+"""
+Start-up budget check for the command line.
+
+Imports tacview2db.py in a fresh interpreter under `python -X importtime`
+and fails if the import takes longer than the budget, or if a module that
+is only needed by the GUI, the decorative output or parallel imports was
+loaded. The import is also tried with tkinter made unavailable, as on a
+headless install without Tk.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.startup_budget [--budget 100] [-r 5]
+
+tests/test_startup_budget.py runs the same checks under pytest.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Allowed import time of tacview2db.py, in milliseconds.
+STARTUP_BUDGET_MS = 100.0
+
+# Modules that a headless command line import must not load at start-up.
+LAZY_MODULES = (
+    "tkinter",
+    "views.tacview_gui_grid",
+    "art",
+    "colorama",
+    "tqdm",
+    "cProfile",
+    "multiprocessing",
+    "zipfile",
+)
+
+# Directory of tacview2db.py, which the modules are imported from.
+_SCRIPT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = """
+import sys, json
+if {block_tk}:
+    sys.modules["tkinter"] = None
+import tacview2db
+print(json.dumps(sorted(m for m in {modules!r} if m in sys.modules)))
+"""
+
+
+def measure_import(block_tk: bool = False) -> tuple:
+    """
+    Import tacview2db in a new interpreter.
+
+    Returns:
+        A tuple of (cumulative import time in ms, lazy modules that were loaded)
+    """
+    child = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            _CHILD.format(block_tk=block_tk, modules=LAZY_MODULES),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=_SCRIPT_DIRECTORY,
+    )
+    for line in child.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == "tacview2db":
+            return int(fields[1]) / 1000, json.loads(child.stdout)
+    raise RuntimeError("tacview2db was not found in the -X importtime output.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=STARTUP_BUDGET_MS,
+        help="Allowed import time of tacview2db.py in milliseconds (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=5,
+        help="Import this many times and keep the fastest (default: %(default)s).",
+    )
+    args = parser.parse_args()
+
+    runs = [measure_import() for _ in range(args.repeat)]
+    milliseconds = min(run[0] for run in runs)
+    loaded = runs[0][1]
+    print(f"tacview2db import: {milliseconds:.1f} ms (budget {args.budget:.0f} ms)")
+
+    failed = False
+    if milliseconds > args.budget:
+        print(f"OVER BUDGET by {milliseconds - args.budget:.1f} ms")
+        failed = True
+    if loaded:
+        print(f"Loaded at start-up but should be imported lazily: {', '.join(loaded)}")
+        failed = True
+
+    try:
+        measure_import(block_tk=True)
+        print("Imports without tkinter: OK")
+    except subprocess.CalledProcessError as error:
+        print(f"Import fails without tkinter:\n{error.stderr}")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Time dashboard page loads through StatsReader with and without its caches.
+
+Builds a database from copies of the sample files (or uses --database) and
+loads a dashboard page many times: the mission list, kills per pilot, weapon
+hit rate, losses per coalition and the summary of all missions, then the
+statistics of one mission. Each page is loaded with no caches, with only the
+prepared statement cache, and with both caches. Finally one more file is
+imported and the page loaded again, to show that only the results of the
+new mission and those across all missions are computed again.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.stats_benchmark [file.xml ...] [-c COPIES] [-n PAGES]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import tempfile
+import time
+
+from models.database import Database
+from models.stats import StatsReader
+from services.tacview_engine import process_tacview_file
+
+SAMPLE_FILES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "sample_data_files",
+    "*.xml",
+)
+
+PAGE_QUERIES = (
+    "missions",
+    "kills_per_pilot",
+    "weapon_hit_rate",
+    "losses_per_coalition",
+    "mission_summary",
+)
+
+
+def load_page(reader: StatsReader, mission_id: int):
+    """
+    Run the queries of one dashboard page, across all missions and for one mission.
+    """
+    for name in PAGE_QUERIES:
+        reader.query(name)
+        reader.query(name, mission_id)
+
+
+def time_pages(reader: StatsReader, mission_ids: list, pages: int) -> float:
+    """
+    Return the mean time of a page load in milliseconds. Pages cycle through the missions.
+    """
+    start = time.perf_counter()
+    for page in range(pages):
+        load_page(reader, mission_ids[page % len(mission_ids)])
+    return (time.perf_counter() - start) * 1000 / pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="*", help="Tacview XML files to import.")
+    parser.add_argument(
+        "-c", "--copies", type=int, default=10, help="Times each file is imported."
+    )
+    parser.add_argument(
+        "-n", "--pages", type=int, default=200, help="Page loads per configuration."
+    )
+    parser.add_argument(
+        "--database", help="Use this existing database instead of building one."
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    files = args.files or sorted(glob.glob(SAMPLE_FILES))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = args.database or os.path.join(directory, "stats.db")
+        db = Database(path)
+        if not args.database:
+            for _ in range(args.copies):
+                for file in files:
+                    process_tacview_file(db, file, duplicate_policy="append")
+        mission_ids = [row[0] for row in db.conn.execute("SELECT id FROM Mission")]
+        events = db.conn.execute("SELECT COUNT(*) FROM Event").fetchone()[0]
+
+        configurations = {
+            "no caches": {"cache_size": 0, "statement_cache_size": 0},
+            "statement cache": {"cache_size": 0},
+            "statement + result cache": {},
+        }
+        timings = {}
+        for label, options in configurations.items():
+            with StatsReader(path, **options) as reader:
+                timings[label] = time_pages(reader, mission_ids, args.pages)
+
+        with StatsReader(path) as reader:
+            load_page(reader, mission_ids[0])
+            if args.database:
+                changed = None
+            else:
+                process_tacview_file(db, files[0], duplicate_policy="append")
+                changed = reader.misses
+                new_mission = db.conn.execute("SELECT MAX(id) FROM Mission").fetchone()
+                start = time.perf_counter()
+                load_page(reader, mission_ids[0])
+                load_page(reader, new_mission[0])
+                after_import = (time.perf_counter() - start) * 1000
+                changed = reader.misses - changed
+        db.close_connection()
+
+    print(f"Missions: {len(mission_ids)}  Events: {events}  Page loads: {args.pages}")
+    baseline = timings["no caches"]
+    for label, milliseconds in timings.items():
+        print(
+            f"{label:28} {milliseconds:9.3f} ms/page  {baseline / milliseconds:8.1f}x"
+        )
+    if changed is not None:
+        print(
+            f"{'after importing a mission':28} {after_import:9.3f} ms for 2 pages, "
+            f"{changed} of {4 * len(PAGE_QUERIES)} queries run again"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Compare the default and the normalised (dictionary-encoded) object storage.
+
+Imports the same files into a database of each kind, then reports the file
+size after VACUUM and the time of the dashboard queries plus some GROUP BY
+queries over object text columns. The queries are run unchanged on both
+databases; on the normalised one they go through the compatibility views.
+
+Run from the tacview2db directory:
+
+    python -m benchmarks.storage_benchmark [file.xml ...] [-c COPIES]
+"""
+
+import argparse
+import glob
+import logging
+import os
+import tempfile
+import time
+
+from models.database import Database
+from models.schema import DASHBOARD_QUERIES, normalise_storage
+from services.tacview_engine import process_tacview_file
+
+SAMPLE_FILES = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "sample_data_files",
+    "*.xml",
+)
+
+GROUP_BY_QUERIES = {
+    "Objects per type": """
+        SELECT type, COUNT(*) FROM PrimaryObject GROUP BY type
+    """,
+    "Events per coalition and country": """
+        SELECT coalition, country, COUNT(*) FROM PrimaryObject GROUP BY coalition, country
+    """,
+    "Weapons per shooter": """
+        SELECT ParentObject.pilot, SecondaryObject.name, COUNT(*)
+        FROM SecondaryObject
+        INNER JOIN ParentObject ON ParentObject.event_id = SecondaryObject.event_id
+        GROUP BY ParentObject.pilot, SecondaryObject.name
+    """,
+}
+
+
+def build_database(path: str, files: list[str], copies: int, normalised: bool):
+    """
+    Import every file `copies` times into a new database and return the
+    import time in seconds.
+    """
+    db = Database(path)
+    if normalised:
+        normalise_storage(db.conn)
+        db.close_connection()
+        db = Database(path)
+
+    start = time.perf_counter()
+    for _ in range(copies):
+        for file in files:
+            process_tacview_file(db, file, duplicate_policy="append")
+    elapsed = time.perf_counter() - start
+
+    db.conn.execute("VACUUM")
+    db.conn.execute("ANALYZE")
+    db.close_connection()
+    return elapsed
+
+
+def time_query(conn, sql: str, repeat: int) -> float:
+    """
+    Return the best wall time of a query in milliseconds over several runs.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="*", help="Tacview XML files to import.")
+    parser.add_argument(
+        "-c", "--copies", type=int, default=10, help="Times each file is imported."
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    files = args.files or sorted(glob.glob(SAMPLE_FILES))
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {
+            "default": os.path.join(directory, "default.db"),
+            "normalised": os.path.join(directory, "normalised.db"),
+        }
+        import_times = {
+            kind: build_database(path, files, args.copies, kind == "normalised")
+            for kind, path in paths.items()
+        }
+        sizes = {kind: os.path.getsize(path) for kind, path in paths.items()}
+
+        timings = {}
+        for kind, path in paths.items():
+            db = Database(path)
+            for name, sql in {**DASHBOARD_QUERIES, **GROUP_BY_QUERIES}.items():
+                timings.setdefault(name, {})[kind] = time_query(
+                    db.conn, sql, args.repeat
+                )
+            events = db.conn.execute("SELECT COUNT(*) FROM Event").fetchone()[0]
+            db.close_connection()
+
+    print(f"Events:             {events}")
+    print(f"{'':40} {'default':>10} {'normalised':>10} {'ratio':>7}")
+    print(
+        f"{'Database size (MB)':40} {sizes['default'] / 1e6:10.2f} "
+        f"{sizes['normalised'] / 1e6:10.2f} {sizes['normalised'] / sizes['default']:7.2f}"
+    )
+    print(
+        f"{'Import time (s)':40} {import_times['default']:10.2f} "
+        f"{import_times['normalised']:10.2f} "
+        f"{import_times['normalised'] / import_times['default']:7.2f}"
+    )
+    for name, timing in timings.items():
+        print(
+            f"{name + ' (ms)':40} {timing['default']:10.2f} "
+            f"{timing['normalised']:10.2f} {timing['normalised'] / timing['default']:7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,79 @@
 DATABASE_NAME = "database/pytacview.db"
+
+# Database engine imports are written to with --backend: "sqlite", or "duckdb" for a columnar
+# DuckDB database at DUCKDB_DATABASE_NAME (needs the optional duckdb package), which answers
+# aggregations over a whole campaign much faster. See models/duckdb_database.py.
+DATABASE_BACKEND = "sqlite"
+DUCKDB_DATABASE_NAME = "database/pytacview.duckdb"
+
+# Number of buffered rows per executemany() flush when importing a file.
+BULK_BATCH_SIZE = 5000
+# Commit every N rows during an import. None commits once per file so a failure rolls back the whole file.
+BULK_COMMIT_ROWS = None
+# Number of buffered rows per flush into a DuckDB database. Each flush is loaded in one statement,
+# which costs about as much for a few rows as for thousands, so the batches are larger.
+DUCKDB_BATCH_SIZE = 50000
+
+# Commit a file's rows every N events together with a checkpoint of its progress, so an import
+# that is killed part way resumes after the last checkpoint when the file is imported again.
+# Files with fewer events are still written in a single transaction. None turns checkpoints off.
+CHECKPOINT_EVENTS = 50000
+
+# Parse/write pipeline (services/pipeline.py): a file's events are parsed in a thread of their own
+# and passed to the writer in batches of PIPELINE_BATCH_SIZE events through a queue holding at most
+# PIPELINE_QUEUE_DEPTH batches. A depth of 0 parses and writes in lock-step in one thread.
+PIPELINE_QUEUE_DEPTH = 8
+PIPELINE_BATCH_SIZE = 1000
+
+# What to do when a file's mission (name, date, recording time and source) is already in the database: skip, replace or append.
+DUPLICATE_MISSION_POLICY = "skip"
+
+# Watch command: seconds between checks of the watched folders, and how long a file's size
+# and modification time must stay the same before it is treated as completely written.
+WATCH_POLL_INTERVAL = 2.0
+WATCH_SETTLE_SECONDS = 5.0
+WATCH_PATTERN = "*.xml"
+
+# SQLite settings applied to each connection, chosen with --safe (the default) or --bulk.
+# "safe" keeps SQLite's durable journal and full syncs, so an interrupted incremental import
+# never loses committed missions. "bulk" is for backfilling a campaign into a database that
+# can be rebuilt from its exports: syncs are skipped, the cache is large, the file is memory
+# mapped and locked for this process only, and foreign keys are not checked row by row.
+PRAGMA_PROFILES = {
+    "safe": {
+        "synchronous": "FULL",
+        "cache_size": -16384,
+    },
+    "bulk": {
+        "locking_mode": "EXCLUSIVE",
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,
+        "mmap_size": 1073741824,
+        "temp_store": "MEMORY",
+        "foreign_keys": "OFF",
+    },
+}
+DEFAULT_PRAGMA_PROFILE = "safe"
+
+# Sharding: None keeps every mission in DATABASE_NAME. "campaign" or "month" puts each
+# mission into a shard database in SHARD_DIRECTORY, listed in the CATALOG_NAME database.
+SHARD_BY = None
+SHARD_DIRECTORY = "database/shards"
+CATALOG_NAME = "database/catalog.db"
+
+# Read-only dashboard statistics (models/stats.py): number of query results kept in the
+# LRU cache, and of compiled statements kept by each reader's connection.
+STATS_RESULT_CACHE_SIZE = 256
+STATS_STATEMENT_CACHE_SIZE = 64
+
+# Logging (models/tacview_logging.py): records are handed to a background thread that writes
+# the log file, so the import never waits on it. Each line of code may log LOG_RATE_LIMIT
+# DEBUG messages every LOG_RATE_WINDOW seconds; the rest are counted and reported with the
+# next one logged. INFO messages and above, such as each file processed or failed, are never
+# dropped. Progress through a file is logged at DEBUG level as a summary every
+# LOG_SUMMARY_SECONDS seconds. The GUI keeps the last GUI_LOG_LINES lines of its log.
+LOG_RATE_LIMIT = 20
+LOG_RATE_WINDOW = 10.0
+LOG_SUMMARY_SECONDS = 5.0
+GUI_LOG_LINES = 1000
@@ -0,0 +1,383 @@
+import logging
+import re
+import xml.etree.ElementTree as ET
+from itertools import islice
+
+from models.sources import SourceFile
+
+# First line of a text ACMI recording (ACMI 2.x).
+ACMI_FILE_TYPE = "FileType=text/acmi/tacview"
+
+# Global header properties copied into the FlightRecording and Mission elements of the header,
+# in the order Mission reads them from an XML export.
+FLIGHT_RECORDING_PROPERTIES = (
+    ("Source", "DataSource"),
+    ("Recorder", "DataRecorder"),
+    ("RecordingTime", "RecordingTime"),
+    ("Author", "Author"),
+)
+MISSION_PROPERTIES = (
+    ("Title", "Title"),
+    ("MissionTime", "ReferenceTime"),
+    ("Duration", None),
+)
+
+# Object types as Tacview names them in XML exports, by ACMI type tag. The first tag
+# found in an object's Type wins, and objects with none of them keep their last tag.
+TYPE_NAMES = (
+    ("Parachutist", "Parachutist"),
+    ("Rotorcraft", "Helicopter"),
+    ("FixedWing", "Aircraft"),
+    ("Missile", "Missile"),
+    ("Rocket", "Rocket"),
+    ("Bomb", "Bomb"),
+    ("Torpedo", "Torpedo"),
+    ("Shell", "Shell"),
+    ("Bullet", "Bullet"),
+    ("AircraftCarrier", "Carrier"),
+    ("Watercraft", "Ship"),
+    ("AntiAircraft", "SAM/AAA"),
+    ("Tank", "Tank"),
+    ("Infantry", "Infantry"),
+    ("Aerodrome", "Airport"),
+    ("Building", "Building"),
+    ("Container", "Container"),
+    ("Vehicle", "Car"),
+)
+
+# ACMI events turned into XML actions. Other events (messages, bookmarks, ...) are skipped.
+EVENT_ACTIONS = {
+    "Destroyed": "HasBeenDestroyed",
+    "TakenOff": "HasTakenOff",
+    "Landed": "HasLanded",
+    "LeftArea": "HasLeftTheArea",
+}
+
+# The object properties that end up in the database. Telemetry (T=), and everything
+# else, is never decoded.
+_PROPERTIES = re.compile(
+    r"(?:^|(?<!\\),)(Type|Name|Pilot|Coalition|Country|Group|Parent)=((?:[^,\\]|\\.)*)"
+)
+
+# Child elements of an object in an XML export, in the order of _AcmiObject.values().
+_OBJECT_ELEMENTS = ("Type", "Name", "Pilot", "Coalition", "Country", "Group", "Parent")
+
+# Kinds of object, from their type tags. Launched objects are weapons, and
+# parachutists, whose ejection Tacview reports as fired by their aircraft.
+_AIR = 1
+_LAUNCHED = 2
+
+# (type name, kind) already worked out, by ACMI Type.
+_TYPE_CACHE = {}
+
+# What has already been reported for an object.
+_ENTERED = 1
+_FIRED = 2
+_GONE = 4
+
+
+class _AcmiObject:
+    """
+    The properties of a live object that are written to the database.
+    """
+
+    __slots__ = (
+        "id",
+        "type",
+        "name",
+        "pilot",
+        "coalition",
+        "country",
+        "group",
+        "parent",
+        "parent_key",
+        "kind",
+        "reported",
+    )
+
+    def __init__(self, object_id: str):
+        self.id = object_id
+        self.type = self.name = self.pilot = self.coalition = None
+        self.country = self.group = self.parent = self.parent_key = None
+        self.kind = self.reported = 0
+
+    def values(self) -> tuple:
+        return (
+            self.type,
+            self.name,
+            self.pilot,
+            self.coalition,
+            self.country,
+            self.group,
+            self.parent,
+        )
+
+
+def _object_type(type_tags: str) -> tuple:
+    """
+    Return (type name, kind) for an ACMI Type such as "Air+FixedWing".
+    Recordings use few distinct types, so the results are cached.
+    """
+    result = _TYPE_CACHE.get(type_tags)
+    if result is None:
+        tags = type_tags.split("+")
+        name = next((name for tag, name in TYPE_NAMES if tag in tags), tags[-1])
+        kind = 0
+        if "Air" in tags or "Parachutist" in tags:
+            kind |= _AIR
+        if "Weapon" in tags or "Projectile" in tags or "Parachutist" in tags:
+            kind |= _LAUNCHED
+        result = _TYPE_CACHE[type_tags] = (name, kind)
+    return result
+
+
+class AcmiStream:
+    """
+    Incrementally parses a Tacview ACMI 2.x text recording (.txt.acmi, or the
+    .zip.acmi archive Tacview saves by default), as an alternative to the XML
+    export with the same interface as TacviewStream.
+
+    The global properties at the top of the file become a FlightRecording and
+    Mission header for Mission. Lines are then read one at a time, keeping the
+    properties of each live object in a table keyed by object id, so memory is
+    bounded by the number of objects alive at once rather than the length of
+    the recording. Telemetry is skipped without being decoded.
+
+    events() yields the <Event> elements an XML export would hold for the
+    recording: HasEnteredTheArea when an aircraft, helicopter or parachutist
+    appears, HasFired when a weapon appears (or a pilot ejects) with its parent
+    as the shooter,
+    HasLeftTheArea when an aircraft is removed without being destroyed, and
+    the Destroyed, TakenOff, Landed and LeftArea events the recorder wrote.
+    Hits are worked out by Tacview when it exports XML and are not in an ACMI
+    file, so no HasBeenHitBy events are produced. The header has no duration;
+    the importer sets it from the time of the last event.
+
+    Which objects are alive, and their properties, depend on every line
+    before an event, so resume() replays the recording up to it rather than
+    seeking, and event_offset is always None.
+    """
+
+    xml_full_data: ET.Element
+
+    def __init__(self, acmi_file: str):
+        logging.info(f"Attempting to stream ACMI in {acmi_file}.")
+
+        try:
+            self._file = SourceFile(acmi_file)
+        except FileNotFoundError:
+            logging.error("The ACMI file was not found.")
+            raise
+
+        self.size = self._file.size
+        self._lines = self._read_lines()
+        self._objects = {}
+        self._time = "0"
+        self._next_line = None
+        self._skip = 0
+        self.event_offset = None
+
+        try:
+            self._read_header(acmi_file)
+            logging.info("ACMI header parsed successfully.")
+        except (ValueError, UnicodeDecodeError) as error:
+            logging.error(f"ACMI parsing failed. Error {error}")
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_lines(self):
+        """
+        Yield the decoded lines of the file, joining lines continued with a trailing backslash.
+        """
+        continued = None
+        for raw_line in self._file:
+            line = raw_line.decode("utf-8").rstrip("\r\n")
+            if continued is not None:
+                line = continued + "\n" + line
+                continued = None
+            if line.endswith("\\"):
+                continued = line[:-1]
+                continue
+            yield line
+        if continued is not None:
+            yield continued
+
+    def _read_header(self, acmi_file: str):
+        """
+        Read the file type and the global properties up to the first frame or
+        object line, and build the header elements from them.
+        """
+        first_line = next(self._lines, "").lstrip("\ufeff")
+        if first_line != ACMI_FILE_TYPE:
+            raise ValueError(f"{acmi_file} is not a text ACMI file")
+
+        properties = {}
+        for line in self._lines:
+            if line.startswith("0,"):
+                key, _, value = line[2:].partition("=")
+                properties[key] = value.replace("\\,", ",")
+            elif line and not line.startswith(("FileVersion=", "//")):
+                self._next_line = line
+                break
+
+        self.xml_full_data = ET.Element("TacviewDebriefing")
+        for tag, header_properties in (
+            ("FlightRecording", FLIGHT_RECORDING_PROPERTIES),
+            ("Mission", MISSION_PROPERTIES),
+        ):
+            element = ET.SubElement(self.xml_full_data, tag)
+            for name, key in header_properties:
+                ET.SubElement(element, name).text = properties.get(key)
+
+    def resume(self, events: int, offset: int = None):
+        """
+        Start events() after the first events of the recording, which an
+        interrupted import already committed. They are still replayed to
+        rebuild the live objects, but not returned. offset is ignored.
+        """
+        self._skip = events
+
+    def events(self):
+        """
+        Yield an <Event> element, as found in an XML export, for each event of the recording.
+
+        A new element is built for each event, so the caller may keep it.
+        """
+        events = self._read_events()
+        return islice(events, self._skip, None) if self._skip else events
+
+    def _read_events(self):
+        if self._next_line is None:
+            self.close()
+            return
+
+        objects = self._objects
+        find_properties = _PROPERTIES.findall
+        try:
+            lines = self._lines
+            line = self._next_line
+            while line is not None:
+                first = line[:1]
+                if first == "#":
+                    self._time = line[1:]
+                elif first == "-":
+                    removed = objects.pop(line[1:], None)
+                    if (
+                        removed is not None
+                        and removed.kind & _AIR
+                        and not removed.reported & _GONE
+                    ):
+                        yield self._event("HasLeftTheArea", removed)
+                elif line.startswith("0,"):
+                    if line.startswith("0,Event="):
+                        yield from self._global_event(line[8:])
+                elif line and first != "/":
+                    object_key, _, properties = line.partition(",")
+                    obj = objects.get(object_key)
+                    if obj is None:
+                        obj = objects[object_key] = _AcmiObject(
+                            str(int(object_key, 16))
+                        )
+                    found = find_properties(properties)
+                    if found:
+                        yield from self._update(obj, found)
+                line = next(lines, None)
+        finally:
+            self.close()
+
+    def _update(self, obj: _AcmiObject, properties: list):
+        """
+        Apply the properties of an object line, and yield the events its first appearance makes.
+        """
+        for key, value in properties:
+            if "\\" in value:
+                value = value.replace("\\,", ",")
+            if key == "Type":
+                obj.type, obj.kind = _object_type(value)
+            elif key == "Name":
+                obj.name = value
+            elif key == "Pilot":
+                obj.pilot = value
+            elif key == "Coalition":
+                obj.coalition = value
+            elif key == "Country":
+                obj.country = value
+            elif key == "Group":
+                obj.group = value
+            else:
+                obj.parent_key = value
+                obj.parent = str(int(value, 16))
+
+        if obj.kind & _LAUNCHED and obj.parent_key is not None:
+            if not obj.reported & _FIRED:
+                shooter = self._objects.get(obj.parent_key)
+                if shooter is not None:
+                    obj.reported |= _FIRED | _ENTERED
+                    yield self._event("HasFired", shooter, obj)
+        elif obj.kind & _AIR and not obj.reported & _ENTERED:
+            obj.reported |= _ENTERED
+            yield self._event("HasEnteredTheArea", obj)
+
+    def _global_event(self, value: str):
+        """
+        Yield the event for an "Event=Name|id|...|text" global property, if it
+        is one that is imported and its object is alive.
+        """
+        name, *fields = value.split("|")
+        action = EVENT_ACTIONS.get(name)
+        if action is None:
+            return
+        # The text at the end is free form, so the object ids are the fields naming a live object.
+        objects = [self._objects[field] for field in fields if field in self._objects]
+        if not objects:
+            return
+        if action in ("HasBeenDestroyed", "HasLeftTheArea"):
+            objects[0].reported |= _GONE
+        # A second object is kept as the secondary object: the killer of a destroyed
+        # object, or the carrier an aircraft took off from or landed on.
+        secondary = objects[1] if len(objects) > 1 else None
+        yield self._event(action, objects[0], secondary)
+
+    def _event(self, action: str, primary: _AcmiObject, secondary: _AcmiObject = None):
+        event = ET.Element("Event")
+        ET.SubElement(event, "Time").text = self._time
+        self._add_object(event, "PrimaryObject", primary)
+        ET.SubElement(event, "Action").text = action
+        if secondary is not None:
+            self._add_object(event, "SecondaryObject", secondary)
+        return event
+
+    @staticmethod
+    def _add_object(event: ET.Element, tag: str, obj: _AcmiObject):
+        element = ET.SubElement(event, tag, ID=obj.id)
+        for name, value in zip(_OBJECT_ELEMENTS, obj.values()):
+            if value is not None:
+                ET.SubElement(element, name).text = value
+
+    @property
+    def bytes_read(self) -> int:
+        """
+        Number of bytes of the file read so far, counted as stored on disk,
+        so for a compressed file these are compressed bytes.
+        """
+        return self._file.compressed_position
+
+    @property
+    def live_objects(self) -> int:
+        """
+        Number of objects currently alive in the recording, and kept in memory.
+        """
+        return len(self._objects)
+
+    def close(self):
+        """
+        Close the underlying file handle.
+        """
+        if not self._file.closed:
+            self._file.close()
@@ -1,74 +1,236 @@
 import sqlite3
 import logging
+from contextlib import contextmanager, nullcontext
+from operator import itemgetter
+
+from config import (
+    BULK_BATCH_SIZE,
+    BULK_COMMIT_ROWS,
+    DEFAULT_PRAGMA_PROFILE,
+    PRAGMA_PROFILES,
+)
+from models.schema import (
+    NORMALISED_TABLES,
+    OBJECT_INFO_COLUMNS,
+    IMPORT_TABLES,
+    SCHEMA_VERSION,
+    defer_indexes,
+    get_schema_version,
+    has_deferred_indexes,
+    is_empty,
+    is_normalised,
+    migrate,
+    reclaim_space,
+    recreate_tables,
+    restore_indexes,
+    storage_tables,
+)
 
 
 class Database:
     """
     Database class to manage SQLite database connections and operations for tacview data.
     Handles database initialization, queries, and table management.
+
+    Its methods are also the interface of the other backends: DuckDBDatabase in
+    models/duckdb_database.py implements them on DuckDB. open_database() opens either.
     """
     conn: sqlite3.Connection
+    database_file: str
+    normalised: bool
+    profile: str
 
-    def __init__(self, database_file: str) -> None:
+    def __init__(
+        self, database_file: str, profile: str = DEFAULT_PRAGMA_PROFILE
+    ) -> None:
         """
         Initialize database connection with the provided file path.
         
         Args:
             database_file (str): Path to the SQLite database file
+            profile (str): Name of the PRAGMA_PROFILES entry applied to the connection ("safe" or "bulk")
         """
         logging.info(f"Attempting to connect to database {database_file}.")
+        # Kept so other threads can open their own connection to the same file.
+        self.database_file = database_file
         try:
             self.conn = sqlite3.connect(database_file)
+            # Enforce the foreign keys declared by the versioned schema.
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.apply_profile(profile)
             logging.info("Database connection made.")
         except sqlite3.Error as db_error:
             logging.error(f"Database connection failed. Error: {db_error}")
             quit()
 
+        self.check_schema()
+        if has_deferred_indexes(self.conn):
+            logging.warning(
+                "A bulk load was interrupted, rebuilding the indexes it dropped."
+            )
+            restore_indexes(self.conn)
+        # Object rows are written through the ObjectInfo dictionary when the database uses normalised storage.
+        self.normalised = is_normalised(self.conn)
+
+    def check_schema(self):
+        """
+        Create the schema in a new database, or warn if an existing database
+        needs to be upgraded with the migrate command.
+        """
+        version = get_schema_version(self.conn)
+        if version == 0 and is_empty(self.conn):
+            logging.info("New database, creating tables.")
+            # Only takes effect before the first table is created. Lets deletes shrink the file.
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.create_required_tables()
+        elif version < SCHEMA_VERSION:
+            logging.warning(
+                f"Database schema is version {version}, the current version is {SCHEMA_VERSION}. "
+                "Run 'tacview2db.py migrate' to upgrade it."
+            )
+
+    def apply_profile(self, profile: str):
+        """
+        Apply the PRAGMA settings of a profile to the connection.
+
+        Args:
+            profile (str): Name of an entry in PRAGMA_PROFILES
+        """
+        pragmas = PRAGMA_PROFILES[profile]
+        # The journal mode is stored in the file, so the original is put back on close.
+        self._journal_mode = None
+        if "journal_mode" in pragmas:
+            self._journal_mode = self.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        for name, value in pragmas.items():
+            self.conn.execute(f"PRAGMA {name} = {value}")
+        self.profile = profile
+        logging.info(f"Database settings profile {profile} applied.")
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        Defer index maintenance while a batch of files is imported.
+
+        The secondary indexes of the event and object tables are dropped on entry
+        and rebuilt once on exit, followed by ANALYZE, even if the batch stops
+        part way. Building an index over the loaded rows in one pass is much
+        cheaper than updating it for every inserted row.
+        """
+        defer_indexes(self.conn)
+        try:
+            yield self
+        finally:
+            restore_indexes(self.conn)
+            if not self.conn.execute("PRAGMA foreign_keys").fetchone()[0]:
+                orphans = self.conn.execute("PRAGMA foreign_key_check").fetchall()
+                if orphans:
+                    logging.warning(
+                        f"{len(orphans)} rows loaded without foreign key checks reference a missing mission or event."
+                    )
+
     def close_connection(self):
         """
         Close the database connection.
         """
+        if self._journal_mode:
+            self.conn.execute(f"PRAGMA journal_mode = {self._journal_mode}")
         self.conn.close()
  
     def clear_table_data(self):
         """
         Clear all data from the database tables before importing new tacview data.
-        Tables are cleared in a specific order to respect foreign key constraints.
+        The tables are dropped and created again rather than emptied row by row,
+        and the freed space is given back with an incremental vacuum. The import
+        manifest and checkpoints are emptied in the same transaction, as the
+        missions they point to are gone and their ids will be given out again.
         """
         logging.warning("Clearing out database before import of tacview data.")
-        tables = [
-            "Mission",
-            "ParentObject",
-            "SecondaryObject",
-            "PrimaryObject",
-            "Event",
-        ]
-        cursor = self.conn.cursor()
+        tables = (*storage_tables(self.conn), *IMPORT_TABLES)
+        recreate_tables(self.conn, tables)
         for table in tables:
-            sql = f"DELETE FROM {table}"
-            cursor.execute(sql)
-            # self.conn.commit()
             logging.warning(f"Table {table} cleared.")
+        self.reclaim_space()
         logging.warning("All table data cleared.")
 
-    def execute_sql_select_query(self, sql: str):
+    def reclaim_space(self) -> int:
+        """
+        Give the space freed by deleted rows back to the file system.
+
+        Returns:
+            The number of pages released
+        """
+        return reclaim_space(self.conn)
+
+    def bulk_writer(
+        self,
+        batch_size: int = BULK_BATCH_SIZE,
+        commit_rows: int = BULK_COMMIT_ROWS,
+        profiler=None,
+    ) -> "BulkWriter":
+        """
+        Create a BulkWriter that buffers inserts into a single transaction.
+
+        Args:
+            batch_size (int): Number of buffered rows that triggers an executemany() flush
+            commit_rows (int): Commit every N rows instead of once per writer (None for one transaction)
+            profiler (StageProfiler): Optional profiler charged with the flush and commit stages
+
+        Returns:
+            A BulkWriter to be used as a context manager
+        """
+        if self.normalised:
+            return NormalisedBulkWriter(self, batch_size, commit_rows, profiler)
+        return BulkWriter(self, batch_size, commit_rows, profiler)
+
+    def insert(self, table: str, columns: tuple, values: tuple) -> int:
+        """
+        Insert and commit a single row.
+
+        Args:
+            table (str): Name of the table to insert into
+            columns (tuple): Column names matching the values
+            values (tuple): Values to insert
+
+        Returns:
+            The row ID of the inserted row
+        """
+        placeholders = ",".join("?" * len(columns))
+        sql = f"INSERT INTO {table}({', '.join(columns)}) VALUES({placeholders})"
+        return self.execute_sql_statement(sql, values)
+
+    def execute_sql_select_query(self, sql: str, data=()):
         """
         Execute a SQL SELECT query and return the first result.
         
         Args:
             sql (str): SQL SELECT query to execute
+            data (tuple): Optional data parameters for the SQL query
             
         Returns:
             The first row of the query result or None if error occurs
         """
         cursor = self.conn.cursor()
         try:
-            cursor.execute(sql)
+            cursor.execute(sql, data)
             return cursor.fetchone()
 
         except Exception as e:
             logging.error(f"SQL statement issue: {e}")
 
+    def stats_reader(self, **options) -> "StatsReader":
+        """
+        Open a StatsReader on this database for the named dashboard statistics.
+
+        Args:
+            options: Cache sizes passed on to StatsReader
+
+        Returns:
+            A StatsReader with its own read-only connection
+        """
+        from models.stats import StatsReader
+
+        return StatsReader(self.database_file, **options)
+
     def execute_sql_statement(self, sql: str, data=()) -> bool:
         """
         Execute a generic SQL statement with optional parameter binding.
@@ -94,87 +256,306 @@ class Database:
         except Exception as e:
             logging.error(f"SQL statement issue: {e}")
 
-    # This code unused and also doesn't seem to work
-    def create_required_tables(self) -> bool:
+    def create_required_tables(self) -> int:
         """
-        Create the required database tables if they don't already exist.
-        Note: This function is currently unused and may have issues.
-        
+        Create the required database tables, or upgrade existing ones, to the
+        current schema version.
+
+        Returns:
+            int: The schema version of the database
+        """
+        return migrate(self.conn)
+
+    def schema_version(self) -> int:
+        """
+        Return the schema version of the database (0 if it predates versioning).
+        """
+        return get_schema_version(self.conn)
+
+
+# Database engines a database can be stored in, chosen with --backend.
+BACKENDS = ("sqlite", "duckdb")
+
+
+def open_database(
+    database_file: str, backend: str = "sqlite", profile: str = DEFAULT_PRAGMA_PROFILE
+) -> Database:
+    """
+    Open a database with the given backend. DuckDB is an optional dependency,
+    so its module is only imported when it is asked for.
+
+    Args:
+        database_file (str): Path to the database file
+        backend (str): Name of an entry in BACKENDS
+        profile (str): Name of the PRAGMA_PROFILES entry applied to a SQLite connection
+
+    Returns:
+        A Database, or a DuckDBDatabase with the same interface
+
+    Raises:
+        ValueError: If the backend is unknown
+        ImportError: If the backend is "duckdb" and the duckdb package is not installed
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown database backend {backend}, choose from {', '.join(BACKENDS)}.")
+    if backend == "duckdb":
+        from models.duckdb_database import DuckDBDatabase
+
+        return DuckDBDatabase(database_file, profile)
+    return Database(database_file, profile)
+
+
+class BulkWriter:
+    """
+    Buffers INSERT statements per table and writes them with executemany() inside
+    one transaction. Row ids are allocated up front from each table's current
+    maximum id, so child rows can reference an event or secondary object before
+    it has been flushed. Any exception inside the with block rolls back every row
+    written since the last commit.
+    """
+
+    # Tables are flushed parent first so foreign keys always point at existing rows.
+    TABLE_ORDER = (
+        "Mission",
+        "Event",
+        "PrimaryObject",
+        "SecondaryObject",
+        "ParentObject",
+        "ObjectInfo",
+        "PrimaryObjectData",
+        "SecondaryObjectData",
+        "ParentObjectData",
+        "Engagement",
+    )
+
+    def __init__(
+        self,
+        db: Database,
+        batch_size: int = BULK_BATCH_SIZE,
+        commit_rows: int = BULK_COMMIT_ROWS,
+        profiler=None,
+    ) -> None:
+        self.db = db
+        self.profiler = profiler
+        self.conn = db.conn
+        self.batch_size = batch_size
+        self.commit_rows = commit_rows
+        self._buffers = {}
+        self._statements = {}
+        self._next_ids = {}
+        self._buffered_rows = 0
+        self._uncommitted_rows = 0
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            logging.error("Rolling back uncommitted rows after error.")
+            self.rollback()
+        return False
+
+    def begin(self):
+        """
+        Start a new transaction, committing anything the connection left open.
+        """
+        if self.conn.in_transaction:
+            self.conn.commit()
+        self.conn.execute("BEGIN")
+
+    def insert(self, table: str, columns: tuple, values: tuple) -> int:
+        """
+        Buffer a row for insertion and return the id it will be stored with.
+
+        Args:
+            table (str): Name of the table to insert into
+            columns (tuple): Column names matching the values
+            values (tuple): Values to insert
+
+        Returns:
+            The row ID allocated to the row
+        """
+        key = (table, columns)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = []
+            placeholders = ",".join("?" * (len(columns) + 1))
+            self._statements[key] = (
+                f"INSERT INTO {table}(id, {', '.join(columns)}) VALUES({placeholders})"
+            )
+
+        row_id = self._allocate_id(table)
+        buffer.append((row_id, *values))
+        self._buffered_rows += 1
+        self._uncommitted_rows += 1
+
+        if self._buffered_rows >= self.batch_size:
+            self.flush()
+        if self.commit_rows and self._uncommitted_rows >= self.commit_rows:
+            self.commit()
+            self.begin()
+
+        return row_id
+
+    def execute_sql_statement(self, sql: str, data=()):
+        """
+        Execute a statement inside the writer's transaction. Buffered rows are
+        flushed first so the statement sees everything inserted so far.
+
+        Args:
+            sql (str): SQL statement to execute
+            data (tuple): Optional data parameters for the SQL statement
+
+        Returns:
+            The row ID of the last inserted row
+        """
+        self.flush()
+        cursor = self.conn.execute(sql, data)
+        return cursor.lastrowid
+
+    def _allocate_id(self, table: str) -> int:
+        next_id = self._next_ids.get(table)
+        if next_id is None:
+            cursor = self.conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            next_id = cursor.fetchone()[0]
+        next_id += 1
+        self._next_ids[table] = next_id
+        return next_id
+
+    def _stage(self, name: str):
+        # Flushes and commits are rare enough to time unconditionally when profiling.
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.stage(name)
+
+    def _table_rank(self, key) -> int:
+        table = key[0]
+        if table in self.TABLE_ORDER:
+            return self.TABLE_ORDER.index(table)
+        return len(self.TABLE_ORDER)
+
+    def flush(self):
+        """
+        Write all buffered rows to the database without committing.
+        """
+        with self._stage("flush"):
+            for key in sorted(self._buffers, key=self._table_rank):
+                rows = self._buffers[key]
+                if rows:
+                    self.conn.executemany(self._statements[key], rows)
+                    rows.clear()
+        self._buffered_rows = 0
+
+    def commit(self):
+        """
+        Flush buffered rows and commit the transaction.
+        """
+        self.flush()
+        with self._stage("commit"):
+            self.conn.commit()
+        self._uncommitted_rows = 0
+
+    def rollback(self):
+        """
+        Discard buffered rows and roll back the transaction.
+        """
+        for rows in self._buffers.values():
+            rows.clear()
+        self._buffered_rows = 0
+        self._uncommitted_rows = 0
+        # Allocated ids are no longer valid once the rows behind them are gone.
+        self._next_ids.clear()
+        self.conn.rollback()
+
+
+class NormalisedBulkWriter(BulkWriter):
+    """
+    BulkWriter for databases with normalised object storage. Rows for the
+    PrimaryObject, SecondaryObject and ParentObject views are written to their
+    storage tables, with the descriptive columns replaced by an ObjectInfo key.
+
+    ObjectInfo is loaded into a dict on first use, so each distinct object
+    description costs one dict lookup per row and a single insert the first
+    time it is seen.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        batch_size: int = BULK_BATCH_SIZE,
+        commit_rows: int = BULK_COMMIT_ROWS,
+        profiler=None,
+    ) -> None:
+        super().__init__(db, batch_size, commit_rows, profiler)
+        self._layouts = {}
+        self._info_ids = None
+
+    def insert(self, table: str, columns: tuple, values: tuple) -> int:
+        """
+        Buffer a row for insertion, interning object descriptions into ObjectInfo.
+
+        Args:
+            table (str): Name of the table or compatibility view to insert into
+            columns (tuple): Column names matching the values
+            values (tuple): Values to insert
+
         Returns:
-            bool: True if successful (implied, function doesn't actually return a value)
-        """
-        # Create Event table
-        sql = """
-                CREATE TABLE IF NOT EXISTS "Event" (
-                "id" integer PRIMARY KEY NOT NULL,
-                "mission_id" integer(128) NOT NULL,
-                "time" char(128) NOT NULL,
-                "action" char(128) NOT NULL
-                );
-            """
-        self.execute_sql_statement(sql)
-
-        # Create Mission table
-        sql = """ 
-                CREATE TABLE IF NOT EXISTS "Mission" (
-                "id" integer PRIMARY KEY NOT NULL,
-                "name" char(128),
-                "date" char(128),
-                "duration" char(128),
-                "source" char(128),
-                "recorder" char(128),
-                "recording_time" char(128),
-                "author" char(128)
-                );
-            """
-        self.execute_sql_statement(sql)
-
-        # Create ParentObject table
-        sql = """
-                CREATE TABLE IF NOT EXISTS "ParentObject" (
-                "id" integer PRIMARY KEY NOT NULL,
-                "event_id" integer(128) NOT NULL,
-                "tacview_id" char(128) NOT NULL,
-                "type" char(128),
-                "name" char(128),
-                "pilot" char(128),
-                "coalition" char(128),
-                "country" char(128),
-                "obj_group" char(128)
-                );
-            """
-        self.execute_sql_statement(sql)
-
-        # Create PrimaryObject table
-        sql = """
-                CREATE TABLE IF NOT EXISTS "PrimaryObject" (
-                "id" integer PRIMARY KEY NOT NULL,
-                "event_id" integer(128) NOT NULL,
-                "tacview_id" char(128) NOT NULL,
-                "type" char(128),
-                "name" char(128),
-                "pilot" char(128),
-                "coalition" char(128),
-                "country" char(128),
-                "obj_group" char(128),
-                "parent_id" char(128)
-                );
-            """
-        self.execute_sql_statement(sql)
-
-        # Create SecondaryObject table
-        sql = """
-                CREATE TABLE IF NOT EXISTS "SecondaryObject" (
-                "id" integer PRIMARY KEY NOT NULL,
-                "event_id" integer(128) NOT NULL,
-                "tacview_id" char(128) NOT NULL,
-                "type" char(128),
-                "name" char(128),
-                "pilot" char(128),
-                "coalition" char(128),
-                "country" char(128),
-                "obj_group" char(128),
-                "parent_id" char(128)
-                );
-            """
-        self.execute_sql_statement(sql)
+            The row ID allocated to the row
+        """
+        layout = self._layouts.get((table, columns))
+        if layout is None:
+            if table not in NORMALISED_TABLES:
+                return super().insert(table, columns, values)
+            layout = self._layouts[(table, columns)] = self._layout(table, columns)
+
+        data_table, data_columns, get_data, get_info = layout
+        return super().insert(
+            data_table, data_columns, (*get_data(values), self.intern(get_info(values)))
+        )
+
+    @staticmethod
+    def _layout(table: str, columns: tuple) -> tuple:
+        # Map the view's column order onto the storage table once per (table, columns).
+        data_table, data_columns = NORMALISED_TABLES[table]
+        missing = set(data_columns + OBJECT_INFO_COLUMNS) - set(columns)
+        if missing:
+            raise ValueError(
+                f"Insert into {table} is missing columns {sorted(missing)}."
+            )
+        return (
+            data_table,
+            (*data_columns, "info_id"),
+            itemgetter(*(columns.index(column) for column in data_columns)),
+            itemgetter(*(columns.index(column) for column in OBJECT_INFO_COLUMNS)),
+        )
+
+    def intern(self, info: tuple) -> int:
+        """
+        Return the ObjectInfo id for (type, name, pilot, coalition, country, obj_group),
+        adding a row the first time the combination is seen.
+        """
+        if self._info_ids is None:
+            self._info_ids = {}
+            cursor = self.conn.execute(
+                f"SELECT id, {', '.join(OBJECT_INFO_COLUMNS)} FROM ObjectInfo ORDER BY id DESC"
+            )
+            for info_id, *values in cursor:
+                # Older duplicates are overwritten, so the lowest id wins like the view trigger.
+                self._info_ids[tuple(values)] = info_id
+
+        info_id = self._info_ids.get(info)
+        if info_id is None:
+            info_id = self._info_ids[info] = super().insert(
+                "ObjectInfo", OBJECT_INFO_COLUMNS, info
+            )
+        return info_id
+
+    def rollback(self):
+        """
+        Roll back, forgetting ObjectInfo ids that were never committed.
+        """
+        super().rollback()
+        self._info_ids = None
@@ -0,0 +1,579 @@
+import csv
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+
+from config import (
+    BULK_COMMIT_ROWS,
+    DEFAULT_PRAGMA_PROFILE,
+    DUCKDB_BATCH_SIZE,
+    STATS_RESULT_CACHE_SIZE,
+    STATS_STATEMENT_CACHE_SIZE,
+)
+from models.database import BulkWriter, Database
+from models.manifest import MANIFEST_TABLES
+from models.schema import (
+    DATA_TABLES,
+    IMPORT_TABLES,
+    SCHEMA_VERSION,
+    get_schema_version,
+    is_empty,
+    migrate,
+)
+from models.stats import StatsReader, timeline_queries
+
+try:
+    import duckdb
+except ImportError as error:
+    raise ImportError(
+        "The DuckDB backend needs the duckdb package (pip install duckdb)."
+    ) from error
+
+# Statements sqlite3 opens a transaction for when none is open, and those that open one.
+_WRITE_STATEMENT = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+_BEGIN_STATEMENT = re.compile(r"\s*BEGIN\b", re.IGNORECASE)
+
+# Statements that change the data, which a transaction counts in DataVersion when it commits.
+_CHANGE_STATEMENT = re.compile(
+    r"\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b", re.IGNORECASE
+)
+
+# DuckDB has no PRAGMA data_version, so each transaction that changes the data adds
+# one to the single row of this table, which StatsReader compares instead.
+DATA_VERSION_TABLE = (
+    'CREATE TABLE IF NOT EXISTS "DataVersion" ("version" BIGINT NOT NULL)'
+)
+
+# :name parameters of the SQLite dialect, $name in DuckDB's. The colons of a time
+# format in a string literal are not followed by a letter.
+_NAMED_PARAMETER = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+# A multi-row INSERT of parameters, as BulkWriter flushes and rebuild_engagements()
+# writes, which executemany() loads with append() instead.
+_INSERT_VALUES = re.compile(
+    r'\s*INSERT INTO "?(\w+)"?\s*\(([^)]*)\)\s*VALUES\s*\([?,\s]*\)\s*$',
+    re.IGNORECASE,
+)
+
+
+class _Null(float):
+    """
+    Written by the csv module as an unquoted empty field, which DuckDB reads as
+    NULL. None is quoted like a string, and would be read back as ''.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return ""
+
+    __repr__ = __str__
+
+
+_NULL = _Null()
+
+
+def _duckdb_type(declared: str) -> str:
+    """
+    Return the DuckDB type for a column type declared in the SQLite schema,
+    following SQLite's rules for a column's type affinity.
+    """
+    declared = declared.upper()
+    if "INT" in declared:
+        return "BIGINT"
+    if "CHAR" in declared or "CLOB" in declared or "TEXT" in declared:
+        return "VARCHAR"
+    if "REAL" in declared or "FLOA" in declared or "DOUB" in declared:
+        return "DOUBLE"
+    return "VARCHAR"
+
+
+def duckdb_schema() -> tuple:
+    """
+    Return the tables of the current schema version in DuckDB's dialect, read
+    from a SQLite database migrated in memory, so both backends are defined by
+    the SQLite schema and its migrations.
+
+    Columns keep their names, order and NOT NULL constraints. Text primary
+    keys are kept for INSERT OR REPLACE. Integer ids are allocated by the
+    writer, and foreign keys and secondary indexes are left out, as DuckDB
+    prunes whole blocks of rows by their min/max statistics instead and every
+    index would slow down appends.
+
+    Returns:
+        A tuple of (dict of CREATE TABLE statements by table, schema_version rows)
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        migrate(conn)
+        for sql in MANIFEST_TABLES:
+            conn.execute(sql)
+        tables = {}
+        for (table,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+        ):
+            definitions = []
+            for _, name, declared, not_null, _, primary_key in conn.execute(
+                f'PRAGMA table_info("{table}")'
+            ):
+                column_type = _duckdb_type(declared)
+                definition = f'"{name}" {column_type}'
+                if primary_key and column_type == "VARCHAR":
+                    definition += " PRIMARY KEY"
+                if not_null:
+                    definition += " NOT NULL"
+                definitions.append(definition)
+            tables[table] = (
+                f'CREATE TABLE IF NOT EXISTS "{table}" ({", ".join(definitions)})'
+            )
+        versions = conn.execute(
+            "SELECT version, applied_at FROM schema_version ORDER BY version"
+        ).fetchall()
+    finally:
+        conn.close()
+    return tables, versions
+
+
+class DuckDBCursor:
+    """
+    Runs statements on a DuckDBConnection and reads their rows like a sqlite3.Cursor.
+
+    A DuckDB connection keeps only the result of its last statement, so rows
+    are fetched when the statement runs and stay readable while others run,
+    e.g. when rows are inserted while iterating over a query.
+    """
+
+    # DuckDB has no rowid. Ids are allocated by BulkWriter and DuckDBDatabase.insert().
+    lastrowid = None
+
+    def __init__(self, connection: "DuckDBConnection"):
+        self.connection = connection
+        self.description = None
+        self._rows = iter(())
+
+    def __iter__(self):
+        return self._rows
+
+    def execute(self, sql: str, parameters=()) -> "DuckDBCursor":
+        connection = self.connection
+        write = _WRITE_STATEMENT.match(sql)
+        if write and not connection.in_transaction:
+            connection.begin()
+        if isinstance(parameters, dict):
+            sql, parameters = _named_parameters(sql, parameters)
+        result = connection.duckdb_conn.execute(sql, parameters or None)
+        if _BEGIN_STATEMENT.match(sql):
+            connection.in_transaction = True
+        elif connection.in_transaction and _CHANGE_STATEMENT.match(sql):
+            connection.changed = True
+        # Like sqlite3, write statements return no rows, where DuckDB returns their row count.
+        self.description = None if write else result.description
+        self._rows = iter(result.fetchall() if self.description else ())
+        return self
+
+    def executemany(self, sql: str, rows) -> "DuckDBCursor":
+        insert = _INSERT_VALUES.match(sql)
+        if insert:
+            columns = tuple(
+                column.strip().strip('"') for column in insert[2].split(",")
+            )
+            self.connection.append(insert[1], columns, rows)
+        else:
+            if _WRITE_STATEMENT.match(sql):
+                if not self.connection.in_transaction:
+                    self.connection.begin()
+                self.connection.changed = True
+            self.connection.duckdb_conn.executemany(sql, rows)
+        self.description = None
+        self._rows = iter(())
+        return self
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size: int = 1) -> list:
+        return list(islice(self._rows, size))
+
+    def fetchall(self) -> list:
+        return list(self._rows)
+
+    def close(self):
+        self._rows = iter(())
+
+
+def _named_parameters(sql: str, parameters: dict) -> tuple:
+    """
+    Turn :name parameters into DuckDB's $name, and drop parameters the
+    statement does not use, which DuckDB rejects.
+    """
+    names = set(_NAMED_PARAMETER.findall(sql))
+    return _NAMED_PARAMETER.sub(r"$\1", sql), {
+        name: value for name, value in parameters.items() if name in names
+    }
+
+
+class DuckDBConnection:
+    """
+    Wraps a DuckDB connection in the part of the sqlite3.Connection interface
+    that Database, BulkWriter, the import manifest and StatsReader use, so
+    their SQL runs unchanged on DuckDB:
+
+      - a transaction is opened before an INSERT, UPDATE, DELETE or REPLACE
+        outside one, and ended by commit() or rollback(), as sqlite3 does
+      - execute() returns a DuckDBCursor, which can be iterated
+      - :name parameters are passed as $name
+      - executemany() of an INSERT ... VALUES loads the rows with append()
+      - a transaction that changed the data adds one to DataVersion as it
+        commits, standing in for SQLite's PRAGMA data_version
+    """
+
+    def __init__(self, duckdb_conn):
+        self.duckdb_conn = duckdb_conn
+        self.in_transaction = False
+        self.changed = False
+        self._column_types = {}
+        self._staging_file = None
+
+    def cursor(self) -> DuckDBCursor:
+        return DuckDBCursor(self)
+
+    def execute(self, sql: str, parameters=()) -> DuckDBCursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, rows) -> DuckDBCursor:
+        return self.cursor().executemany(sql, rows)
+
+    def begin(self):
+        self.duckdb_conn.execute("BEGIN TRANSACTION")
+        self.in_transaction = True
+
+    def commit(self):
+        if self.in_transaction:
+            if self.changed:
+                # In the same transaction, so readers see the new version with the new rows.
+                self.duckdb_conn.execute(
+                    'UPDATE "DataVersion" SET "version" = "version" + 1'
+                )
+            self.duckdb_conn.commit()
+            self.in_transaction = False
+            self.changed = False
+
+    def rollback(self):
+        if self.in_transaction:
+            self.duckdb_conn.rollback()
+            self.in_transaction = False
+            self.changed = False
+
+    def duplicate(self) -> "DuckDBConnection":
+        """
+        Return a second connection to the same database, with transactions of its own.
+        """
+        return DuckDBConnection(self.duckdb_conn.cursor())
+
+    def append(self, table: str, columns: tuple, rows):
+        """
+        Load rows into a table with one statement, in the open transaction.
+
+        DuckDB inserts a row at a time many times slower than it loads a
+        file, and its appenders for data frames need pandas or pyarrow. So the
+        rows are written to a CSV staging file, every text value quoted and
+        NULL as an empty field, and read back by DuckDB's CSV reader with the
+        table's column types.
+        """
+        if self._staging_file is None:
+            handle, self._staging_file = tempfile.mkstemp(
+                prefix="tacview2db-", suffix=".csv"
+            )
+            os.close(handle)
+        with open(self._staging_file, "w", newline="", encoding="utf-8") as staging:
+            writer = csv.writer(
+                staging, quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n"
+            )
+            writer.writerows(
+                [_NULL if value is None else value for value in row] for row in rows
+            )
+
+        types = self._types(table)
+        column_types = ", ".join(f"'{column}': '{types[column]}'" for column in columns)
+        path = self._staging_file.replace("'", "''")
+        self.execute(
+            f'INSERT INTO "{table}" ({", ".join(columns)}) '
+            f"SELECT * FROM read_csv('{path}', columns = {{{column_types}}}, header = false, "
+            "auto_detect = false, delim = ',', quote = '\"', escape = '\"', allow_quoted_nulls = false)"
+        )
+
+    def _types(self, table: str) -> dict:
+        types = self._column_types.get(table)
+        if types is None:
+            types = self._column_types[table] = {
+                row[1]: row[2] for row in self.execute(f'PRAGMA table_info("{table}")')
+            }
+        return types
+
+    def close(self):
+        if self._staging_file is not None:
+            os.remove(self._staging_file)
+            self._staging_file = None
+        self.duckdb_conn.close()
+
+
+class DuckDBDatabase(Database):
+    """
+    Database stored in an embedded DuckDB file instead of SQLite. DuckDB keeps
+    each column apart and compressed, and aggregates over whole tables, such
+    as statistics across a year of missions, many times faster than SQLite.
+
+    It has the same interface as Database, and the same tables and columns,
+    created from the SQLite schema by duckdb_schema(). The importer, the
+    import manifest and StatsReader run their SQL unchanged through
+    DuckDBConnection, and BulkWriter's flushes are loaded in bulk by
+    DuckDBConnection.append() rather than inserted row by row.
+
+    There are no SQLite settings profiles, migrations, normalised storage or
+    incremental vacuum. Unlike SQLite, a DuckDB file is locked by the process
+    writing to it, so other processes can only read it once it is closed.
+    """
+
+    def __init__(
+        self, database_file: str, profile: str = DEFAULT_PRAGMA_PROFILE
+    ) -> None:
+        """
+        Open, or create, a DuckDB database file.
+
+        Args:
+            database_file (str): Path to the DuckDB database file
+            profile (str): Accepted for the same interface as Database, DuckDB has no settings profiles
+        """
+        logging.info(f"Attempting to connect to DuckDB database {database_file}.")
+        self.database_file = database_file
+        try:
+            self.conn = DuckDBConnection(duckdb.connect(database_file))
+            logging.info("Database connection made.")
+        except duckdb.Error as db_error:
+            logging.error(f"Database connection failed. Error: {db_error}")
+            quit()
+        self.apply_profile(profile)
+        self.normalised = False
+        self.check_schema()
+
+    def check_schema(self):
+        """
+        Create the schema in a new database, or warn if an existing database
+        was created by an older version.
+        """
+        # First, as the transactions creating the tables count in it. Also added
+        # to databases created before it was kept.
+        self.conn.duckdb_conn.execute(DATA_VERSION_TABLE)
+        if not self.conn.duckdb_conn.execute('SELECT 1 FROM "DataVersion"').fetchone():
+            self.conn.duckdb_conn.execute('INSERT INTO "DataVersion" VALUES (0)')
+        version = get_schema_version(self.conn)
+        if version == 0 and is_empty(self.conn):
+            logging.info("New database, creating tables.")
+            self.create_required_tables()
+        elif version < SCHEMA_VERSION:
+            logging.warning(
+                f"Database schema is version {version}, the current version is {SCHEMA_VERSION}. "
+                "DuckDB databases are not migrated, import the files into a new one."
+            )
+
+    def apply_profile(self, profile: str):
+        """
+        Record the profile name. The SQLite settings do not apply: DuckDB always
+        loads rows in bulk and has no secondary indexes to defer.
+        """
+        self._journal_mode = None
+        self.profile = profile
+
+    @contextmanager
+    def bulk_load(self):
+        yield self
+
+    def close_connection(self):
+        """
+        Close the database connection.
+        """
+        self.conn.close()
+
+    def clear_table_data(self):
+        """
+        Clear all data from the database tables before importing new tacview data.
+        The tables are dropped and created again, and their blocks are freed for reuse.
+        The import manifest and checkpoints are emptied in the same transaction.
+        """
+        logging.warning("Clearing out database before import of tacview data.")
+        tables, _ = duckdb_schema()
+        cleared = (*DATA_TABLES, *IMPORT_TABLES)
+        self.conn.begin()
+        try:
+            for table in cleared:
+                self.conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+                self.conn.execute(tables[table])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        for table in cleared:
+            logging.warning(f"Table {table} cleared.")
+        self.reclaim_space()
+        logging.warning("All table data cleared.")
+
+    def reclaim_space(self) -> int:
+        """
+        Checkpoint the database, which lets DuckDB reuse the blocks of deleted
+        rows. DuckDB does not shrink the file.
+
+        Returns:
+            0, as no pages are released to the file system
+        """
+        self.conn.execute("CHECKPOINT")
+        return 0
+
+    def bulk_writer(
+        self,
+        batch_size: int = DUCKDB_BATCH_SIZE,
+        commit_rows: int = BULK_COMMIT_ROWS,
+        profiler=None,
+    ) -> BulkWriter:
+        """
+        Create a BulkWriter whose flushes are loaded with DuckDBConnection.append().
+
+        Args:
+            batch_size (int): Number of buffered rows that triggers a flush
+            commit_rows (int): Commit every N rows instead of once per writer (None for one transaction)
+            profiler (StageProfiler): Optional profiler charged with the flush and commit stages
+
+        Returns:
+            A BulkWriter to be used as a context manager
+        """
+        return BulkWriter(self, batch_size, commit_rows, profiler)
+
+    def insert(self, table: str, columns: tuple, values: tuple) -> int:
+        """
+        Insert and commit a single row, with the next id of the table as SQLite would give it.
+
+        Returns:
+            The row ID of the inserted row
+        """
+        cursor = self.conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+        row_id = cursor.fetchone()[0]
+        super().insert(table, ("id", *columns), (row_id, *values))
+        return row_id
+
+    def stats_reader(self, **options) -> "DuckDBStatsReader":
+        """
+        Open a DuckDBStatsReader on this database for the named dashboard statistics.
+
+        Args:
+            options: Cache sizes passed on to StatsReader
+
+        Returns:
+            A DuckDBStatsReader on a connection of its own to this database
+        """
+        return DuckDBStatsReader(
+            self.database_file, conn=self.conn.duplicate(), **options
+        )
+
+    def create_required_tables(self) -> int:
+        """
+        Create the tables of the current schema version.
+
+        Returns:
+            int: The schema version of the database
+        """
+        tables, versions = duckdb_schema()
+        self.conn.begin()
+        try:
+            for sql in tables.values():
+                self.conn.execute(sql)
+            self.conn.executemany(
+                "INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+                versions,
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        logging.info(f"DuckDB tables created at schema version {SCHEMA_VERSION}.")
+        return SCHEMA_VERSION
+
+
+# Absolute time and time bucket of the timeline queries in DuckDB's dialect. DuckDB has
+# no 'unixepoch' modifier, so the time is rounded to milliseconds as SQLite does and
+# formatted as a timestamp, and it rounds a double cast to an integer where SQLite truncates.
+_DUCKDB_ABSOLUTE_TIME = (
+    "strftime(make_timestamp(CAST(ROUND(((SELECT start_time FROM Mission WHERE id = :mission_id) "
+    "+ {seconds}) * 1000) AS BIGINT) * 1000), '%Y-%m-%dT%H:%M:%S.%gZ')"
+)
+_DUCKDB_BUCKET = "CAST(TRUNC(time / :bucket) AS BIGINT) * :bucket"
+
+
+class DuckDBStatsReader(StatsReader):
+    """
+    StatsReader for a DuckDB database, with the same queries and results.
+
+    DuckDB has no PRAGMA data_version, so the reader compares the counter
+    in DataVersion instead, which every transaction that changes the data
+    adds one to as it commits.
+    """
+
+    timeline_sql, timeline_events_sql = timeline_queries(
+        _DUCKDB_ABSOLUTE_TIME, _DUCKDB_BUCKET
+    )
+    no_limit = None
+
+    def __init__(
+        self,
+        database_file: str,
+        cache_size: int = STATS_RESULT_CACHE_SIZE,
+        statement_cache_size: int = STATS_STATEMENT_CACHE_SIZE,
+        conn: DuckDBConnection = None,
+    ):
+        """
+        Open a read-only connection to a tacview2db DuckDB database.
+
+        Args:
+            database_file (str): Path to the DuckDB database file
+            cache_size (int): Number of query results kept, 0 to disable the result cache
+            statement_cache_size (int): Not used, DuckDB plans each query as it runs
+            conn (DuckDBConnection): Connection to use rather than opening the file,
+                needed when this process already has the file open for writing
+        """
+        self._shared_conn = conn
+        super().__init__(database_file, cache_size, statement_cache_size)
+
+    def _connect(self, database_file: str, statement_cache_size: int):
+        if self._shared_conn is not None:
+            return self._shared_conn
+        return DuckDBConnection(duckdb.connect(database_file, read_only=True))
+
+    def stream(self, name: str, mission_id: int = None, batch_size: int = 1000):
+        """
+        Yield the rows of a named query without holding them all in memory.
+        Streamed results are not cached.
+
+        The query runs on a DuckDB connection of its own, as the reader's
+        fetches the rows of each statement as it runs, so other queries can be
+        made before the iterator is finished.
+
+        Args:
+            name (str): Name of an entry in STATS_QUERIES
+            mission_id (int): Only return rows of this mission (default: all missions)
+            batch_size (int): Rows fetched from DuckDB at a time
+        """
+        sql, parameters = _named_parameters(
+            self.sql(name, mission_id), {"mission_id": mission_id}
+        )
+        conn = self.conn.duckdb_conn.cursor()
+        try:
+            conn.execute(sql, parameters or None)
+            while rows := conn.fetchmany(batch_size):
+                yield from rows
+        finally:
+            conn.close()
+
+    def _read_data_version(self) -> int:
+        return self.conn.execute('SELECT "version" FROM "DataVersion"').fetchone()[0]
@@ -0,0 +1,217 @@
+import logging
+import sqlite3
+from itertools import groupby
+
+# Actions that take part in an engagement. Other events are not looked at.
+ENGAGEMENT_ACTIONS = ("HasFired", "HasBeenHitBy", "HasBeenDestroyed")
+
+# Columns written for each engagement, in the order EngagementBuilder produces them.
+ENGAGEMENT_COLUMNS = (
+    "mission_id",
+    "shooter_id",
+    "shooter",
+    "shooter_pilot",
+    "shooter_coalition",
+    "weapon_id",
+    "weapon",
+    "weapon_type",
+    "target_id",
+    "target",
+    "target_type",
+    "target_pilot",
+    "target_coalition",
+    "fired_time",
+    "hit_time",
+    "destroyed_time",
+    "outcome",
+    "fired_event_id",
+    "hit_event_id",
+    "destroyed_event_id",
+)
+
+# Reads the objects of the engagement events in the layout of EventRecord, ordered
+# so each mission's events come together and in time order.
+_ENGAGEMENT_EVENTS_SQL = """
+    SELECT Event.mission_id, Event.id, Event.time, Event.action,
+        p.tacview_id, p.type, p.name, p.pilot, p.coalition, p.country, p.obj_group, p.parent_id,
+        s.tacview_id, s.type, s.name, s.pilot, s.coalition, s.country, s.obj_group, s.parent_id,
+        pa.id, pa.type, pa.name, pa.pilot, pa.coalition, pa.country, pa.obj_group
+    FROM Event
+    INNER JOIN PrimaryObject p ON p.event_id = Event.id
+    LEFT JOIN SecondaryObject s ON s.event_id = Event.id
+    LEFT JOIN ParentObject pa ON pa.event_id = Event.id
+    WHERE Event.action IN ('HasFired', 'HasBeenHitBy', 'HasBeenDestroyed') {mission}
+    ORDER BY Event.mission_id, Event.time, Event.id
+"""
+
+
+class EngagementBuilder:
+    """
+    Reconstructs the engagements of one mission from its events in a single
+    pass over them in time order.
+
+    A HasFired event starts an engagement between its primary object (the
+    shooter) and its secondary object (the weapon). HasBeenHitBy finds the
+    engagement by the weapon's Tacview id and fills in the target; a weapon
+    that hits more than one target gets an engagement per target, and a hit
+    by a weapon whose launch was not recorded starts one from the hit, with
+    the shooter taken from the parent object. HasBeenDestroyed turns the last
+    hit on the destroyed object into a kill, or records a kill without a
+    weapon when only the killer is known.
+
+    Engagements keep the outcome "miss", "hit" or "kill".
+    """
+
+    def __init__(self, mission_id: int):
+        self.mission_id = mission_id
+        self._engagements = []
+        # Latest engagement of each weapon and latest hit on each target, by Tacview id.
+        self._weapons = {}
+        self._targets = {}
+
+    def add(self, event_id: int, time: float, action: str, primary, secondary, parent):
+        """
+        Add an event. Objects are in the layout of EventRecord, and events must
+        be added in time order. Events of other actions are ignored.
+        """
+        if action == "HasFired":
+            if secondary is not None:
+                engagement = self._new(primary, secondary)
+                engagement["fired_time"] = time
+                engagement["fired_event_id"] = event_id
+                self._weapons[secondary[0]] = engagement
+
+        elif action == "HasBeenHitBy":
+            if secondary is None:
+                return
+            engagement = self._weapons.get(secondary[0])
+            if engagement is None:
+                # The launch was not recorded, the weapon's parent is the shooter.
+                shooter = (secondary[7], *(parent or (None,) * 6))
+                if shooter[0] == "n/a":
+                    shooter = (None, *shooter[1:])
+                engagement = self._new(shooter, secondary)
+                self._weapons[secondary[0]] = engagement
+            elif engagement["target_id"] is not None:
+                engagement = self._copy(engagement)
+            self._set_target(engagement, primary)
+            engagement["hit_time"] = time
+            engagement["hit_event_id"] = event_id
+            engagement["outcome"] = "hit"
+            self._targets[primary[0]] = engagement
+
+        elif action == "HasBeenDestroyed":
+            engagement = self._targets.pop(primary[0], None)
+            if engagement is None:
+                if secondary is None:
+                    return
+                # Killed without a recorded hit, e.g. by guns or a collision.
+                engagement = self._new(secondary, None)
+                self._set_target(engagement, primary)
+            engagement["destroyed_time"] = time
+            engagement["destroyed_event_id"] = event_id
+            engagement["outcome"] = "kill"
+
+    def engagements(self) -> list[tuple]:
+        """
+        Return the engagements as rows in ENGAGEMENT_COLUMNS order, by launch.
+        """
+        return [
+            tuple(engagement[column] for column in ENGAGEMENT_COLUMNS)
+            for engagement in self._engagements
+        ]
+
+    def _new(self, shooter, weapon) -> dict:
+        engagement = dict.fromkeys(ENGAGEMENT_COLUMNS)
+        engagement["mission_id"] = self.mission_id
+        engagement["shooter_id"] = shooter[0]
+        engagement["shooter"] = shooter[2]
+        engagement["shooter_pilot"] = shooter[3]
+        engagement["shooter_coalition"] = shooter[4]
+        if weapon is not None:
+            engagement["weapon_id"] = weapon[0]
+            engagement["weapon_type"] = weapon[1]
+            engagement["weapon"] = weapon[2]
+        engagement["outcome"] = "miss"
+        self._engagements.append(engagement)
+        return engagement
+
+    def _copy(self, engagement: dict) -> dict:
+        copy = dict(engagement)
+        for column in ENGAGEMENT_COLUMNS[ENGAGEMENT_COLUMNS.index("target_id") :]:
+            if not column.startswith("fired_"):
+                copy[column] = None
+        self._engagements.append(copy)
+        return copy
+
+    @staticmethod
+    def _set_target(engagement: dict, target):
+        engagement["target_id"] = target[0]
+        engagement["target_type"] = target[1]
+        engagement["target"] = target[2]
+        engagement["target_pilot"] = target[3]
+        engagement["target_coalition"] = target[4]
+
+
+def has_engagements(conn: sqlite3.Connection) -> bool:
+    """
+    Return True if the database has the Engagement table (schema version 3 and later).
+    """
+    cursor = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Engagement'"
+    )
+    return cursor.fetchone() is not None
+
+
+def rebuild_engagements(conn: sqlite3.Connection, mission_id: int = None) -> int:
+    """
+    Rebuild the Engagement rows of one mission, or of every mission, from the
+    events already in the database. Runs in the caller's transaction.
+
+    Returns:
+        The number of engagements written
+    """
+    if mission_id is None:
+        conn.execute('DELETE FROM "Engagement"')
+    else:
+        conn.execute('DELETE FROM "Engagement" WHERE mission_id = ?', (mission_id,))
+    # Ids are given, as SQLite would allocate them, because a DuckDB database has no rowid to fill them in.
+    cursor = conn.execute('SELECT COALESCE(MAX(id), 0) FROM "Engagement"')
+    last_id = cursor.fetchone()[0]
+    if mission_id is None:
+        rows = conn.execute(_ENGAGEMENT_EVENTS_SQL.format(mission=""))
+    else:
+        rows = conn.execute(
+            _ENGAGEMENT_EVENTS_SQL.format(mission="AND Event.mission_id = ?"),
+            (mission_id,),
+        )
+
+    insert = (
+        f'INSERT INTO "Engagement" (id, {", ".join(ENGAGEMENT_COLUMNS)}) '
+        f'VALUES ({",".join("?" * (len(ENGAGEMENT_COLUMNS) + 1))})'
+    )
+    count = 0
+    for mission, events in groupby(rows, key=lambda row: row[0]):
+        builder = EngagementBuilder(mission)
+        for row in events:
+            builder.add(
+                row[1],
+                row[2],
+                row[3],
+                row[4:12],
+                row[12:20] if row[12] is not None else None,
+                row[21:27] if row[20] is not None else None,
+            )
+        engagements = builder.engagements()
+        conn.executemany(
+            insert,
+            [
+                (last_id + number, *engagement)
+                for number, engagement in enumerate(engagements, 1)
+            ],
+        )
+        last_id += len(engagements)
+        count += len(engagements)
+
+    logging.info(f"{count} engagements rebuilt.")
+    return count
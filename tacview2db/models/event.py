@@ -12,8 +12,7 @@ class Event:
         self.action = xml_tree.find("Action").text
 
     def write_to_db(self, db: Database, mission_id: int) -> int:
-        sql = """ INSERT INTO Event(mission_id,time,action)
-							VALUES(?,?,?) """
+        columns = ("mission_id", "time", "action")
 
         db_values = (
             mission_id,
@@ -21,6 +20,6 @@ class Event:
             self.action,
         )
 
-        self.id = db.execute_sql_statement(sql, db_values)
+        self.id = db.insert("Event", columns, db_values)
 
         return self.id
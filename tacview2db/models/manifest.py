@@ -0,0 +1,348 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+from models.database import Database
+from models.schema import IMPORT_TABLES, has_column
+from models.sources import hash_source, source_stat
+
+# Tables of the import manifest and of the checkpoints of interrupted imports.
+MANIFEST_TABLES = (
+    """
+                CREATE TABLE IF NOT EXISTS "ImportManifest" (
+                "path" char(1024) PRIMARY KEY NOT NULL,
+                "size" integer NOT NULL,
+                "mtime" real NOT NULL,
+                "content_hash" char(64) NOT NULL,
+                "mission_id" integer NOT NULL,
+                "imported_at" char(32),
+                "mission_identity" text
+                );
+            """,
+    """
+                CREATE TABLE IF NOT EXISTS "ImportCheckpoint" (
+                "path" char(1024) PRIMARY KEY NOT NULL,
+                "content_hash" char(64) NOT NULL,
+                "mission_id" integer NOT NULL,
+                "events" integer NOT NULL,
+                "byte_offset" integer,
+                "updated_at" char(32),
+                "mission_identity" text
+                );
+            """,
+)
+
+
+def encode_identity(identity: tuple) -> str:
+    """
+    Store a Mission.identity in a manifest or checkpoint row, as a JSON list.
+    """
+    return None if identity is None else json.dumps(identity)
+
+
+def decode_identity(value: str) -> tuple:
+    """
+    Read a Mission.identity stored by encode_identity. Rows written before
+    identities were stored have None.
+    """
+    return None if value is None else tuple(json.loads(value))
+
+
+class ImportCheckpoint:
+    """
+    Progress of a file whose import is committed in batches. It is written in
+    the same transaction as each batch of rows, so after a crash it describes
+    exactly what the database holds: the mission the file is being imported
+    as and its identity, how many of its events are committed, and the offset
+    in the decoded XML just after the last of them (None when the import
+    cannot seek, e.g. for ACMI recordings). It is deleted when the file's
+    import completes.
+    """
+
+    path: str
+    content_hash: str
+    mission_id: int
+    events: int
+    byte_offset: int
+    mission_identity: tuple
+
+    def __init__(
+        self,
+        path: str,
+        content_hash: str,
+        mission_id: int = None,
+        events: int = 0,
+        byte_offset: int = None,
+        mission_identity: tuple = None,
+    ):
+        self.path = path
+        self.content_hash = content_hash
+        self.mission_id = mission_id
+        self.events = events
+        self.byte_offset = byte_offset
+        self.mission_identity = mission_identity
+
+    def write_to_db(self, db: Database, mission_id: int, events: int, byte_offset: int):
+        sql = """ INSERT OR REPLACE INTO ImportCheckpoint(path, content_hash, mission_id, events, byte_offset, updated_at, mission_identity)
+                    VALUES(?,?,?,?,?,?,?) """
+        self.mission_id = mission_id
+        self.events = events
+        self.byte_offset = byte_offset
+        db_values = (
+            self.path,
+            self.content_hash,
+            mission_id,
+            events,
+            byte_offset,
+            datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            encode_identity(self.mission_identity),
+        )
+        # Executed inside the caller's transaction when db is a BulkWriter, with the batch it describes.
+        db.execute_sql_statement(sql, db_values)
+
+    def delete_from_db(self, db: Database):
+        db.execute_sql_statement(
+            "DELETE FROM ImportCheckpoint WHERE path = ?", (self.path,)
+        )
+
+
+class ImportRecord:
+    """
+    Describes one file about to be imported: its identity on disk, its content
+    hash and, if it was imported before with different content, the mission
+    that the new import replaces. mission_identity is the Mission.identity of
+    the mission it is recorded with, set by the importer before writing it.
+    """
+
+    path: str
+    size: int
+    mtime: float
+    content_hash: str
+    previous_mission_id: int
+    checkpoint: ImportCheckpoint
+    abandoned_mission_id: int
+    mission_identity: tuple
+
+    def __init__(
+        self,
+        path: str,
+        size: int,
+        mtime: float,
+        content_hash: str,
+        previous_mission_id: int = None,
+    ):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.content_hash = content_hash
+        self.previous_mission_id = previous_mission_id
+        # Set when an interrupted import of the same content can be resumed.
+        self.checkpoint = None
+        # The partial mission of an interrupted import that cannot be resumed, replaced by this one.
+        self.abandoned_mission_id = None
+        self.mission_identity = None
+
+    def write_to_db(self, db: Database, mission_id: int):
+        sql = """ INSERT OR REPLACE INTO ImportManifest(path, size, mtime, content_hash, mission_id, imported_at, mission_identity)
+                    VALUES(?,?,?,?,?,?,?) """
+        db_values = (
+            self.path,
+            self.size,
+            self.mtime,
+            self.content_hash,
+            mission_id,
+            datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            encode_identity(self.mission_identity),
+        )
+        # Executed inside the caller's transaction when db is a BulkWriter.
+        db.execute_sql_statement(sql, db_values)
+
+
+class ImportManifest:
+    """
+    Tracks which files have already been imported so that re-running over an
+    archive directory only processes new or changed files.
+
+    Unchanged files are detected with a stat() comparison of size and mtime.
+    The content hash is only computed when a file is new or its stat changed.
+
+    Files whose import was interrupted have an ImportCheckpoint instead of a
+    manifest entry. They are always imported again, resuming from the
+    checkpoint if the content and the committed rows still match it.
+
+    Mission ids are given out again once the newest missions are deleted, so
+    entries and checkpoints also store the identity (name, date, recording
+    time and source) of their mission. An entry only counts while the
+    mission with its id still has that identity.
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.create_table()
+        self._entries = {}
+        self._hashes = {}
+        self._checkpoints = {}
+        self.load()
+
+    def create_table(self):
+        for sql in MANIFEST_TABLES:
+            self.db.conn.execute(sql)
+        # Tables created before mission identities were stored.
+        for table in IMPORT_TABLES:
+            if not has_column(self.db.conn, table, "mission_identity"):
+                self.db.conn.execute(
+                    f'ALTER TABLE "{table}" ADD COLUMN "mission_identity" text'
+                )
+        self.db.conn.commit()
+
+    def load(self):
+        """
+        Load every manifest entry into memory once per batch.
+        """
+        cursor = self.db.conn.execute(
+            "SELECT path, size, mtime, content_hash, mission_id, mission_identity FROM ImportManifest"
+        )
+        for path, size, mtime, content_hash, mission_id, identity in cursor:
+            identity = decode_identity(identity)
+            self._entries[path] = (size, mtime, content_hash, mission_id, identity)
+            self._hashes[content_hash] = (mission_id, identity)
+        cursor = self.db.conn.execute(
+            "SELECT path, content_hash, mission_id, events, byte_offset, mission_identity FROM ImportCheckpoint"
+        )
+        for *row, identity in cursor:
+            self._checkpoints[row[0]] = ImportCheckpoint(
+                *row, decode_identity(identity)
+            )
+
+    def check_file(self, filename: str, force: bool = False):
+        """
+        Decide whether a file needs to be imported.
+
+        Args:
+            filename: Path to the file
+            force: Re-import the file even if it is unchanged
+
+        Returns:
+            An ImportRecord if the file should be imported, or None if it can be skipped
+        """
+        path = os.path.abspath(filename)
+        stat = source_stat(path)
+        entry = self._entries.get(path)
+        checkpoint = self._checkpoints.pop(path, None)
+
+        if not force and checkpoint is None and self.is_unchanged(path, stat):
+            logging.info(f"File {filename} is unchanged since last import.")
+            return None
+
+        content_hash = self.hash_file(path)
+        record = ImportRecord(path, stat.st_size, stat.st_mtime, content_hash)
+
+        if checkpoint is not None:
+            if not force and self._can_resume(checkpoint, content_hash):
+                logging.warning(
+                    f"Resuming the interrupted import of {filename} as mission {checkpoint.mission_id} "
+                    f"after {checkpoint.events} committed events."
+                )
+                record.checkpoint = checkpoint
+            else:
+                logging.warning(
+                    f"The interrupted import of {filename} cannot be resumed and starts over."
+                )
+                # The partial mission is only replaced if its id has not been given to another one since.
+                if self._mission_matches(
+                    checkpoint.mission_id, checkpoint.mission_identity
+                ):
+                    record.abandoned_mission_id = checkpoint.mission_id
+        elif not force:
+            # Same content under this or another path: just remember the new stat details.
+            mission_id, identity = self._hashes.get(content_hash, (None, None))
+            if mission_id is not None and self._mission_matches(mission_id, identity):
+                logging.info(
+                    f"File {filename} content already imported as mission {mission_id}."
+                )
+                record.mission_identity = identity
+                record.write_to_db(self.db, mission_id)
+                self._remember(record, mission_id)
+                return None
+
+        if entry and self._mission_matches(entry[3], entry[4]):
+            logging.warning(
+                f"File {filename} has changed and will replace mission {entry[3]}."
+            )
+            record.previous_mission_id = entry[3]
+
+        return record
+
+    def is_unchanged(self, filename: str, stat: os.stat_result = None) -> bool:
+        """
+        Return True if the file was imported before and its size and modification
+        time have not changed since. Only a stat() is needed, the file is not read.
+        """
+        entry = self._entries.get(os.path.abspath(filename))
+        if entry is None:
+            return False
+        if stat is None:
+            stat = source_stat(filename)
+        size, mtime, content_hash, mission_id, identity = entry
+        return (
+            size == stat.st_size
+            and mtime == stat.st_mtime
+            and self._mission_matches(mission_id, identity)
+        )
+
+    def record_imported(self, record: ImportRecord, mission_id: int):
+        """
+        Update the in-memory view after a record was committed with its mission.
+        """
+        self._remember(record, mission_id)
+
+    def _remember(self, record: ImportRecord, mission_id: int):
+        self._entries[record.path] = (
+            record.size,
+            record.mtime,
+            record.content_hash,
+            mission_id,
+            record.mission_identity,
+        )
+        self._hashes[record.content_hash] = (mission_id, record.mission_identity)
+
+    def _can_resume(self, checkpoint: ImportCheckpoint, content_hash: str) -> bool:
+        """
+        Return True if the file still has the content the checkpoint was taken
+        from, and its mission holds exactly the events the checkpoint counts.
+        """
+        if checkpoint.content_hash != content_hash:
+            return False
+        cursor = self.db.conn.execute(
+            "SELECT COUNT(*) FROM Event WHERE mission_id = ?", (checkpoint.mission_id,)
+        )
+        events = cursor.fetchone()[0]
+        return (
+            self._mission_matches(checkpoint.mission_id, checkpoint.mission_identity)
+            and events == checkpoint.events
+        )
+
+    def _mission_matches(self, mission_id: int, identity: tuple) -> bool:
+        """
+        Return True if the mission an entry or checkpoint was recorded with is
+        still in the database. It may have been deleted since, and its id given
+        to another mission, so the identity stored with the entry must match.
+        Entries written before identities were stored only need the id to exist.
+        """
+        cursor = self.db.conn.execute(
+            "SELECT name, date, recording_time, source FROM Mission WHERE id = ?",
+            (mission_id,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        return identity is None or tuple(row) == identity
+
+    def hash_file(self, path: str) -> str:
+        """
+        Compute the SHA-256 of a file, or of the export inside an archive, reading it in chunks.
+        """
+        return hash_source(path, self.HASH_CHUNK_SIZE)
@@ -1,6 +1,12 @@
 import xml.etree.ElementTree as ET
 import logging
 from models.database import Database
+from models.engagement import has_engagements
+from models.records import mission_start_time
+from models.schema import has_column
+
+# What to do when a file's mission is already in the database.
+DUPLICATE_POLICIES = ("skip", "replace", "append")
 
 
 class Mission:
@@ -12,6 +18,7 @@ class Mission:
     recorder: str
     recordingTime: str
     author: str
+    startTime: float
 
     def __init__(self, xml_tree: ET):
         self.name = xml_tree[1][0].text
@@ -21,12 +28,28 @@ class Mission:
         self.recorder = xml_tree[0][1].text
         self.recordingTime = xml_tree[0][2].text
         self.author = xml_tree[0][3].text
+        self.startTime = mission_start_time(self.time)
+
+    @property
+    def identity(self) -> tuple:
+        """
+        The values that identify a recording of a mission, matching the
+        Mission(name, date, recording_time, source) index.
+        """
+        return (self.name, self.time, self.recordingTime, self.source)
 
     def write_to_db(self, db: Database) -> int:
         logging.info(f"Attempting to add mission named {self.name} to database.")
 
-        sql = """ INSERT INTO Mission(name,date,duration, source, recorder, recording_time, author)
-                                VALUES(?,?,?,?,?,?,?) """
+        columns = (
+            "name",
+            "date",
+            "duration",
+            "source",
+            "recorder",
+            "recording_time",
+            "author",
+        )
         db_values = (
             self.name,
             self.time,
@@ -36,25 +59,91 @@ class Mission:
             self.recordingTime,
             self.author,
         )
+        # Databases not yet migrated to schema version 4 have no start time.
+        if has_column(db.conn, "Mission", "start_time"):
+            columns += ("start_time",)
+            db_values += (self.startTime,)
 
-        self.id = db.execute_sql_statement(sql, db_values)
+        self.id = db.insert("Mission", columns, db_values)
 
         logging.info("Created mission in database.")
 
         # Return the id of the newly created Mission record.
         return self.id
 
+    @staticmethod
+    def delete_from_db(db: Database, mission_id: int):
+        """
+        Delete a mission and all of its Event, Primary, Secondary, Parent and Engagement rows.
+        When db is a BulkWriter the deletes are part of its transaction.
+        """
+        logging.warning(f"Deleting mission {mission_id} and its event data.")
+
+        event_ids = "SELECT id FROM Event WHERE mission_id = ?"
+        statements = (
+            f"DELETE FROM ParentObject WHERE event_id IN ({event_ids})",
+            f"DELETE FROM SecondaryObject WHERE event_id IN ({event_ids})",
+            f"DELETE FROM PrimaryObject WHERE event_id IN ({event_ids})",
+            "DELETE FROM Event WHERE mission_id = ?",
+            "DELETE FROM Mission WHERE id = ?",
+        )
+        # Databases older than schema version 3 have no Engagement table.
+        if has_engagements(db.conn):
+            statements = ("DELETE FROM Engagement WHERE mission_id = ?", *statements)
+        for sql in statements:
+            db.execute_sql_statement(sql, (mission_id,))
+
     def check_mission_exists(self, db: Database) -> bool:
         logging.info(f"Checking if {self.name} already in database.")
 
-        sql = f"SELECT * FROM Mission WHERE name = '{self.name}'"
+        sql = """ SELECT id FROM Mission
+                    WHERE name IS ? AND date IS ? AND recording_time IS ? AND source IS ? """
 
-        # Execute query and commit to the db.
-        result = db.execute_sql_select_query(sql)
+        result = db.execute_sql_select_query(sql, self.identity)
 
-        # If the result is 0 then the mission was not found.
+        # If there is no result then the mission was not found.
         if result:
             logging.warning("Mission already exists in DB.")
             return True
         else:
             return False
+
+
+class MissionIndex:
+    """
+    In-memory lookup of mission identity to mission ids, loaded once per batch
+    so that duplicate detection does not query the Mission table for every file.
+    """
+
+    def __init__(self, db: Database):
+        self.create_index(db)
+        self._missions = {}
+
+        cursor = db.conn.execute(
+            "SELECT id, name, date, recording_time, source FROM Mission"
+        )
+        for mission_id, *identity in cursor:
+            self._missions.setdefault(tuple(identity), []).append(mission_id)
+
+    @staticmethod
+    def create_index(db: Database):
+        # Not UNIQUE: databases imported before de-duplication already hold duplicates,
+        # and the append policy deliberately stores repeats.
+        sql = """ CREATE INDEX IF NOT EXISTS "idx_mission_identity"
+                    ON "Mission" ("name", "date", "recording_time", "source") """
+        db.conn.execute(sql)
+        db.conn.commit()
+
+    def find(self, mission: Mission) -> list[int]:
+        """
+        Return the ids of missions with the same identity, oldest first.
+        """
+        return list(self._missions.get(mission.identity, ()))
+
+    def add(self, mission: Mission):
+        self._missions.setdefault(mission.identity, []).append(mission.id)
+
+    def remove(self, mission_ids):
+        removed = set(mission_ids)
+        for ids in self._missions.values():
+            ids[:] = [mission_id for mission_id in ids if mission_id not in removed]
@@ -38,8 +38,16 @@ class Parent:
             return False
 
     def write_to_db(self, db: Database, event_id: int, secondary_object_id: int) -> int:
-        sql = """ INSERT INTO ParentObject(event_id, tacview_id, type, name, pilot, coalition, country, obj_group)
-						VALUES(?,?,?,?,?,?,?,?) """
+        columns = (
+            "event_id",
+            "tacview_id",
+            "type",
+            "name",
+            "pilot",
+            "coalition",
+            "country",
+            "obj_group",
+        )
 
         db_values = (
             event_id,
@@ -51,7 +59,7 @@ class Parent:
             self.country,
             self.group,
         )
-        # Execute query and commit to the db.
-        record_id = db.execute_sql_statement(sql, db_values)
+        # Committed immediately by Database, or buffered by a BulkWriter.
+        record_id = db.insert("ParentObject", columns, db_values)
 
         return record_id
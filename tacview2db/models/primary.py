@@ -25,8 +25,17 @@ class Primary:
         self.parent_id = getattr(xml_data.find("Parent"), "text", "n/a")
 
     def write_to_db(self, db: Database, event_id: int) -> int:
-        sql = """ INSERT INTO PrimaryObject(event_id, tacview_id, type, name, pilot, coalition, country, obj_group, parent_id)
-							VALUES(?,?,?,?,?,?,?,?,?) """
+        columns = (
+            "event_id",
+            "tacview_id",
+            "type",
+            "name",
+            "pilot",
+            "coalition",
+            "country",
+            "obj_group",
+            "parent_id",
+        )
 
         db_values = (
             event_id,
@@ -40,6 +49,6 @@ class Primary:
             self.parent_id,
         )
 
-        self.id = db.execute_sql_statement(sql, db_values)
+        self.id = db.insert("PrimaryObject", columns, db_values)
 
         return self.id
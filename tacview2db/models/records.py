@@ -0,0 +1,133 @@
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+# Columns written for each record type. The values produced by extract_event follow the same order.
+EVENT_COLUMNS = ("mission_id", "time", "action")
+OBJECT_COLUMNS = (
+    "event_id",
+    "tacview_id",
+    "type",
+    "name",
+    "pilot",
+    "coalition",
+    "country",
+    "obj_group",
+    "parent_id",
+)
+PARENT_COLUMNS = (
+    "event_id",
+    "tacview_id",
+    "type",
+    "name",
+    "pilot",
+    "coalition",
+    "country",
+    "obj_group",
+)
+
+
+class EventRecord:
+    """
+    Compact representation of one <Event> element.
+
+    primary and secondary hold (tacview_id, type, name, pilot, coalition,
+    country, obj_group, parent_id). parent holds (type, name, pilot, coalition,
+    country, obj_group) because its tacview_id column stores the id of the
+    secondary object row. secondary and parent are None when absent.
+    """
+
+    __slots__ = ("time", "action", "primary", "secondary", "parent")
+
+    def __init__(self, time, action, primary, secondary=None, parent=None):
+        self.time = time
+        self.action = action
+        self.primary = primary
+        self.secondary = secondary
+        self.parent = parent
+
+    def __reduce__(self):
+        # Plain tuple pickling keeps records small when sent back from worker processes.
+        return (
+            EventRecord,
+            (self.time, self.action, self.primary, self.secondary, self.parent),
+        )
+
+
+# Position of each child element of an object in its values, after the tacview_id.
+_OBJECT_FIELDS = {
+    "Type": 1,
+    "Name": 2,
+    "Pilot": 3,
+    "Coalition": 4,
+    "Country": 5,
+    "Group": 6,
+    "Parent": 7,
+}
+
+
+def _object_values(xml_data: ET.Element) -> tuple:
+    # Missing elements keep the same defaults the model classes use.
+    values = [xml_data.get("ID"), "n/a", None, "n/a", "n/a", "n/a", "n/a", "n/a"]
+    field = _OBJECT_FIELDS.get
+    for child in xml_data:
+        index = field(child.tag)
+        if index is not None:
+            # An empty element stores None, as its .text did in the model classes.
+            values[index] = child.text
+    return tuple(values)
+
+
+def extract_event(xml_tree: ET.Element) -> EventRecord:
+    """
+    Extract the fields of an <Event> element into an EventRecord.
+
+    The children of the event, and of each of its objects, are walked once
+    and each field is read once, with no intermediate model objects.
+
+    Args:
+        xml_tree: The <Event> element
+
+    Returns:
+        The EventRecord for the event
+    """
+    time = action = primary = secondary = parent_data = None
+    for child in xml_tree:
+        tag = child.tag
+        if tag == "PrimaryObject":
+            primary = _object_values(child)
+        elif tag == "SecondaryObject":
+            secondary = _object_values(child)
+        elif tag == "ParentObject":
+            parent_data = child
+        elif tag == "Time":
+            time = child.text
+        elif tag == "Action":
+            action = child.text
+
+    # A Parent object can only appear if a secondary object is present.
+    parent = None
+    if secondary is not None and parent_data is not None:
+        parent = _object_values(parent_data)[1:7]
+
+    # Times are stored as seconds from the start of the mission.
+    return EventRecord(float(time), action, primary, secondary, parent)
+
+
+def mission_start_time(mission_time: str) -> float:
+    """
+    Convert a mission's date, e.g. "2023-06-01T16:15:00Z", to Unix time in
+    seconds, so the absolute time of an event is the start time plus Event.time.
+    Times without a time zone are taken as UTC.
+
+    Returns:
+        The Unix time, or None if the date is missing or not an ISO 8601 time
+    """
+    if not mission_time:
+        return None
+    try:
+        start = datetime.fromisoformat(mission_time)
+    except ValueError:
+        return None
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    return start.timestamp()
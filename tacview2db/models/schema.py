@@ -0,0 +1,771 @@
+import logging
+import sqlite3
+from datetime import datetime, timezone
+
+from models.engagement import rebuild_engagements
+from models.records import mission_start_time
+
+# Version of the schema this code writes. Each entry in MIGRATIONS upgrades a
+# database from the previous version to the one in its key.
+SCHEMA_VERSION = 4
+
+# Tables written by the ingest. Used to rebuild tables and to tell a fresh database from an old one.
+DATA_TABLES = (
+    "Mission",
+    "Event",
+    "PrimaryObject",
+    "SecondaryObject",
+    "ParentObject",
+    "Engagement",
+)
+
+# Tables of the import manifest and its checkpoints (models/manifest.py). They describe the
+# imported rows, so they are emptied whenever the data tables are.
+IMPORT_TABLES = ("ImportManifest", "ImportCheckpoint")
+
+_OBJECT_COLUMNS_V1 = """
+                "id" integer PRIMARY KEY NOT NULL,
+                "event_id" integer(128) NOT NULL,
+                "tacview_id" char(128) NOT NULL,
+                "type" char(128),
+                "name" char(128),
+                "pilot" char(128),
+                "coalition" char(128),
+                "country" char(128),
+                "obj_group" char(128)"""
+
+_OBJECT_COLUMNS_V2 = """
+                "id" integer PRIMARY KEY NOT NULL,
+                "event_id" integer NOT NULL REFERENCES "Event" ("id") ON DELETE CASCADE,
+                "tacview_id" text NOT NULL,
+                "type" text,
+                "name" text,
+                "pilot" text,
+                "coalition" text,
+                "country" text,
+                "obj_group" text"""
+
+# Version 1 is the layout tacview2db has always used. CREATE ... IF NOT EXISTS
+# makes it a no-op on existing databases and creates the tables on new ones.
+_SCHEMA_V1 = (
+    """
+                CREATE TABLE IF NOT EXISTS "Mission" (
+                "id" integer PRIMARY KEY NOT NULL,
+                "name" char(128),
+                "date" char(128),
+                "duration" char(128),
+                "source" char(128),
+                "recorder" char(128),
+                "recording_time" char(128),
+                "author" char(128)
+                );
+            """,
+    """
+                CREATE TABLE IF NOT EXISTS "Event" (
+                "id" integer PRIMARY KEY NOT NULL,
+                "mission_id" integer(128) NOT NULL,
+                "time" char(128) NOT NULL,
+                "action" char(128) NOT NULL
+                );
+            """,
+    f"""
+                CREATE TABLE IF NOT EXISTS "PrimaryObject" ({_OBJECT_COLUMNS_V1},
+                "parent_id" char(128)
+                );
+            """,
+    f"""
+                CREATE TABLE IF NOT EXISTS "SecondaryObject" ({_OBJECT_COLUMNS_V1},
+                "parent_id" char(128)
+                );
+            """,
+    f"""
+                CREATE TABLE IF NOT EXISTS "ParentObject" ({_OBJECT_COLUMNS_V1}
+                );
+            """,
+    """
+                CREATE TABLE IF NOT EXISTS "ImportManifest" (
+                "path" char(1024) PRIMARY KEY NOT NULL,
+                "size" integer NOT NULL,
+                "mtime" real NOT NULL,
+                "content_hash" char(64) NOT NULL,
+                "mission_id" integer NOT NULL,
+                "imported_at" char(32)
+                );
+            """,
+    """
+                CREATE INDEX IF NOT EXISTS "idx_mission_identity"
+                ON "Mission" ("name", "date", "recording_time", "source");
+            """,
+)
+
+# Version 2 gives the data tables numeric and foreign key typed columns.
+# Tables are rebuilt and their rows copied across, with time and duration cast to numbers.
+_TABLES_V2 = {
+    "Mission": (
+        """
+                CREATE TABLE "Mission__new" (
+                "id" integer PRIMARY KEY NOT NULL,
+                "name" text,
+                "date" text,
+                "duration" real,
+                "source" text,
+                "recorder" text,
+                "recording_time" text,
+                "author" text
+                );
+            """,
+        """ SELECT id, name, date, CAST(duration AS REAL), source, recorder, recording_time, author
+            FROM "Mission" """,
+    ),
+    "Event": (
+        """
+                CREATE TABLE "Event__new" (
+                "id" integer PRIMARY KEY NOT NULL,
+                "mission_id" integer NOT NULL REFERENCES "Mission" ("id") ON DELETE CASCADE,
+                "time" real NOT NULL,
+                "action" text NOT NULL
+                );
+            """,
+        """ SELECT id, mission_id, CAST(time AS REAL), action FROM "Event" """,
+    ),
+    "PrimaryObject": (
+        f"""
+                CREATE TABLE "PrimaryObject__new" ({_OBJECT_COLUMNS_V2},
+                "parent_id" text
+                );
+            """,
+        """ SELECT * FROM "PrimaryObject" """,
+    ),
+    "SecondaryObject": (
+        f"""
+                CREATE TABLE "SecondaryObject__new" ({_OBJECT_COLUMNS_V2},
+                "parent_id" text
+                );
+            """,
+        """ SELECT * FROM "SecondaryObject" """,
+    ),
+    "ParentObject": (
+        f"""
+                CREATE TABLE "ParentObject__new" ({_OBJECT_COLUMNS_V2}
+                );
+            """,
+        """ SELECT * FROM "ParentObject" """,
+    ),
+}
+
+# Indexes for the join and filter paths used by the dashboard views.
+# The rowid (id) is part of every index, so (action, mission_id) also covers Event.id joins.
+_INDEXES_V2 = (
+    """ CREATE INDEX IF NOT EXISTS "idx_event_mission_time" ON "Event" ("mission_id", "time") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_event_action" ON "Event" ("action", "mission_id") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_primary_event" ON "PrimaryObject" ("event_id") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_secondary_event" ON "SecondaryObject" ("event_id") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_parent_event" ON "ParentObject" ("event_id") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_primary_pilot" ON "PrimaryObject" ("pilot") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_parent_pilot" ON "ParentObject" ("pilot") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_mission_identity" ON "Mission" ("name", "date", "recording_time", "source") """,
+)
+
+
+# Version 3 adds the Engagement table, built from the fire, hit and destroy events of
+# each mission (see models/engagement.py), so weapon and kill statistics are indexed lookups.
+_SCHEMA_V3 = (
+    """
+                CREATE TABLE IF NOT EXISTS "Engagement" (
+                "id" integer PRIMARY KEY NOT NULL,
+                "mission_id" integer NOT NULL REFERENCES "Mission" ("id") ON DELETE CASCADE,
+                "shooter_id" text,
+                "shooter" text,
+                "shooter_pilot" text,
+                "shooter_coalition" text,
+                "weapon_id" text,
+                "weapon" text,
+                "weapon_type" text,
+                "target_id" text,
+                "target" text,
+                "target_type" text,
+                "target_pilot" text,
+                "target_coalition" text,
+                "fired_time" real,
+                "hit_time" real,
+                "destroyed_time" real,
+                "outcome" text NOT NULL,
+                "fired_event_id" integer,
+                "hit_event_id" integer,
+                "destroyed_event_id" integer
+                );
+            """,
+    """ CREATE INDEX IF NOT EXISTS "idx_engagement_mission" ON "Engagement" ("mission_id") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_engagement_weapon" ON "Engagement" ("weapon", "outcome") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_engagement_kills" ON "Engagement" ("outcome", "shooter_pilot") """,
+    """ CREATE INDEX IF NOT EXISTS "idx_engagement_target" ON "Engagement" ("target_pilot") """,
+)
+
+
+# Version 4 stores when each mission started as Unix time, so the absolute time of an
+# event is Mission.start_time + Event.time, and adds the action to the (mission_id, time)
+# index so timeline windows are counted from the index alone.
+_SCHEMA_V4 = (
+    """ ALTER TABLE "Mission" ADD COLUMN "start_time" real """,
+    """ DROP INDEX IF EXISTS "idx_event_mission_time" """,
+    """ CREATE INDEX "idx_event_mission_time" ON "Event" ("mission_id", "time", "action") """,
+)
+
+
+def _migrate_to_v1(conn: sqlite3.Connection):
+    for sql in _SCHEMA_V1:
+        conn.execute(sql)
+
+
+def _migrate_to_v2(conn: sqlite3.Connection):
+    for table, (create_sql, select_sql) in _TABLES_V2.items():
+        conn.execute(create_sql)
+        conn.execute(f'INSERT INTO "{table}__new" {select_sql}')
+        conn.execute(f'DROP TABLE "{table}"')
+        conn.execute(f'ALTER TABLE "{table}__new" RENAME TO "{table}"')
+        logging.info(f"Table {table} rebuilt with typed columns.")
+
+    for sql in _INDEXES_V2:
+        conn.execute(sql)
+
+
+def _migrate_to_v3(conn: sqlite3.Connection):
+    for sql in _SCHEMA_V3:
+        conn.execute(sql)
+    # Missions imported before version 3 get their engagements from the stored events.
+    rebuild_engagements(conn)
+
+
+def _migrate_to_v4(conn: sqlite3.Connection):
+    for sql in _SCHEMA_V4:
+        conn.execute(sql)
+    conn.executemany(
+        'UPDATE "Mission" SET start_time = ? WHERE id = ?',
+        [
+            (mission_start_time(date), mission_id)
+            for mission_id, date in conn.execute('SELECT id, date FROM "Mission"')
+        ],
+    )
+
+
+MIGRATIONS = {
+    1: _migrate_to_v1,
+    2: _migrate_to_v2,
+    3: _migrate_to_v3,
+    4: _migrate_to_v4,
+}
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """
+    Return the schema version of a database, 0 if it predates schema versioning.
+    """
+    cursor = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    )
+    if cursor.fetchone() is None:
+        return 0
+    return conn.execute(
+        "SELECT COALESCE(MAX(version), 0) FROM schema_version"
+    ).fetchone()[0]
+
+
+def has_column(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    """
+    Return True if a table has a column, e.g. one added by a later schema version.
+    """
+    return any(
+        row[1] == column for row in conn.execute(f'PRAGMA table_info("{table}")')
+    )
+
+
+def is_empty(conn: sqlite3.Connection) -> bool:
+    """
+    Return True if none of the data tables exist yet.
+    """
+    placeholders = ",".join("?" * len(DATA_TABLES))
+    cursor = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ({placeholders})",
+        DATA_TABLES,
+    )
+    return cursor.fetchone()[0] == 0
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Upgrade a database in place to SCHEMA_VERSION.
+
+    Each migration runs in its own transaction together with its schema_version
+    row, so an interrupted upgrade leaves the database at the last completed version.
+
+    Returns:
+        The schema version after migrating
+    """
+    if conn.in_transaction:
+        conn.commit()
+
+    version = get_schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        logging.info(f"Database schema is up to date at version {version}.")
+        return version
+
+    # Tables are rebuilt by dropping and renaming, which must not trip foreign key
+    # checks or rewrite the views that refer to the tables by name.
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            logging.info(f"Migrating database schema to version {target}.")
+            conn.execute("BEGIN")
+            try:
+                MIGRATIONS[target](conn)
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS schema_version (version integer NOT NULL, applied_at text NOT NULL)"
+                )
+                conn.execute(
+                    "INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+                    (target, datetime.now(timezone.utc).isoformat(timespec="seconds")),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logging.error(f"Migration to schema version {target} failed.")
+                raise
+    finally:
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+        conn.execute("PRAGMA foreign_keys = ON")
+
+    orphans = conn.execute("PRAGMA foreign_key_check").fetchall()
+    if orphans:
+        logging.warning(
+            f"{len(orphans)} rows reference a missing mission or event. They were kept as-is."
+        )
+
+    # Refresh planner statistics so the new indexes are used.
+    conn.execute("ANALYZE")
+    conn.commit()
+    logging.info(f"Database schema migrated to version {SCHEMA_VERSION}.")
+    return SCHEMA_VERSION
+
+
+# Representative dashboard queries. check_query_plans() verifies each one is
+# served by indexes rather than full scans of the event and object tables.
+DASHBOARD_QUERIES = {
+    "Events in a mission timeline": """
+        SELECT id, time, action FROM Event WHERE mission_id = 1 ORDER BY time
+    """,
+    "Events per minute in a timeline window": """
+        SELECT CAST(time / 60 AS INTEGER) * 60 AS bucket, action, COUNT(*)
+        FROM Event WHERE mission_id = 1 AND time >= 1800 AND time < 2400
+        GROUP BY bucket, action
+    """,
+    "Actions per mission": """
+        SELECT action, COUNT(*) FROM Event WHERE mission_id = 1 GROUP BY action
+    """,
+    "Units destroyed with type": """
+        SELECT Event.mission_id, PrimaryObject.type, PrimaryObject.name
+        FROM Event
+        INNER JOIN PrimaryObject ON Event.id = PrimaryObject.event_id
+        WHERE Event.action = 'HasBeenDestroyed' AND PrimaryObject.coalition = 'Allies'
+    """,
+    "Direct hits with weapon and shooter": """
+        SELECT Event.mission_id, PrimaryObject.name, SecondaryObject.name, ParentObject.pilot
+        FROM Event
+        INNER JOIN PrimaryObject ON Event.id = PrimaryObject.event_id
+        INNER JOIN SecondaryObject ON Event.id = SecondaryObject.event_id
+        INNER JOIN ParentObject ON Event.id = ParentObject.event_id
+        WHERE Event.action = 'HasBeenHitBy'
+    """,
+    "Weapons fired by a pilot": """
+        SELECT SecondaryObject.name, COUNT(*)
+        FROM PrimaryObject
+        INNER JOIN Event ON Event.id = PrimaryObject.event_id
+        INNER JOIN SecondaryObject ON Event.id = SecondaryObject.event_id
+        WHERE PrimaryObject.pilot = 'ASPEN | 161SQN' AND Event.action = 'HasFired'
+        GROUP BY SecondaryObject.name
+    """,
+    "Hit rate of a weapon": """
+        SELECT outcome, COUNT(*) FROM Engagement
+        WHERE weapon = 'AIM-120C AMRAAM' AND fired_event_id IS NOT NULL
+        GROUP BY outcome
+    """,
+    "Kills per call sign": """
+        SELECT shooter_pilot, COUNT(*) FROM Engagement
+        WHERE outcome = 'kill'
+        GROUP BY shooter_pilot
+    """,
+}
+
+# Tables that must never be read with a full table scan by the dashboard queries.
+_INDEXED_TABLES = (
+    "Event",
+    "PrimaryObject",
+    "SecondaryObject",
+    "ParentObject",
+    "PrimaryObjectData",
+    "SecondaryObjectData",
+    "ParentObjectData",
+    "Engagement",
+)
+
+
+def check_query_plans(conn: sqlite3.Connection) -> list[tuple]:
+    """
+    Run EXPLAIN QUERY PLAN for each dashboard query.
+
+    Returns:
+        A list of (query name, plan details, True if no event or object table is fully scanned)
+    """
+    results = []
+    for name, sql in DASHBOARD_QUERIES.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+        full_scans = [
+            detail
+            for detail in plan
+            if detail.startswith("SCAN ")
+            and detail.split()[1] in _INDEXED_TABLES
+            and "INDEX" not in detail
+        ]
+        results.append((name, plan, not full_scans))
+    return results
+
+
+# Optional dictionary-encoded storage for the object tables. Each distinct
+# (type, name, pilot, coalition, country, obj_group) is stored once in ObjectInfo
+# and the object rows keep only an integer key to it. Views with the original
+# table names and columns keep existing queries working.
+OBJECT_INFO_COLUMNS = ("type", "name", "pilot", "coalition", "country", "obj_group")
+
+# Object table -> (storage table, columns other than info_id kept in the storage table)
+NORMALISED_TABLES = {
+    "PrimaryObject": ("PrimaryObjectData", ("event_id", "tacview_id", "parent_id")),
+    "SecondaryObject": ("SecondaryObjectData", ("event_id", "tacview_id", "parent_id")),
+    "ParentObject": ("ParentObjectData", ("event_id", "tacview_id")),
+}
+
+_OBJECT_INFO_TABLE = (
+    """
+                CREATE TABLE "ObjectInfo" (
+                "id" integer PRIMARY KEY NOT NULL,
+                "type" text,
+                "name" text,
+                "pilot" text,
+                "coalition" text,
+                "country" text,
+                "obj_group" text
+                );
+            """,
+    """ CREATE INDEX "idx_object_info" ON "ObjectInfo" ("type", "name", "pilot", "coalition", "country", "obj_group") """,
+    """ CREATE INDEX "idx_object_info_pilot" ON "ObjectInfo" ("pilot") """,
+)
+
+
+def _normalised_table_sql(table: str) -> tuple[str]:
+    data_table, columns = NORMALISED_TABLES[table]
+    prefix = table[: -len("Object")].lower()
+    parent_column = (
+        ',\n                "parent_id" text' if "parent_id" in columns else ""
+    )
+    info_match = " AND ".join(
+        f"{column} IS NEW.{column}" for column in OBJECT_INFO_COLUMNS
+    )
+    new_info = ", ".join(f"NEW.{column}" for column in OBJECT_INFO_COLUMNS)
+    return (
+        f"""
+                CREATE TABLE "{data_table}" (
+                "id" integer PRIMARY KEY NOT NULL,
+                "event_id" integer NOT NULL REFERENCES "Event" ("id") ON DELETE CASCADE,
+                "tacview_id" text NOT NULL,
+                "info_id" integer NOT NULL REFERENCES "ObjectInfo" ("id"){parent_column}
+                );
+            """,
+        f"""
+                CREATE VIEW "{table}" AS
+                SELECT d.id, d.event_id, d.tacview_id, {", ".join(f"i.{column}" for column in OBJECT_INFO_COLUMNS)}{", d.parent_id" if parent_column else ""}
+                FROM "{data_table}" d INNER JOIN "ObjectInfo" i ON i.id = d.info_id;
+            """,
+        # Rows written through the view by code that predates normalised storage are interned here.
+        f"""
+                CREATE TRIGGER "{table}_insert" INSTEAD OF INSERT ON "{table}"
+                BEGIN
+                INSERT INTO "ObjectInfo" ({", ".join(OBJECT_INFO_COLUMNS)})
+                    SELECT {new_info}
+                    WHERE NOT EXISTS (SELECT 1 FROM "ObjectInfo" WHERE {info_match});
+                INSERT INTO "{data_table}" (id, {", ".join(columns)}, info_id)
+                    VALUES (NEW.id, {", ".join(f"NEW.{column}" for column in columns)},
+                    (SELECT id FROM "ObjectInfo" WHERE {info_match} LIMIT 1));
+                END;
+            """,
+        f"""
+                CREATE TRIGGER "{table}_delete" INSTEAD OF DELETE ON "{table}"
+                BEGIN
+                DELETE FROM "{data_table}" WHERE id = OLD.id;
+                END;
+            """,
+        f""" CREATE INDEX "idx_{prefix}_data_event" ON "{data_table}" ("event_id") """,
+        f""" CREATE INDEX "idx_{prefix}_data_info" ON "{data_table}" ("info_id") """,
+    )
+
+
+def is_normalised(conn: sqlite3.Connection) -> bool:
+    """
+    Return True if the object tables use dictionary-encoded storage.
+    """
+    cursor = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ObjectInfo'"
+    )
+    return cursor.fetchone() is not None
+
+
+def normalise_storage(conn: sqlite3.Connection) -> bool:
+    """
+    Convert the object tables to dictionary-encoded storage in one transaction.
+    The database is migrated to SCHEMA_VERSION first. Existing rows are kept and
+    keep their ids.
+
+    Returns:
+        False if the database already used normalised storage
+    """
+    migrate(conn)
+    if is_normalised(conn):
+        return False
+
+    info_columns = ", ".join(OBJECT_INFO_COLUMNS)
+    info_match = " AND ".join(
+        f"i.{column} IS o.{column}" for column in OBJECT_INFO_COLUMNS
+    )
+
+    conn.execute("BEGIN")
+    try:
+        for sql in _OBJECT_INFO_TABLE:
+            conn.execute(sql)
+        # UNION treats NULLs as equal, so each distinct combination is stored once.
+        conn.execute(
+            f'INSERT INTO "ObjectInfo" ({info_columns}) '
+            + " UNION ".join(
+                f'SELECT {info_columns} FROM "{table}"' for table in NORMALISED_TABLES
+            )
+        )
+
+        for table, (data_table, columns) in NORMALISED_TABLES.items():
+            create_table, *create_view = _normalised_table_sql(table)
+            conn.execute(create_table)
+            conn.execute(
+                f'INSERT INTO "{data_table}" (id, {", ".join(columns)}, info_id) '
+                f'SELECT o.id, {", ".join(f"o.{column}" for column in columns)}, i.id '
+                f'FROM "{table}" o INNER JOIN "ObjectInfo" i ON {info_match}'
+            )
+            conn.execute(f'DROP TABLE "{table}"')
+            for sql in create_view:
+                conn.execute(sql)
+            logging.info(f"Table {table} converted to normalised storage.")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logging.error("Conversion to normalised storage failed.")
+        raise
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    return True
+
+
+# Tables whose secondary indexes are dropped during a bulk load and rebuilt afterwards.
+BULK_LOAD_TABLES = (
+    "Event",
+    "PrimaryObject",
+    "SecondaryObject",
+    "ParentObject",
+    "ObjectInfo",
+    *(data_table for data_table, _ in NORMALISED_TABLES.values()),
+    "Engagement",
+)
+
+# Indexes dropped by defer_indexes() are recorded here until they are rebuilt, so
+# a bulk load that is interrupted can have them restored the next time the database is opened.
+_DEFERRED_INDEX_TABLE = """
+                CREATE TABLE IF NOT EXISTS "DeferredIndex" (
+                "name" text PRIMARY KEY NOT NULL,
+                "sql" text NOT NULL
+                );
+            """
+
+
+def defer_indexes(conn: sqlite3.Connection) -> int:
+    """
+    Drop the secondary indexes of the event and object tables before a bulk load,
+    recording their definitions in the same transaction. Unique indexes are kept
+    because they enforce constraints.
+
+    Returns:
+        The number of indexes dropped
+    """
+    if conn.in_transaction:
+        conn.commit()
+
+    placeholders = ",".join("?" * len(BULK_LOAD_TABLES))
+    indexes = conn.execute(
+        f"""SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL AND sql NOT LIKE 'CREATE UNIQUE%'
+            AND tbl_name IN ({placeholders})""",
+        BULK_LOAD_TABLES,
+    ).fetchall()
+
+    conn.execute("BEGIN")
+    try:
+        conn.execute(_DEFERRED_INDEX_TABLE)
+        for name, sql in indexes:
+            conn.execute(
+                'INSERT OR REPLACE INTO "DeferredIndex" (name, sql) VALUES (?, ?)',
+                (name, sql),
+            )
+            conn.execute(f'DROP INDEX "{name}"')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logging.info(f"{len(indexes)} indexes dropped for the bulk load.")
+    return len(indexes)
+
+
+def has_deferred_indexes(conn: sqlite3.Connection) -> bool:
+    """
+    Return True if indexes dropped for a bulk load are waiting to be rebuilt.
+    """
+    cursor = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'DeferredIndex'"
+    )
+    if cursor.fetchone() is None:
+        return False
+    return conn.execute('SELECT 1 FROM "DeferredIndex" LIMIT 1').fetchone() is not None
+
+
+def restore_indexes(conn: sqlite3.Connection) -> int:
+    """
+    Rebuild the indexes dropped by defer_indexes() in one transaction, then
+    refresh the planner statistics with ANALYZE.
+
+    Returns:
+        The number of indexes rebuilt
+    """
+    if not has_deferred_indexes(conn):
+        return 0
+    if conn.in_transaction:
+        conn.commit()
+
+    indexes = conn.execute('SELECT name, sql FROM "DeferredIndex"').fetchall()
+    conn.execute("BEGIN")
+    try:
+        for name, sql in indexes:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                (name,),
+            ).fetchone()
+            if exists is None:
+                conn.execute(sql)
+        conn.execute('DELETE FROM "DeferredIndex"')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        logging.error("Rebuilding the indexes dropped for a bulk load failed.")
+        raise
+
+    conn.execute("ANALYZE")
+    conn.commit()
+    logging.info(f"{len(indexes)} indexes rebuilt after the bulk load.")
+    return len(indexes)
+
+
+def storage_tables(conn: sqlite3.Connection) -> tuple[str]:
+    """
+    Return the tables that hold imported rows: DATA_TABLES, or with normalised
+    storage the tables behind the object views.
+    """
+    if not is_normalised(conn):
+        return DATA_TABLES
+    return (
+        "Mission",
+        "Event",
+        "ObjectInfo",
+        *(data_table for data_table, _ in NORMALISED_TABLES.values()),
+        "Engagement",
+    )
+
+
+def recreate_tables(conn: sqlite3.Connection, tables: tuple[str]):
+    """
+    Empty tables by dropping them and creating them again from their own
+    definitions, with their indexes and triggers, in one transaction.
+
+    SQLite deletes every row one at a time when a table is emptied with
+    foreign keys enforced, updating each index as it goes. Dropping a table
+    releases its pages in one pass. Views on the tables are left in place,
+    and tables that do not exist are skipped.
+    """
+    if conn.in_transaction:
+        conn.commit()
+
+    placeholders = ",".join("?" * len(tables))
+    definitions = conn.execute(
+        f"""SELECT type, sql FROM sqlite_master
+            WHERE tbl_name IN ({placeholders}) AND type IN ('table', 'index', 'trigger')
+            AND sql IS NOT NULL
+            ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END""",
+        tables,
+    ).fetchall()
+
+    # Dropping a parent table with foreign keys on would delete its rows one by one.
+    foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        conn.execute("BEGIN")
+        try:
+            for table in tables:
+                conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            for _, sql in definitions:
+                conn.execute(sql)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logging.error("Recreating the data tables failed.")
+            raise
+    finally:
+        conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+
+
+def reclaim_space(conn: sqlite3.Connection) -> int:
+    """
+    Return the pages freed by deletes to the file system with an incremental
+    vacuum. Does nothing unless the database uses auto_vacuum = INCREMENTAL,
+    which new databases do and `migrate --vacuum` sets on older ones.
+
+    Returns:
+        The number of pages released
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    if conn.in_transaction:
+        conn.commit()
+    pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # The pragma frees one page per step. execute() only steps it once, executescript() runs it to the end.
+    conn.executescript("PRAGMA incremental_vacuum;")
+    logging.info(f"{pages} free pages returned to the file system.")
+    return pages
+
+
+def enable_incremental_vacuum(conn: sqlite3.Connection) -> bool:
+    """
+    Switch a database to auto_vacuum = INCREMENTAL. An existing database has
+    to be rebuilt once with VACUUM for the setting to take effect.
+
+    Returns:
+        False if the database already used incremental vacuum
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
@@ -42,8 +42,17 @@ class Secondary:
             return False
 
     def write_to_db(self, db: Database, event_id: int) -> int:
-        sql = """ INSERT INTO SecondaryObject(event_id, tacview_id, type, name, pilot, coalition, country, obj_group, parent_id)
-                    VALUES(?,?,?,?,?,?,?,?,?) """
+        columns = (
+            "event_id",
+            "tacview_id",
+            "type",
+            "name",
+            "pilot",
+            "coalition",
+            "country",
+            "obj_group",
+            "parent_id",
+        )
         db_values = (
             event_id,
             self.id,
@@ -55,7 +64,7 @@ class Secondary:
             self.group,
             self.parent_id,
         )
-        # Execute query and commit to the db.
-        self.id = db.execute_sql_statement(sql, db_values)
+        # Committed immediately by Database, or buffered by a BulkWriter.
+        self.id = db.insert("SecondaryObject", columns, db_values)
 
         return self.id
@@ -0,0 +1,299 @@
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+from models.database import Database
+
+# How missions can be split into shard databases.
+SHARD_KEYS = ("campaign", "month")
+
+# Row ids seen through a FederatedQuery are offset by the shard id shifted by
+# this many bits, so ids from different shards never collide. Shards can hold
+# up to 2**40 rows per table.
+SHARD_ID_BITS = 40
+
+# Tables combined across shards, with the columns holding row ids of the federated tables.
+FEDERATED_TABLES = {
+    "Mission": ("id",),
+    "Event": ("id", "mission_id"),
+    "PrimaryObject": ("id", "event_id"),
+    "SecondaryObject": ("id", "event_id"),
+    "ParentObject": ("id", "event_id"),
+    "Engagement": (
+        "id",
+        "mission_id",
+        "fired_event_id",
+        "hit_event_id",
+        "destroyed_event_id",
+    ),
+}
+
+
+def campaign_key(filename: str, campaign: str = None) -> str:
+    """
+    Return the campaign a file belongs to: the given name, or else the name
+    of the folder holding the export (or the archive it is in).
+    """
+    if campaign:
+        return campaign
+    path = filename.partition("::")[0]
+    return os.path.basename(os.path.dirname(os.path.abspath(path))) or "default"
+
+
+def month_key(recording_time: str, filename: str = None) -> str:
+    """
+    Return the YYYY-MM in which a mission was recorded.
+
+    Some exports write the recording time as year-day-month, so both orders
+    are tried. If neither parses, the modification time of the file is used.
+    """
+    date = (recording_time or "")[:10]
+    for layout in ("%Y-%m-%d", "%Y-%d-%m"):
+        try:
+            return datetime.strptime(date, layout).strftime("%Y-%m")
+        except ValueError:
+            continue
+    if filename is None:
+        return "unknown"
+    mtime = os.stat(filename.partition("::")[0]).st_mtime
+    return datetime.fromtimestamp(mtime, timezone.utc).strftime("%Y-%m")
+
+
+def shard_filename(key: str) -> str:
+    """
+    Return a file name for a shard that is safe on every platform.
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", key).strip("._") + ".db"
+
+
+class ShardCatalog:
+    """
+    Catalog database listing the shard databases missions are split into.
+
+    Each shard is an ordinary tacview2db database holding the missions of one
+    campaign or one month, so it can be backed up, migrated or vacuumed on its
+    own. Shard paths are stored relative to the catalog, so the catalog and
+    its shards can be moved together.
+    """
+
+    def __init__(self, catalog_file: str, shard_directory: str):
+        logging.info(f"Opening shard catalog {catalog_file}.")
+        self.catalog_file = catalog_file
+        self.shard_directory = shard_directory
+        self.conn = sqlite3.connect(catalog_file)
+        self.create_table()
+
+    def create_table(self):
+        sql = """
+                CREATE TABLE IF NOT EXISTS "Shard" (
+                "id" integer PRIMARY KEY NOT NULL,
+                "key" text UNIQUE NOT NULL,
+                "kind" text NOT NULL,
+                "path" text NOT NULL,
+                "missions" integer NOT NULL DEFAULT 0,
+                "events" integer NOT NULL DEFAULT 0,
+                "first_recording" text,
+                "last_recording" text,
+                "updated_at" text NOT NULL
+                );
+            """
+        self.conn.execute(sql)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _absolute(self, path: str) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(self.catalog_file)), path)
+
+    def shard_path(self, key: str, kind: str) -> str:
+        """
+        Return the database file of a shard, adding the shard to the catalog if it is new.
+        """
+        row = self.conn.execute(
+            'SELECT path FROM "Shard" WHERE key = ?', (key,)
+        ).fetchone()
+        if row:
+            return self._absolute(row[0])
+
+        path = os.path.join(self.shard_directory, shard_filename(key))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        relative = os.path.relpath(
+            os.path.abspath(path), os.path.dirname(os.path.abspath(self.catalog_file))
+        )
+        self.conn.execute(
+            'INSERT INTO "Shard" (key, kind, path, updated_at) VALUES (?, ?, ?, ?)',
+            (
+                key,
+                kind,
+                relative,
+                datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            ),
+        )
+        self.conn.commit()
+        logging.info(f"New shard {key} at {path}.")
+        return os.path.abspath(path)
+
+    def update(self, key: str, db: Database):
+        """
+        Refresh the mission and event counts and the recording range of a shard after an import.
+
+        The shard's planner statistics are refreshed with ANALYZE too. A
+        FederatedQuery relies on them to choose between the shards' indexes and
+        automatic indexes when it joins the views.
+        """
+        db.conn.execute("ANALYZE")
+        db.conn.commit()
+        missions, first, last = db.conn.execute(
+            "SELECT COUNT(*), MIN(recording_time), MAX(recording_time) FROM Mission"
+        ).fetchone()
+        events = db.conn.execute("SELECT COUNT(*) FROM Event").fetchone()[0]
+        self.conn.execute(
+            """UPDATE "Shard" SET missions = ?, events = ?, first_recording = ?, last_recording = ?, updated_at = ?
+               WHERE key = ?""",
+            (
+                missions,
+                events,
+                first,
+                last,
+                datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                key,
+            ),
+        )
+        self.conn.commit()
+
+    def shards(self, keys: list[str] = None) -> list[tuple]:
+        """
+        Return (id, key, kind, absolute path, missions, events) for every shard,
+        or only for the given keys, in key order.
+        """
+        rows = self.conn.execute(
+            'SELECT id, key, kind, path, missions, events FROM "Shard" ORDER BY key'
+        ).fetchall()
+        if keys is not None:
+            missing = set(keys) - {row[1] for row in rows}
+            if missing:
+                raise ValueError(f"Unknown shard(s): {', '.join(sorted(missing))}.")
+            rows = [row for row in rows if row[1] in keys]
+        return [
+            (shard_id, key, kind, self._absolute(path), missions, events)
+            for shard_id, key, kind, path, missions, events in rows
+        ]
+
+
+class FederatedQuery:
+    """
+    Read-only connection that queries many shards as if they were one database.
+
+    The shards are attached read-only to an in-memory database, and TEMP views
+    named Mission, Event, PrimaryObject, SecondaryObject, ParentObject and
+    Engagement combine their tables with UNION ALL. Every view has an extra
+    "shard" column. Row ids and the columns holding them are offset by the
+    shard's catalog id (see SHARD_ID_BITS), so queries written for a single
+    database, including their joins, work unchanged across shards.
+    """
+
+    def __init__(self, catalog: ShardCatalog, keys: list[str] = None):
+        self.shards = [
+            shard for shard in catalog.shards(keys) if os.path.exists(shard[3])
+        ]
+        if not self.shards:
+            raise ValueError("There are no shards to query.")
+        # The URI form lets the shards be attached read-only.
+        self.conn = sqlite3.connect("file::memory:", uri=True)
+
+        limit = self.conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(self.shards) > limit:
+            self.conn.close()
+            raise ValueError(
+                f"{len(self.shards)} shards selected but SQLite can only attach {limit}, "
+                "choose the shards to query by key."
+            )
+
+        for number, shard in enumerate(self.shards):
+            self.conn.execute(
+                f'ATTACH DATABASE ? AS "shard{number}"',
+                (Path(shard[3]).absolute().as_uri() + "?mode=ro",),
+            )
+            analyzed = self.conn.execute(
+                f"SELECT 1 FROM \"shard{number}\".sqlite_master WHERE name = 'sqlite_stat1'"
+            ).fetchone()
+            if analyzed is None:
+                logging.warning(
+                    f"Shard {shard[1]} has no planner statistics, so joins across shards may be slow. "
+                    "Importing into it again refreshes them."
+                )
+        self.create_views()
+
+    def create_views(self):
+        """
+        Create a TEMP view per federated table combining it across all shards.
+        """
+        for table, id_columns in FEDERATED_TABLES.items():
+            shard_columns = {
+                number: [
+                    row[1]
+                    for row in self.conn.execute(
+                        f'PRAGMA "shard{number}".table_info("{table}")'
+                    )
+                ]
+                for number in range(len(self.shards))
+            }
+            # Shards not yet migrated to the current schema may lack a table, or
+            # newer columns, which read as NULL.
+            all_columns = list(
+                dict.fromkeys(
+                    column for columns in shard_columns.values() for column in columns
+                )
+            )
+            selects = []
+            for number, (shard_id, key, *_) in enumerate(self.shards):
+                columns = shard_columns[number]
+                if not columns:
+                    continue
+                offset = shard_id << SHARD_ID_BITS
+                expressions = []
+                for column in all_columns:
+                    if column not in columns:
+                        expressions.append(f'NULL AS "{column}"')
+                    elif column in id_columns:
+                        expressions.append(f'"{column}" + {offset} AS "{column}"')
+                    else:
+                        expressions.append(f'"{column}"')
+                quoted_key = key.replace("'", "''")
+                selects.append(
+                    f"SELECT {', '.join(expressions)}, '{quoted_key}' AS shard "
+                    f'FROM "shard{number}"."{table}"'
+                )
+            # A bare UNION ALL lets SQLite push a query's WHERE terms into every
+            # SELECT, so they use the indexes of each shard. Joins read each view
+            # once and look its rows up through an automatic index.
+            if selects:
+                self.conn.execute(
+                    f'CREATE TEMP VIEW "{table}" AS {" UNION ALL ".join(selects)}'
+                )
+
+    def execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        """
+        Run a query across the shards.
+        """
+        return self.conn.execute(sql, parameters)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def split_id(federated_id: int) -> tuple[int]:
+    """
+    Split an id returned by a FederatedQuery into (shard id, id within the shard).
+    """
+    return federated_id >> SHARD_ID_BITS, federated_id & ((1 << SHARD_ID_BITS) - 1)
@@ -0,0 +1,210 @@
+import hashlib
+import importlib
+import os
+
+# Single-file compression formats, decoded as a stream while the XML is parsed.
+# The modules, and zipfile, are only imported once a file needs them, as most runs read plain XML.
+COMPRESSED_FORMATS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "lzma",
+}
+
+# Separates a zip archive from the name of an export inside it, e.g. "exports.zip::M6.xml".
+ARCHIVE_SEPARATOR = "::"
+
+# Files inside an archive that are imported: XML exports, and ACMI recordings in a .zip.acmi.
+ARCHIVE_MEMBER_SUFFIXES = (".xml", ".acmi")
+
+# Zip archives, including Tacview's own compressed recordings.
+ARCHIVE_SUFFIXES = (".zip", ".zip.acmi")
+
+
+def split_source(name: str) -> tuple:
+    """
+    Split a source name into (path on disk, archive member or None).
+    """
+    path, separator, member = name.partition(ARCHIVE_SEPARATOR)
+    return path, (member if separator else None)
+
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def is_acmi(name: str) -> bool:
+    """
+    Return True if a source is an ACMI recording rather than an XML export,
+    e.g. "flight.txt.acmi", "flight.txt.acmi.gz" or "flight.zip.acmi::flight.txt.acmi".
+    """
+    path, member = split_source(name)
+    name = (member or path).lower()
+    root, extension = os.path.splitext(name)
+    if extension in COMPRESSED_FORMATS:
+        name = root
+    return name.endswith(".acmi")
+
+
+def expand_sources(filenames) -> list[str]:
+    """
+    Replace each zip archive in filenames with one source name per XML export or
+    ACMI recording it contains. Other files, compressed or not, are returned unchanged.
+    """
+    sources = []
+    for filename in filenames:
+        if is_archive(filename) and ARCHIVE_SEPARATOR not in filename:
+            import zipfile
+
+            try:
+                with zipfile.ZipFile(filename) as archive:
+                    members = [
+                        info.filename
+                        for info in archive.infolist()
+                        if not info.is_dir()
+                        and info.filename.lower().endswith(ARCHIVE_MEMBER_SUFFIXES)
+                    ]
+            except (OSError, zipfile.BadZipFile):
+                # Left for the caller to report as missing or unreadable.
+                sources.append(filename)
+                continue
+            sources.extend(
+                f"{filename}{ARCHIVE_SEPARATOR}{member}" for member in members
+            )
+        else:
+            sources.append(filename)
+    return sources
+
+
+def source_exists(name: str) -> bool:
+    path, member = split_source(name)
+    if member is None:
+        return os.path.isfile(path)
+    import zipfile
+
+    try:
+        with zipfile.ZipFile(path) as archive:
+            archive.getinfo(member)
+        return True
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return False
+
+
+def source_size(name: str) -> int:
+    """
+    Return the number of bytes stored on disk for a source: the file size, or
+    the compressed size of an archive member. Progress is measured against this.
+    """
+    path, member = split_source(name)
+    if member is None:
+        return os.path.getsize(path)
+    import zipfile
+
+    with zipfile.ZipFile(path) as archive:
+        return archive.getinfo(member).compress_size
+
+
+def source_stat(name: str) -> os.stat_result:
+    """
+    Return the stat() of the file holding a source. Archive members share the archive's.
+    """
+    return os.stat(split_source(name)[0])
+
+
+def hash_source(name: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 of a source: the bytes of the file as stored (so a
+    compressed file is not decoded), or the content of an archive member.
+    """
+    digest = hashlib.sha256()
+    with SourceFile(name, decompress=False) as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SourceFile:
+    """
+    Binary file object for a Tacview XML export or ACMI recording that may be compressed.
+
+    .gz, .bz2 and .xz files are decompressed while they are read, and members
+    of a zip archive are read straight out of the archive, so nothing is
+    written to disk. compressed_position tells how far into the stored bytes
+    the reader has got, for progress reporting.
+
+    Args:
+        name: Path of the file, or "archive.zip::member.xml" for an archive member
+        decompress: Decode .gz, .bz2 and .xz files (False reads the bytes as stored)
+    """
+
+    def __init__(self, name: str, decompress: bool = True):
+        self.name = name
+        path, member = split_source(name)
+        self._archive = None
+
+        if member is not None:
+            import zipfile
+
+            self._archive = zipfile.ZipFile(path)
+            info = self._archive.getinfo(member)
+            self.size = info.compress_size
+            self._ratio = info.compress_size / info.file_size if info.file_size else 1
+            self._raw = None
+            self._stream = self._archive.open(info)
+            return
+
+        self._raw = open(path, "rb")
+        self.size = os.fstat(self._raw.fileno()).st_size
+        module = COMPRESSED_FORMATS.get(os.path.splitext(path)[1].lower())
+        if module and decompress:
+            self._stream = importlib.import_module(module).open(self._raw)
+        else:
+            self._stream = self._raw
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def seek(self, offset: int):
+        """
+        Move to an offset in the decoded content. Compressed files and archive
+        members are decoded up to it, which is still much cheaper than parsing.
+        """
+        self._stream.seek(offset)
+
+    def __iter__(self):
+        # Lines, for the line based ACMI format.
+        return iter(self._stream)
+
+    @property
+    def closed(self) -> bool:
+        return self._stream.closed
+
+    @property
+    def compressed_position(self) -> int:
+        """
+        Number of stored (compressed) bytes consumed so far.
+        """
+        if self.closed:
+            return self.size
+        try:
+            if self._raw is not None:
+                return self._raw.tell()
+            # zip members only expose the decompressed position, so scale it by the compression ratio.
+            return min(int(self._stream.tell() * self._ratio), self.size)
+        except (OSError, ValueError):
+            # The parser thread may close the file once it has read the last event.
+            if self.closed:
+                return self.size
+            raise
+
+    def close(self):
+        self._stream.close()
+        if self._raw is not None:
+            self._raw.close()
+        if self._archive is not None:
+            self._archive.close()
@@ -0,0 +1,399 @@
+import logging
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+
+from config import STATS_RESULT_CACHE_SIZE, STATS_STATEMENT_CACHE_SIZE
+
+# Named read-only queries for dashboards. "{mission}" is replaced by a filter on
+# :mission_id when a mission is given and removed otherwise, so each query has
+# two fixed SQL texts and both stay in the connection's prepared statement cache.
+STATS_QUERIES = {
+    "missions": """
+        SELECT Mission.id, Mission.name, Mission.date, Mission.duration, Mission.recording_time,
+            (SELECT COUNT(*) FROM Event WHERE Event.mission_id = Mission.id) AS events
+        FROM Mission
+        WHERE 1 = 1 {mission}
+        ORDER BY Mission.recording_time
+    """,
+    "kills_per_pilot": """
+        SELECT SecondaryObject.pilot, SecondaryObject.coalition, COUNT(*) AS kills
+        FROM Event
+        INNER JOIN SecondaryObject ON SecondaryObject.event_id = Event.id
+        WHERE Event.action = 'HasBeenDestroyed' AND SecondaryObject.pilot != 'n/a' {mission}
+        GROUP BY SecondaryObject.pilot, SecondaryObject.coalition
+        ORDER BY kills DESC, SecondaryObject.pilot
+    """,
+    "weapon_hit_rate": """
+        WITH Fired AS (
+            SELECT Event.mission_id, SecondaryObject.tacview_id, SecondaryObject.name
+            FROM Event
+            INNER JOIN SecondaryObject ON SecondaryObject.event_id = Event.id
+            WHERE Event.action = 'HasFired' {mission}
+        ), Hit AS (
+            SELECT DISTINCT Event.mission_id, SecondaryObject.tacview_id
+            FROM Event
+            INNER JOIN SecondaryObject ON SecondaryObject.event_id = Event.id
+            WHERE Event.action = 'HasBeenHitBy' {mission}
+        )
+        SELECT Fired.name AS weapon, COUNT(*) AS fired, COUNT(Hit.tacview_id) AS hits,
+            ROUND(1.0 * COUNT(Hit.tacview_id) / COUNT(*), 3) AS hit_rate
+        FROM Fired
+        LEFT JOIN Hit ON Hit.mission_id = Fired.mission_id AND Hit.tacview_id = Fired.tacview_id
+        GROUP BY Fired.name
+        ORDER BY fired DESC, weapon
+    """,
+    "losses_per_coalition": """
+        SELECT PrimaryObject.coalition, PrimaryObject.type, COUNT(*) AS losses
+        FROM Event
+        INNER JOIN PrimaryObject ON PrimaryObject.event_id = Event.id
+        WHERE Event.action = 'HasBeenDestroyed' {mission}
+        GROUP BY PrimaryObject.coalition, PrimaryObject.type
+        ORDER BY PrimaryObject.coalition, losses DESC
+    """,
+    "mission_summary": """
+        SELECT Event.mission_id,
+            COUNT(*) AS events,
+            SUM(Event.action = 'HasFired') AS fired,
+            SUM(Event.action = 'HasBeenHitBy') AS hits,
+            SUM(Event.action = 'HasBeenDestroyed') AS destroyed,
+            SUM(Event.action = 'HasTakenOff') AS takeoffs,
+            SUM(Event.action = 'HasLanded') AS landings,
+            MAX(Event.time) AS last_event_time
+        FROM Event
+        WHERE 1 = 1 {mission}
+        GROUP BY Event.mission_id
+        ORDER BY Event.mission_id
+    """,
+    "mission_events": """
+        SELECT Event.mission_id, Event.id, Event.time, Event.action,
+            PrimaryObject.name, PrimaryObject.pilot, PrimaryObject.coalition,
+            SecondaryObject.name, SecondaryObject.pilot
+        FROM Event
+        INNER JOIN PrimaryObject ON PrimaryObject.event_id = Event.id
+        LEFT JOIN SecondaryObject ON SecondaryObject.event_id = Event.id
+        WHERE 1 = 1 {mission}
+        ORDER BY Event.mission_id, Event.time, Event.id
+    """,
+}
+
+_MISSION_FILTER = "AND Event.mission_id = :mission_id"
+_MISSION_TABLE_FILTER = "AND Mission.id = :mission_id"
+
+# Absolute UTC time of a point in a mission, :mission_id's start time plus seconds.
+_ABSOLUTE_TIME = (
+    "strftime('%Y-%m-%dT%H:%M:%fZ', "
+    "(SELECT start_time FROM Mission WHERE id = :mission_id) + {seconds}, 'unixepoch')"
+)
+
+# Start in seconds of the :bucket long time bucket an event is counted in.
+_BUCKET = "CAST(time / :bucket AS INTEGER) * :bucket"
+
+
+def timeline_queries(absolute_time: str, bucket: str) -> tuple[str]:
+    """
+    Return the SQL of the timeline and the timeline events queries, built with a
+    database engine's expressions for an absolute time and a time bucket.
+    """
+    # Timeline queries read a time window of one mission through the (mission_id, time,
+    # action) index, so only the events in the window are visited. "{actions}" is
+    # replaced by a filter on the actions asked for, or removed.
+    timeline_sql = f"""
+    SELECT {bucket} AS bucket,
+        {absolute_time.format(seconds=bucket)} AS timestamp,
+        action, COUNT(*) AS events
+    FROM Event
+    WHERE mission_id = :mission_id AND time >= :start AND time < :end {{actions}}
+    GROUP BY bucket, action
+    ORDER BY bucket, action
+"""
+    timeline_events_sql = f"""
+    SELECT Event.id, Event.time, {absolute_time.format(seconds="Event.time")} AS timestamp,
+        Event.action, PrimaryObject.name, PrimaryObject.pilot, PrimaryObject.coalition,
+        SecondaryObject.name, SecondaryObject.pilot
+    FROM Event
+    INNER JOIN PrimaryObject ON PrimaryObject.event_id = Event.id
+    LEFT JOIN SecondaryObject ON SecondaryObject.event_id = Event.id
+    WHERE Event.mission_id = :mission_id AND Event.time >= :start AND Event.time < :end {{actions}}
+    ORDER BY Event.time, Event.id
+    LIMIT :limit
+"""
+    return timeline_sql, timeline_events_sql
+
+
+TIMELINE_SQL, TIMELINE_EVENTS_SQL = timeline_queries(_ABSOLUTE_TIME, _BUCKET)
+
+
+class StatsReader:
+    """
+    Read-only access to the named dashboard statistics in STATS_QUERIES.
+
+    The reader opens its own read-only connection, so it can be used from a
+    web application while imports run. Compiled statements are kept in the
+    connection's statement cache, and results in an LRU cache keyed by the
+    query name and its parameters.
+
+    The result cache is kept in step with the database without help from the
+    writer. When SQLite reports that another connection has committed
+    (PRAGMA data_version), the missions that were added, replaced, deleted or
+    given new events are found, and only the results for those missions are
+    dropped, together with results across all missions.
+
+    A reader, like the sqlite3 connection it wraps, is used by one thread.
+    """
+
+    # SQL of the timeline queries, and the LIMIT that returns every row, in SQLite's dialect.
+    timeline_sql = TIMELINE_SQL
+    timeline_events_sql = TIMELINE_EVENTS_SQL
+    no_limit = -1
+
+    def __init__(
+        self,
+        database_file: str,
+        cache_size: int = STATS_RESULT_CACHE_SIZE,
+        statement_cache_size: int = STATS_STATEMENT_CACHE_SIZE,
+    ):
+        """
+        Open a read-only connection to a tacview2db database.
+
+        Args:
+            database_file (str): Path to the SQLite database file
+            cache_size (int): Number of query results kept, 0 to disable the result cache
+            statement_cache_size (int): Number of compiled statements kept by the connection
+        """
+        logging.info(f"Opening {database_file} read-only for statistics.")
+        self.conn = self._connect(database_file, statement_cache_size)
+        self.cache_size = cache_size
+        self._results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._data_version = self._read_data_version()
+        self._missions, self._last_event_id = self._snapshot()
+
+    def _connect(self, database_file: str, statement_cache_size: int):
+        return sqlite3.connect(
+            Path(database_file).absolute().as_uri() + "?mode=ro",
+            uri=True,
+            cached_statements=statement_cache_size,
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def sql(name: str, mission_id: int = None) -> str:
+        """
+        Return the SQL text of a named query, filtered to a mission or across all missions.
+
+        Raises:
+            KeyError: If there is no query with this name
+        """
+        if name not in STATS_QUERIES:
+            raise KeyError(
+                f"Unknown statistic {name}, choose from {', '.join(STATS_QUERIES)}."
+            )
+        if mission_id is None:
+            return STATS_QUERIES[name].format(mission="")
+        if name == "missions":
+            return STATS_QUERIES[name].format(mission=_MISSION_TABLE_FILTER)
+        return STATS_QUERIES[name].format(mission=_MISSION_FILTER)
+
+    def query(self, name: str, mission_id: int = None) -> list[tuple]:
+        """
+        Run a named query, or return its cached result.
+
+        Args:
+            name (str): Name of an entry in STATS_QUERIES
+            mission_id (int): Only count this mission (default: all missions)
+
+        Returns:
+            The result rows
+        """
+        return self._cached(
+            (name, mission_id), self.sql(name, mission_id), {"mission_id": mission_id}
+        )
+
+    def timeline(
+        self,
+        mission_id: int,
+        start: float = None,
+        end: float = None,
+        bucket: float = 60,
+        actions: tuple[str] = None,
+    ) -> list[tuple]:
+        """
+        Count a mission's events per time bucket and action, e.g. kills per minute.
+
+        Args:
+            mission_id (int): The mission
+            start (float): Seconds from the start of the mission the window starts at (default: the start)
+            end (float): Seconds the window ends before (default: the end of the mission)
+            bucket (float): Length of each bucket in seconds
+            actions (tuple): Only count these actions, e.g. ("HasBeenDestroyed",) (default: all)
+
+        Returns:
+            (bucket start in seconds, bucket start as a UTC timestamp, action, events) rows
+            in time order. The timestamp is None if the mission's start time is unknown.
+        """
+        parameters = self._window(mission_id, start, end, actions)
+        parameters["bucket"] = bucket
+        return self._cached(
+            ("timeline", mission_id, start, end, bucket, actions),
+            self._timeline_sql(self.timeline_sql, actions),
+            parameters,
+        )
+
+    def timeline_events(
+        self,
+        mission_id: int,
+        start: float = None,
+        end: float = None,
+        actions: tuple[str] = None,
+        limit: int = -1,
+    ) -> list[tuple]:
+        """
+        Return the events in a time window of a mission, for paging through a replay.
+        The next page starts at the time of the last event returned.
+
+        Args:
+            mission_id (int): The mission
+            start, end, actions: The window and actions, as for timeline()
+            limit (int): Return at most this many events (default: no limit)
+
+        Returns:
+            (event id, seconds, UTC timestamp, action, primary name, primary pilot,
+            primary coalition, secondary name, secondary pilot) rows in time order
+        """
+        parameters = self._window(mission_id, start, end, actions)
+        parameters["limit"] = self.no_limit if limit < 0 else limit
+        return self._cached(
+            ("timeline_events", mission_id, start, end, actions, limit),
+            self._timeline_sql(self.timeline_events_sql, actions),
+            parameters,
+        )
+
+    @staticmethod
+    def _window(mission_id: int, start: float, end: float, actions) -> dict:
+        parameters = {
+            "mission_id": mission_id,
+            "start": float("-inf") if start is None else start,
+            "end": float("inf") if end is None else end,
+        }
+        for number, action in enumerate(actions or ()):
+            parameters[f"action{number}"] = action
+        return parameters
+
+    @staticmethod
+    def _timeline_sql(sql: str, actions) -> str:
+        if not actions:
+            return sql.format(actions="")
+        placeholders = ", ".join(f":action{number}" for number in range(len(actions)))
+        return sql.format(actions=f"AND action IN ({placeholders})")
+
+    def _cached(self, key: tuple, sql: str, parameters: dict) -> list[tuple]:
+        """
+        Return the cached result of a query, or run it and cache the rows.
+        key[1] is the mission the result belongs to, None for all missions.
+        """
+        self.refresh()
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return self._results[key]
+
+        self.misses += 1
+        rows = self.conn.execute(sql, parameters).fetchall()
+        if self.cache_size:
+            self._results[key] = rows
+            if len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        return rows
+
+    def stream(self, name: str, mission_id: int = None, batch_size: int = 1000):
+        """
+        Yield the rows of a named query without holding them all in memory.
+        Streamed results are not cached.
+
+        The connection holds a read lock until the iterator is exhausted or
+        closed, which makes an import wait to commit, so consume it promptly.
+
+        Args:
+            name (str): Name of an entry in STATS_QUERIES
+            mission_id (int): Only return rows of this mission (default: all missions)
+            batch_size (int): Rows fetched from SQLite at a time
+        """
+        cursor = self.conn.execute(
+            self.sql(name, mission_id), {"mission_id": mission_id}
+        )
+        try:
+            while rows := cursor.fetchmany(batch_size):
+                yield from rows
+        finally:
+            cursor.close()
+
+    def invalidate(self, mission_ids=None):
+        """
+        Drop cached results for the given missions and all results across
+        missions, or every cached result if no missions are given.
+        """
+        if mission_ids is None:
+            self._results.clear()
+            return
+        mission_ids = set(mission_ids)
+        for key in list(self._results):
+            if key[1] is None or key[1] in mission_ids:
+                del self._results[key]
+
+    def refresh(self):
+        """
+        Drop the cached results that were changed by other connections since the last query.
+        """
+        data_version = self._read_data_version()
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        missions, last_event_id = self._snapshot()
+        if last_event_id < self._last_event_id:
+            # The newest events were deleted, so changed missions can't be told apart.
+            changed = None
+        else:
+            changed = {
+                mission_id
+                for mission_id in missions.keys() | self._missions.keys()
+                if missions.get(mission_id) != self._missions.get(mission_id)
+            }
+            changed.update(
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT DISTINCT mission_id FROM Event WHERE id > ?",
+                    (self._last_event_id,),
+                )
+            )
+        self._missions, self._last_event_id = missions, last_event_id
+        logging.debug(f"Database changed, dropping cached statistics for {changed}.")
+        self.invalidate(changed)
+
+    def _read_data_version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _snapshot(self) -> tuple:
+        """
+        Return the identity of every mission by id and the highest event id.
+        Committed missions never change, so a mission with new events or a new
+        identity under an existing id has been imported or replaced.
+        """
+        missions = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                "SELECT id, name, date, recording_time, source FROM Mission"
+            )
+        }
+        last_event_id = self.conn.execute("SELECT MAX(id) FROM Event").fetchone()[0]
+        return missions, last_event_id or 0
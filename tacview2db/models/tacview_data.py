@@ -1,24 +1,200 @@
 import xml.etree.ElementTree as ET
 import logging
+from collections import deque
+from itertools import islice
 
+from models.acmi import AcmiStream
+from models.sources import SourceFile, is_acmi
 
-class Tacview:
-    xml_full_data: ET
-    xml_event_data: ET
+# End tag of an event. Tacview escapes "<" in text, so in an export it only appears as the tag.
+_EVENT_END = b"</Event>"
+
+
+class _EventEnds:
+    """
+    Reads the XML for the parser, noting the offset in the decoded XML just
+    after each </Event> end tag, in document order. The parser reads ahead
+    in blocks, so the offsets of events it has not yet reported wait in ends.
+
+    Args:
+        file: File object the XML is read from
+        position: Offset in the decoded XML of the next byte read from file
+        prefix: Bytes handed to the parser before the file's
+    """
+
+    def __init__(self, file, position: int = 0, prefix: bytes = b""):
+        self._file = file
+        self._prefix = prefix
+        self._tail = b""
+        self.position = position
+        self.ends = deque()
+
+    def read(self, size: int = -1) -> bytes:
+        if self._prefix:
+            data, self._prefix = self._prefix, b""
+            return data
+        data = self._file.read(size)
+        # The end of the last block is kept, so a tag split between two blocks is still found.
+        buffer = self._tail + data
+        base = self.position - len(self._tail)
+        index = buffer.find(_EVENT_END)
+        while index != -1:
+            index += len(_EVENT_END)
+            self.ends.append(base + index)
+            index = buffer.find(_EVENT_END, index)
+        self._tail = buffer[-(len(_EVENT_END) - 1) :]
+        self.position += len(data)
+        return data
+
+
+class TacviewStream:
+    """
+    Incrementally parses a Tacview XML export.
+
+    Only the FlightRecording and Mission header elements are kept in memory.
+    Events are yielded one at a time by events() and cleared once the caller
+    has finished with them, so peak memory is bounded by a single event rather
+    than by the size of the file. Compressed files and archive members are
+    decoded as they are read (see models.sources).
+
+    event_offset is the offset in the decoded XML just after the last event
+    yielded, so an interrupted import can resume() from it without parsing
+    the events before it again.
+    """
+
+    xml_full_data: ET.Element
 
     def __init__(self, xml_file: str):
-        logging.info(f"Attempting to parse XML in {xml_file}.")
+        logging.info(f"Attempting to stream XML in {xml_file}.")
 
-        # Parse the xml file to obtain the full data tree and the events data.
         try:
-            tree = ET.parse(xml_file)
-            self.xml_full_data = tree.getroot()
-            self.xml_event_data = self.xml_full_data[2].findall("Event")
-            logging.info("XML parsed successfully.")
-
+            self._file = SourceFile(xml_file)
         except FileNotFoundError:
             logging.error("The XML file was not found.")
-            quit()
+            raise
 
+        self.size = self._file.size
+        self._reader = _EventEnds(self._file)
+        self._parser = ET.iterparse(self._reader, events=("start", "end"))
+        self._events_element = None
+        self._skip = 0
+        self.event_offset = None
+
+        # Read up to the start of the <Events> element so the header is available to Mission.
+        try:
+            self._read_header()
+            logging.info("XML header parsed successfully.")
         except ET.ParseError as parse_error:
             logging.error(f"XML parsing failed. Error {parse_error.msg}")
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_header(self):
+        """
+        Advance the parser until the <Events> element opens. At that point the
+        FlightRecording and Mission elements are fully parsed children of the root.
+        """
+        for action, element in self._parser:
+            if action != "start":
+                continue
+
+            if not hasattr(self, "xml_full_data"):
+                self.xml_full_data = element
+            elif element.tag == "Events":
+                self._events_element = element
+                return
+
+    def resume(self, events: int, offset: int = None):
+        """
+        Start events() after the first events of the file, which an
+        interrupted import already committed.
+
+        With the event_offset of the last of them, parsing restarts at that
+        offset, behind a copy of the opening root and <Events> tags. Without
+        one, the events are parsed and skipped.
+
+        Args:
+            events: Number of events to leave out
+            offset: Offset in the decoded XML just after the last of them
+
+        Raises:
+            ValueError: If the offset is not just after an </Event> end tag
+        """
+        if self._events_element is None or not events:
+            return
+        if offset is None:
+            self._skip = events
+            return
+
+        self._file.seek(offset - len(_EVENT_END))
+        if self._file.read(len(_EVENT_END)) != _EVENT_END:
+            raise ValueError(f"Offset {offset} is not at the end of an event")
+        prefix = f"<{self.xml_full_data.tag}><{self._events_element.tag}>"
+        self._reader = _EventEnds(self._file, offset, prefix.encode("utf-8"))
+        self._parser = ET.iterparse(self._reader, events=("start", "end"))
+        for action, element in self._parser:
+            if action == "start" and element.tag == self._events_element.tag:
+                self._events_element = element
+                break
+        self.event_offset = offset
+
+    def events(self):
+        """
+        Yield each <Event> element in document order.
+
+        The element is cleared and detached from the tree as soon as the caller
+        asks for the next one, so it must not be referenced after that point.
+        """
+        events = self._read_events()
+        return islice(events, self._skip, None) if self._skip else events
+
+    def _read_events(self):
+        if self._events_element is None:
+            self.close()
+            return
+
+        ends = self._reader.ends
+        try:
+            for action, element in self._parser:
+                if action == "end" and element.tag == "Event":
+                    self.event_offset = ends.popleft() if ends else None
+                    yield element
+                    element.clear()
+                    self._events_element.remove(element)
+        except ET.ParseError as parse_error:
+            logging.error(f"XML parsing failed. Error {parse_error.msg}")
+            raise
+        finally:
+            self.close()
+
+    @property
+    def bytes_read(self) -> int:
+        """
+        Number of bytes of the file consumed by the parser so far, counted as
+        stored on disk, so for a compressed file these are compressed bytes.
+        The parser reads ahead in blocks, so this runs slightly ahead of the last event.
+        """
+        return self._file.compressed_position
+
+    def close(self):
+        """
+        Close the underlying file handle.
+        """
+        if not self._file.closed:
+            self._file.close()
+
+
+def open_tacview(filename: str):
+    """
+    Open a stream over a Tacview XML export, or an AcmiStream over an ACMI
+    recording, by the file name. Both have the same interface.
+    """
+    if is_acmi(filename):
+        return AcmiStream(filename)
+    return TacviewStream(filename)
@@ -1,5 +1,14 @@
+import atexit
 import logging
-from logging import StreamHandler
+import queue
+import threading
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+
+from config import GUI_LOG_LINES, LOG_RATE_LIMIT, LOG_RATE_WINDOW
+
+# Listener writing the queued records to the log handlers, while logging is started.
+_listener = None
 
 
 class TacviewLogger:
@@ -57,15 +66,161 @@ class TacviewLogger:
         self.logger.critical(message)
 
 
-class TVLogger(StreamHandler):
+class RateLimitFilter(logging.Filter):
+    """
+    Lets each line of code log at most limit DEBUG messages every window seconds.
+
+    A DEBUG message logged per event, or per row, would otherwise flood the
+    log and slow the import down. The messages over the limit are dropped and
+    counted, and the count is added to the next message from the same line
+    once the window has passed. INFO messages and above, such as the lines
+    naming each file processed or failed, always pass, so the log names every
+    file whatever else is logged.
+    """
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        # [window start, messages logged in it, messages dropped], by (file, line).
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                self._sites[key] = [record.created, 1, 0]
+                return True
+            if record.created - site[0] >= self.window:
+                dropped = site[2]
+                site[:] = [record.created, 1, 0]
+                if dropped:
+                    record.msg = (
+                        f"{record.getMessage()} ({dropped} similar messages suppressed)"
+                    )
+                    record.args = None
+                return True
+            if site[1] < self.limit:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+    def suppressed(self) -> int:
+        """
+        Number of messages dropped and not yet reported.
+        """
+        with self._lock:
+            return sum(site[2] for site in self._sites.values())
+
+
+def start_logging(handlers: list, level: int = logging.DEBUG) -> QueueListener:
+    """
+    Send the root logger's records through a queue to the given handlers,
+    which a background thread writes to. Logging then costs the calling
+    thread only the formatting of the message, never a write to a file or
+    the console. DEBUG records are rate limited by a RateLimitFilter, and
+    the queue is drained when the program exits.
+
+    Args:
+        handlers: Handlers writing the records, such as a FileHandler
+        level: Level of the root logger
+
+    Returns:
+        The QueueListener writing the records
+    """
+    global _listener
+    stop_logging()
+
+    handler = QueueHandler(queue.SimpleQueue())
+    handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+        old_handler.close()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """
+    Write the records still queued, stop the listener and close its handlers.
+    Suppressed messages not yet reported are counted in a last record.
     """
-    A custom StreamHandler that redirects log messages to a GUI text widget.
-    Inherits from StreamHandler to handle log messages in a GUI context.
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler) and handler.queue is listener.queue:
+            root.removeHandler(handler)
+            suppressed = sum(
+                log_filter.suppressed()
+                for log_filter in handler.filters
+                if isinstance(log_filter, RateLimitFilter)
+            )
+            if suppressed:
+                handler.emit(
+                    root.makeRecord(
+                        root.name,
+                        logging.WARNING,
+                        __file__,
+                        0,
+                        f"{suppressed} repeated messages were suppressed.",
+                        None,
+                        None,
+                    )
+                )
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def log_directly():
     """
+    Write the root logger's records straight to the listener's handlers.
+
+    Worker processes forked from a process that started logging inherit its
+    queue, but not the listener thread that empties it. This is passed as
+    the initializer of their pool, so their records reach the log file as
+    they did before. Does nothing if logging was not started.
+    """
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, QueueHandler):
+            root.removeHandler(handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+
 
-    def __init__(self, text_widget):
+class TVLogger(logging.Handler):
+    """
+    A logging handler that keeps the last lines logged for a GUI log view.
+
+    Records may be logged from any thread, and a Tk widget may only be used
+    by the thread running the window, so emit() never touches the widget.
+    It appends the formatted line to a ring buffer that the window empties
+    with drain() each time it polls. If more than lines records arrive
+    between polls, the oldest are dropped, so memory stays bounded however
+    much is logged.
+    """
+
+    def __init__(self, lines: int = GUI_LOG_LINES):
         super().__init__()
-        self.text_widget = text_widget
+        self.lines = deque(maxlen=lines)
+        self.dropped = 0
 
         format = "%(asctime)s %(levelname)s %(message)s"
         datefmt = "%Y-%m-%d %H:%M:%S"
@@ -73,14 +228,26 @@ class TVLogger(StreamHandler):
         formatter = logging.Formatter(format, datefmt)
 
         self.setFormatter(formatter)
-        self.setFormatter()
 
     def emit(self, record):
         try:
             msg = self.format(record)
-            self.text_widget.configure(state="normal")
-            self.text_widget.insert("end", msg + "\n")
-            self.text_widget.configure(state="disabled")
-            self.text_widget.see("end")
+            with self.lock:
+                if len(self.lines) == self.lines.maxlen:
+                    self.dropped += 1
+                self.lines.append(msg)
         except Exception:
             self.handleError(record)
+
+    def drain(self) -> list[str]:
+        """
+        Return the lines logged since the last call, oldest first, and empty the buffer.
+        A line reporting how many were dropped comes first.
+        """
+        with self.lock:
+            lines = list(self.lines)
+            self.lines.clear()
+            if self.dropped:
+                lines.insert(0, f"... {self.dropped} earlier log messages dropped.")
+                self.dropped = 0
+        return lines
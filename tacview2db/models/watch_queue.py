@@ -0,0 +1,59 @@
+import os
+from datetime import datetime, timezone
+
+from models.database import Database
+
+
+class WatchQueue:
+    """
+    Files seen by the watch command that have not been imported yet.
+
+    The queue is a table in the database being imported into, so files that
+    arrive while an import is running, or just before the watcher is stopped,
+    are picked up again when it restarts.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.create_table()
+
+    def create_table(self):
+        sql = """
+                CREATE TABLE IF NOT EXISTS "WatchQueue" (
+                "path" char(1024) PRIMARY KEY NOT NULL,
+                "queued_at" char(32) NOT NULL
+                );
+            """
+        self.db.conn.execute(sql)
+        self.db.conn.commit()
+
+    def add(self, path: str):
+        """
+        Queue a file, keeping its original queue time if it is already queued.
+        """
+        self.db.conn.execute(
+            "INSERT OR IGNORE INTO WatchQueue(path, queued_at) VALUES(?,?)",
+            (
+                os.path.abspath(path),
+                datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            ),
+        )
+        self.db.conn.commit()
+
+    def remove(self, path: str):
+        """
+        Remove a file once it has been imported, skipped or has disappeared.
+        """
+        self.db.conn.execute(
+            "DELETE FROM WatchQueue WHERE path = ?", (os.path.abspath(path),)
+        )
+        self.db.conn.commit()
+
+    def pending(self) -> list[str]:
+        """
+        Return the queued files, oldest first.
+        """
+        cursor = self.db.conn.execute(
+            "SELECT path FROM WatchQueue ORDER BY queued_at, path"
+        )
+        return [row[0] for row in cursor]
@@ -0,0 +1,265 @@
+import fnmatch
+import logging
+import os
+import queue
+import time
+
+from models.database import Database
+from models.manifest import ImportManifest
+from models.mission import MissionIndex
+from models.sources import expand_sources
+from models.watch_queue import WatchQueue
+from services.tacview_engine import process_tacview_file
+
+from config import (
+    DUPLICATE_MISSION_POLICY,
+    WATCH_PATTERN,
+    WATCH_POLL_INTERVAL,
+    WATCH_SETTLE_SECONDS,
+)
+
+
+def start_native_observer(folders: list[str], notify):
+    """
+    Start a watchdog observer (inotify on Linux, ReadDirectoryChangesW on Windows,
+    FSEvents on macOS) that calls notify(path) whenever a file is created,
+    written to or moved into one of the folders.
+
+    Returns:
+        The running observer, or None if the watchdog package is not installed
+    """
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        return None
+
+    class NotifyHandler(FileSystemEventHandler):
+        def on_created(self, event):
+            if not event.is_directory:
+                notify(event.src_path)
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                notify(event.src_path)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                notify(event.dest_path)
+
+    # watchdog logs every raw event at DEBUG, which would flood app.log.
+    logging.getLogger("watchdog").setLevel(logging.WARNING)
+    observer = Observer()
+    handler = NotifyHandler()
+    for folder in folders:
+        observer.schedule(handler, folder, recursive=False)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+
+class FolderWatcher:
+    """
+    Imports Tacview XML files as they appear in one or more folders.
+
+    One database connection, import manifest and mission index are kept for
+    the life of the watcher. A new file is only imported once its size and
+    modification time have stayed the same for settle_seconds, so files that
+    are still being written are left alone. Files waiting to be imported are
+    kept in the WatchQueue table and resumed after a restart.
+
+    Each import is logged. The optional report callback is also called as
+    report(source, mission_id, error) after each, for the command to show it.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        folders: list[str],
+        pattern: str = WATCH_PATTERN,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+        settle_seconds: float = WATCH_SETTLE_SECONDS,
+        duplicate_policy: str = DUPLICATE_MISSION_POLICY,
+        use_native: bool = True,
+        report=None,
+    ):
+        self.db = db
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.duplicate_policy = duplicate_policy
+        self.use_native = use_native
+        self.report = report
+
+        self.manifest = ImportManifest(db)
+        self.mission_index = MissionIndex(db)
+        self.watch_queue = WatchQueue(db)
+        self.imported_count = 0
+        # Paths reported by the native observer thread, consumed by the main loop.
+        self._notifications = queue.Queue()
+        # Last (size, mtime) seen for every matching file, so a poll only reacts to changes.
+        self._seen = {}
+        # Files waiting to settle: path -> ((size, mtime), time that stat was first seen)
+        self._pending = {}
+        self._observer = None
+
+    def run(self, once: bool = False):
+        """
+        Watch the folders until interrupted with Ctrl+C.
+
+        Args:
+            once: Import the files already present (once they settle) and return
+        """
+        for path in self.watch_queue.pending():
+            self._enqueue(path)
+        self.scan()
+
+        if self.use_native and not once:
+            self._observer = start_native_observer(
+                self.folders, self._notifications.put
+            )
+        if self._observer:
+            logging.info("Watching for file system notifications.")
+        else:
+            logging.info(f"Polling for new files every {self.poll_interval} seconds.")
+
+        try:
+            while True:
+                self._wait_for_changes()
+                self.check_pending()
+                if once and not self._pending:
+                    break
+        except KeyboardInterrupt:
+            logging.info("Watch stopped.")
+        finally:
+            if self._observer:
+                self._observer.stop()
+                self._observer.join()
+
+    def _wait_for_changes(self):
+        if self._observer is None:
+            time.sleep(self.poll_interval)
+            self.scan()
+            return
+
+        # Block until a notification arrives, but wake up regularly while files are settling.
+        timeout = self.poll_interval if self._pending else None
+        try:
+            path = self._notifications.get(timeout=timeout)
+            while True:
+                self._notify(path)
+                path = self._notifications.get_nowait()
+        except queue.Empty:
+            pass
+
+    def scan(self):
+        """
+        List the watched folders and queue any new or changed matching file.
+        """
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                logging.warning(f"Watched folder {folder} does not exist.")
+                continue
+            for entry in entries:
+                if entry.is_file() and fnmatch.fnmatch(entry.name, self.pattern):
+                    stat = entry.stat()
+                    self._check_changed(entry.path, stat)
+
+    def _notify(self, path: str):
+        path = os.path.abspath(path)
+        if os.path.dirname(path) not in self.folders:
+            return
+        if not fnmatch.fnmatch(os.path.basename(path), self.pattern):
+            return
+        try:
+            self._check_changed(path, os.stat(path))
+        except FileNotFoundError:
+            pass
+
+    def _check_changed(self, path: str, stat: os.stat_result):
+        signature = (stat.st_size, stat.st_mtime)
+        if self._seen.get(path) == signature:
+            return
+        self._seen[path] = signature
+        if path not in self._pending and self.manifest.is_unchanged(path, stat):
+            return
+        self._enqueue(path)
+
+    def _enqueue(self, path: str):
+        if path not in self._pending:
+            logging.info(f"Queued {path}, waiting for it to be completely written.")
+            self.watch_queue.add(path)
+            self._pending[path] = (None, time.monotonic())
+
+    def check_pending(self):
+        """
+        Import every queued file whose size and modification time have not
+        changed for settle_seconds.
+        """
+        now = time.monotonic()
+        for path, (signature, since) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                logging.warning(f"Queued file {path} has disappeared.")
+                del self._pending[path]
+                self.watch_queue.remove(path)
+                continue
+
+            current = (stat.st_size, stat.st_mtime)
+            if current != signature:
+                self._pending[path] = (current, now)
+            elif now - since >= self.settle_seconds:
+                del self._pending[path]
+                self._seen[path] = current
+                self.import_file(path)
+
+    def import_file(self, path: str):
+        """
+        Import one settled file and remove it from the queue. Every export in
+        a zip archive is imported, each in its own transaction.
+
+        A file that fails to import, or whose import is interrupted, stays in
+        the queue and is retried when it changes or the watcher is restarted.
+        """
+        results = [self._import_source(source) for source in expand_sources([path])]
+        if all(results):
+            self.watch_queue.remove(path)
+
+    def _import_source(self, source: str) -> bool:
+        """
+        Import one file or export in an archive unless the manifest shows it
+        has already been imported.
+
+        Returns:
+            False if the import failed, True otherwise
+        """
+        try:
+            import_record = self.manifest.check_file(source)
+            if import_record is not None:
+                mission_id = process_tacview_file(
+                    self.db,
+                    source,
+                    import_record,
+                    self.mission_index,
+                    self.duplicate_policy,
+                )
+                self.manifest.record_imported(import_record, mission_id)
+                self.imported_count += 1
+                logging.info(f"Imported {source} as mission {mission_id}.")
+                if self.report:
+                    self.report(source, mission_id, None)
+        except FileNotFoundError:
+            logging.warning(f"Queued file {source} has disappeared.")
+        except Exception as error:
+            # The file is retried if it changes again, or when the watcher is restarted.
+            logging.error(
+                f"Processing of {source} failed and was rolled back. Error: {error}"
+            )
+            if self.report:
+                self.report(source, None, error)
+            return False
+        return True
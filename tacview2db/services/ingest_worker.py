@@ -0,0 +1,131 @@
+import logging
+import queue
+import threading
+import time
+
+from models.database import Database
+from models.manifest import ImportManifest
+from models.mission import MissionIndex
+from models.sources import expand_sources, source_exists, source_size
+from services.profiling import StageProfiler
+from services.tacview_engine import process_tacview_file
+
+
+class ImportCancelled(Exception):
+    """
+    Raised from the progress callback to abandon the file being imported.
+    """
+
+
+class IngestWorker(threading.Thread):
+    """
+    Imports files on a background thread so a GUI stays responsive.
+
+    The worker opens its own connection to the database, because a SQLite
+    connection can only be used by the thread that created it. It reports
+    back through a queue of (kind, payload) messages that the GUI polls:
+
+        ("file", (number, filename))             a file is starting
+        ("skipped", filename)                    the file is already imported and unchanged
+        ("progress", (events, bytes, events/s))  totals for the whole run so far
+        ("file_done", (filename, events))        a file was committed
+        ("error", (filename, message))           a file failed and was rolled back
+        ("cancelled", filename)                  the file in progress was rolled back
+        ("finished", (files, seconds, profiler)) the worker has stopped
+    """
+
+    def __init__(
+        self, database_file: str, filenames: list[str], clear_db: bool = False
+    ):
+        super().__init__(name="IngestWorker", daemon=True)
+        self.database_file = database_file
+        self.filenames = expand_sources(filenames)
+        self.clear_db = clear_db
+        self.messages = queue.Queue()
+        self.profiler = StageProfiler()
+        self._cancel = threading.Event()
+        self._file_events = 0
+
+    def cancel(self):
+        """
+        Ask the worker to stop. The file in progress is rolled back.
+        """
+        self._cancel.set()
+
+    def run(self):
+        start = time.perf_counter()
+        files_done = 0
+        db = Database(self.database_file)
+        try:
+            files_done = self._import_files(db, start)
+        finally:
+            db.close_connection()
+            self.messages.put(
+                ("finished", (files_done, time.perf_counter() - start, self.profiler))
+            )
+
+    def _import_files(self, db: Database, start: float) -> int:
+        # Clearing the database empties the import manifest with it.
+        if self.clear_db:
+            db.clear_table_data()
+
+        # Imports are recorded in the manifest as the command line records them, so
+        # either one skips files the other has already imported.
+        manifest = ImportManifest(db)
+        mission_index = MissionIndex(db)
+        files_done = done_events = done_bytes = 0
+
+        for number, filename in enumerate(self.filenames, 1):
+            if self._cancel.is_set():
+                break
+            self.messages.put(("file", (number, filename)))
+
+            def progress(events, bytes_read):
+                # Runs inside the file's transaction, so raising here rolls the file back.
+                if self._cancel.is_set():
+                    raise ImportCancelled()
+                self._file_events = events
+                total_events = done_events + events
+                rate = total_events / max(time.perf_counter() - start, 1e-6)
+                self.messages.put(
+                    ("progress", (total_events, done_bytes + bytes_read, rate))
+                )
+
+            self._file_events = 0
+            try:
+                import_record = manifest.check_file(filename)
+                if import_record is not None:
+                    # The GUI writes each file in a single transaction.
+                    mission_id = process_tacview_file(
+                        db,
+                        filename,
+                        import_record,
+                        mission_index=mission_index,
+                        profiler=self.profiler,
+                        progress=progress,
+                        checkpoint_events=None,
+                    )
+            except ImportCancelled:
+                logging.warning(f"Import of {filename} cancelled and rolled back.")
+                self.messages.put(("cancelled", filename))
+                break
+            except Exception as error:
+                logging.error(
+                    f"Processing of {filename} failed and was rolled back. Error: {error}"
+                )
+                self.messages.put(("error", (filename, str(error))))
+            else:
+                if import_record is None:
+                    self.messages.put(("skipped", filename))
+                else:
+                    manifest.record_imported(import_record, mission_id)
+                    files_done += 1
+                    done_events += self._file_events
+                    self.messages.put(("file_done", (filename, self._file_events)))
+
+            if source_exists(filename):
+                done_bytes += source_size(filename)
+            rate = done_events / max(time.perf_counter() - start, 1e-6)
+            self.messages.put(("progress", (done_events, done_bytes, rate)))
+
+        return files_done
@@ -0,0 +1,224 @@
+import queue
+import sys
+import threading
+import time
+
+from config import PIPELINE_BATCH_SIZE, PIPELINE_QUEUE_DEPTH
+
+# Marks the end of the records in the queue.
+_END = object()
+
+# Seconds a blocked put waits before checking whether the writer has stopped.
+_PUT_TIMEOUT = 0.1
+
+# Buffered bytes are estimated from one record in this many, as sizing every record costs
+# more than the estimate is worth.
+_SIZE_SAMPLE = 16
+
+
+def record_size(record) -> int:
+    """
+    Estimate the bytes held by an EventRecord: the record, its object tuples and their values.
+    Values shared between records, such as the "n/a" default, are counted each time.
+    """
+    size = (
+        sys.getsizeof(record)
+        + sys.getsizeof(record.time)
+        + sys.getsizeof(record.action)
+    )
+    for values in (record.primary, record.secondary, record.parent):
+        if values is not None:
+            size += sys.getsizeof(values) + sum(map(sys.getsizeof, values))
+    return size
+
+
+class PipelineStats:
+    """
+    Queue occupancy, stall time per stage and buffered memory of one EventPipeline run.
+    """
+
+    def __init__(self, depth: int, batch_size: int):
+        self.depth = depth
+        self.batch_size = batch_size
+        self.batches = 0
+        self.events = 0
+        # Batches waiting in the queue, summed over each batch the writer took.
+        self.occupancy_total = 0
+        self.peak_occupancy = 0
+        # Seconds the parser waited for room in the queue, and the writer for a batch.
+        self.parser_stall = 0.0
+        self.writer_stall = 0.0
+        self.buffered_bytes = 0
+        self.peak_buffered_bytes = 0
+
+    @property
+    def mean_occupancy(self) -> float:
+        return self.occupancy_total / self.batches if self.batches else 0.0
+
+    def report(self) -> dict:
+        """
+        Return the figures as a JSON serialisable dict.
+        """
+        return {
+            "depth": self.depth,
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "events": self.events,
+            "mean_occupancy": round(self.mean_occupancy, 3),
+            "peak_occupancy": self.peak_occupancy,
+            "parser_stall": round(self.parser_stall, 6),
+            "writer_stall": round(self.writer_stall, 6),
+            "peak_buffered_bytes": self.peak_buffered_bytes,
+        }
+
+    def summary(self) -> str:
+        return (
+            f"{self.events} events in {self.batches} batches, queue {self.mean_occupancy:.1f} "
+            f"of {self.depth} batches on average (peak {self.peak_occupancy}), parser stalled "
+            f"{self.parser_stall:.3f}s, writer stalled {self.writer_stall:.3f}s, "
+            f"peak {self.peak_buffered_bytes / 1024:.0f} KB buffered"
+        )
+
+
+class EventPipeline:
+    """
+    Runs the parse and extract stages of a file in a thread of their own, ahead
+    of the writer, connected to it by a bounded queue.
+
+    The parser thread pulls EventRecords from event_records and puts them in
+    the queue in batches of batch_size. Iterating over the pipeline yields the
+    records in order to the writer, which keeps the database connection in
+    the calling thread. When the queue holds depth batches the parser waits
+    (backpressure), so at most depth + 2 batches of records are in memory at
+    once. SQLite and the decompressors release the GIL while they work, so
+    parsing overlaps with inserts and commits.
+
+    An error in the parser is raised in the writer when it reaches that point.
+    Closing the pipeline, which the with statement does, stops the parser if
+    the writer finished early or failed, and waits for its thread. With a
+    depth of 0 the records are passed through in the calling thread, one at a
+    time as before.
+
+    stats holds the PipelineStats of the run.
+    """
+
+    def __init__(
+        self,
+        event_records,
+        depth: int = PIPELINE_QUEUE_DEPTH,
+        batch_size: int = PIPELINE_BATCH_SIZE,
+        profiler=None,
+    ):
+        self._records = event_records
+        self.depth = depth
+        self.batch_size = max(batch_size, 1)
+        self.profiler = profiler
+        self.stats = PipelineStats(depth, self.batch_size)
+        self._queue = queue.Queue(maxsize=depth) if depth > 0 else None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        if self._queue is None:
+            yield from self._records
+            return
+
+        self._thread = threading.Thread(
+            target=self._produce, name="tacview2db-parser", daemon=True
+        )
+        self._thread.start()
+        stats = self.stats
+        while True:
+            occupancy = self._queue.qsize()
+            start = time.perf_counter()
+            if self.profiler:
+                # Charged to its own stage rather than to the write stage around it.
+                with self.profiler.stage("wait"):
+                    item = self._queue.get()
+            else:
+                item = self._queue.get()
+            stats.writer_stall += time.perf_counter() - start
+
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+
+            batch, size = item
+            stats.batches += 1
+            stats.events += len(batch)
+            stats.occupancy_total += occupancy
+            stats.peak_occupancy = max(stats.peak_occupancy, occupancy)
+            yield from batch
+            with self._lock:
+                stats.buffered_bytes -= size
+
+    def _produce(self):
+        """
+        Parser thread: fill the queue with batches of records, then the end marker.
+        """
+        try:
+            batch = []
+            for record in self._records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    if not self._put_batch(batch):
+                        return
+                    batch = []
+            if batch and not self._put_batch(batch):
+                return
+            self._put(_END)
+        except BaseException as error:
+            self._put(error)
+
+    def _put_batch(self, batch: list) -> bool:
+        sample = batch[::_SIZE_SAMPLE]
+        record_bytes = sum(map(record_size, sample)) * len(batch) // len(sample)
+        size = sys.getsizeof(batch) + record_bytes
+        stats = self.stats
+        with self._lock:
+            stats.buffered_bytes += size
+            stats.peak_buffered_bytes = max(
+                stats.peak_buffered_bytes, stats.buffered_bytes
+            )
+        return self._put((batch, size))
+
+    def _put(self, item) -> bool:
+        """
+        Put an item in the queue, waiting while it is full. Returns False if the
+        pipeline was closed while waiting.
+        """
+        start = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=_PUT_TIMEOUT)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.stats.parser_stall += time.perf_counter() - start
+
+    def close(self):
+        """
+        Stop the parser thread and wait for it to finish.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        # Make room for a parser waiting to put its last batch.
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=_PUT_TIMEOUT)
+            except queue.Empty:
+                pass
+        self._thread.join()
+        self._thread = None
@@ -0,0 +1,210 @@
+import json
+import threading
+import time
+
+from contextlib import contextmanager
+
+# Stages reported for every file, in pipeline order.
+STAGES = ("manifest", "parse", "extract", "write", "engagements", "flush", "commit")
+
+STAGE_DESCRIPTIONS = {
+    "manifest": "Import manifest checks",
+    "parse": "XML parsing",
+    "extract": "Field extraction",
+    "write": "Row building and buffering",
+    "engagements": "Engagement reconstruction",
+    "flush": "SQLite inserts",
+    "commit": "SQLite commits",
+    "wait": "Waiting for the parser or workers",
+}
+
+
+class StageProfiler:
+    """
+    Accumulates wall time per import stage, per file.
+
+    Stages can nest. Each stage is charged only for its own time, so time spent
+    parsing while the writer pulls the next event counts as parse, not write,
+    and the stage totals of a file add up to its import time. Stages are
+    nested per thread; when the parser runs in a thread of its own (see
+    services.pipeline) its stages overlap with the writer's, and the writer's
+    time waiting for it is charged to "wait".
+    """
+
+    def __init__(self):
+        self.files = {}
+        self._current = None
+        self._file_start = None
+        self._local = threading.local()
+
+    @property
+    def _children(self) -> list:
+        # Time used by nested stages, one entry per open stage of this thread.
+        try:
+            return self._local.children
+        except AttributeError:
+            self._local.children = []
+            return self._local.children
+
+    def start_file(self, filename: str):
+        """
+        Charge the following stages to filename.
+        """
+        self._current = self.files.setdefault(
+            filename,
+            {"stages": dict.fromkeys(STAGES, 0.0), "events": 0, "seconds": 0.0},
+        )
+        self._file_start = time.perf_counter()
+
+    def end_file(self):
+        """
+        Record the total time of the current file.
+        """
+        self._current["seconds"] += time.perf_counter() - self._file_start
+        self._current = None
+
+    def count_events(self, events: int):
+        """
+        Add to the number of events imported from the current file.
+        """
+        self._current["events"] += events
+
+    def add_pipeline(self, stats):
+        """
+        Record the PipelineStats of the current file's parse/write pipeline.
+        """
+        self._current["pipeline"] = stats.report()
+
+    def add(self, stages: dict):
+        """
+        Add stage times measured elsewhere to the current file. Times measured in
+        a worker process overlap with this process, so with --jobs the stage
+        totals can add up to more than the wall time.
+        """
+        for name, seconds in stages.items():
+            self._current["stages"][name] = (
+                self._current["stages"].get(name, 0.0) + seconds
+            )
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time the body of a with block as the named stage.
+        """
+        start = self._enter()
+        try:
+            yield
+        finally:
+            self._exit(name, start)
+
+    def timed(self, name: str, function):
+        """
+        Wrap a function so every call is timed as the named stage.
+        """
+        enter, leave = self._enter, self._exit
+
+        def timed_function(*args):
+            start = enter()
+            try:
+                return function(*args)
+            finally:
+                leave(name, start)
+
+        return timed_function
+
+    def timed_iter(self, name: str, iterable):
+        """
+        Yield from an iterable, timing the production of each item as the named stage.
+        """
+        enter, leave = self._enter, self._exit
+        iterator = iter(iterable)
+        while True:
+            start = enter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                leave(name, start)
+            yield item
+
+    # timed() and timed_iter() run once per event, so they call these directly
+    # instead of going through the stage() context manager.
+    def _enter(self) -> float:
+        self._children.append(0.0)
+        return time.perf_counter()
+
+    def _exit(self, name: str, start: float):
+        elapsed = time.perf_counter() - start
+        children = self._children
+        nested = children.pop()
+        if children:
+            children[-1] += elapsed
+        if self._current is not None:
+            stages = self._current["stages"]
+            stages[name] = stages.get(name, 0.0) + elapsed - nested
+
+    def totals(self) -> dict:
+        """
+        Return the time per stage summed over all files.
+        """
+        totals = {}
+        for stats in self.files.values():
+            for name, seconds in stats["stages"].items():
+                totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def report(self) -> dict:
+        """
+        Return the per-file and total stage times as a JSON serialisable dict.
+        """
+        return {
+            "files": {
+                filename: {
+                    "events": stats["events"],
+                    "seconds": round(stats["seconds"], 6),
+                    "stages": {
+                        name: round(seconds, 6)
+                        for name, seconds in stats["stages"].items()
+                    },
+                    **({"pipeline": stats["pipeline"]} if "pipeline" in stats else {}),
+                }
+                for filename, stats in self.files.items()
+            },
+            "totals": {
+                name: round(seconds, 6) for name, seconds in self.totals().items()
+            },
+            "events": sum(stats["events"] for stats in self.files.values()),
+        }
+
+    def write_report(self, filename: str):
+        """
+        Write the report to a JSON file.
+        """
+        with open(filename, "w") as file:
+            json.dump(self.report(), file, indent=2)
+
+    def summary(self) -> list[str]:
+        """
+        Return a human readable breakdown of the stage totals, one line per stage.
+        """
+        totals = self.totals()
+        overall = sum(totals.values()) or 1.0
+        lines = [
+            f"{STAGE_DESCRIPTIONS.get(name, name):<30} {seconds:9.3f}s {seconds / overall:6.1%}"
+            for name, seconds in totals.items()
+            if seconds
+        ]
+        pipelines = [
+            stats["pipeline"] for stats in self.files.values() if "pipeline" in stats
+        ]
+        if pipelines:
+            lines.append(
+                f"{'Parse/write pipeline':<30} peak queue "
+                f"{max(pipeline['peak_occupancy'] for pipeline in pipelines)} of "
+                f"{pipelines[0]['depth']} batches, parser stalled "
+                f"{sum(pipeline['parser_stall'] for pipeline in pipelines):.3f}s, writer stalled "
+                f"{sum(pipeline['writer_stall'] for pipeline in pipelines):.3f}s, peak "
+                f"{max(pipeline['peak_buffered_bytes'] for pipeline in pipelines) / 1024:.0f} KB buffered"
+            )
+        return lines
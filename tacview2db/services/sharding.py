@@ -0,0 +1,114 @@
+import logging
+
+from models.database import Database
+from models.mission import Mission
+from models.shards import ShardCatalog, campaign_key, month_key
+from models.sources import expand_sources, source_exists
+from models.tacview_data import open_tacview
+from services.profiling import StageProfiler
+from services.tacview_engine import process_all_tacview_files
+
+from config import (
+    CHECKPOINT_EVENTS,
+    DEFAULT_PRAGMA_PROFILE,
+    DUPLICATE_MISSION_POLICY,
+    PIPELINE_BATCH_SIZE,
+    PIPELINE_QUEUE_DEPTH,
+)
+
+
+def shard_key(filename: str, shard_by: str, campaign: str = None) -> str:
+    """
+    Return the key of the shard a file's mission belongs in.
+
+    Args:
+        filename: Path to the Tacview XML file or ACMI recording
+        shard_by: "campaign" or "month"
+        campaign: Campaign name for all files (defaults to each file's folder name)
+
+    Returns:
+        The shard key
+    """
+    if shard_by == "campaign":
+        return campaign_key(filename, campaign)
+
+    # Only the header is parsed to find the recording time.
+    with open_tacview(filename) as tacview_stream:
+        mission = Mission(tacview_stream.xml_full_data)
+    return month_key(mission.recordingTime, filename)
+
+
+def process_sharded_files(
+    catalog: ShardCatalog,
+    clear_db: bool,
+    mission_filenames: tuple[str],
+    shard_by: str,
+    campaign: str = None,
+    jobs: int = 1,
+    force: bool = False,
+    duplicate_policy: str = DUPLICATE_MISSION_POLICY,
+    profiler: StageProfiler = None,
+    quiet: bool = False,
+    sqlite_profile: str = DEFAULT_PRAGMA_PROFILE,
+    pipeline_depth: int = PIPELINE_QUEUE_DEPTH,
+    pipeline_batch: int = PIPELINE_BATCH_SIZE,
+    checkpoint_events: int = CHECKPOINT_EVENTS,
+) -> tuple[int]:
+    """
+    Import files into shard databases, one per campaign or month, and record
+    the shards in the catalog.
+
+    Files are grouped by shard first, keeping their order, and each group is
+    imported with process_all_tacview_files into its own shard database.
+
+    Args:
+        catalog: ShardCatalog listing the shards
+        clear_db: Clear each shard that files are imported into before importing
+        mission_filenames: Collection of Tacview XML file paths to process
+        shard_by: "campaign" or "month"
+        campaign: Campaign name for all files (defaults to each file's folder name)
+        jobs, force, duplicate_policy, profiler, quiet: As for process_all_tacview_files
+        sqlite_profile: Settings profile the shard databases are opened with
+        pipeline_depth, pipeline_batch, checkpoint_events: As for process_all_tacview_files
+
+    Returns:
+        A tuple containing (number of files processed, total number of files)
+    """
+    mission_filenames = expand_sources(mission_filenames)
+    groups = {}
+    for file in mission_filenames:
+        if not source_exists(file):
+            logging.error(
+                f"File name {file} does not exist and being skipped for processing."
+            )
+            continue
+        try:
+            key = shard_key(file, shard_by, campaign)
+        except Exception as error:
+            logging.error(f"Could not read the mission in {file}. Error: {error}")
+            continue
+        groups.setdefault(key, []).append(file)
+
+    file_counter = 0
+    for key, files in groups.items():
+        logging.info(f"Importing {len(files)} files into shard {key}.")
+        db = Database(catalog.shard_path(key, shard_by), sqlite_profile)
+        try:
+            file_counter += process_all_tacview_files(
+                db,
+                clear_db,
+                files,
+                jobs,
+                force,
+                duplicate_policy,
+                profiler,
+                quiet,
+                pipeline_depth,
+                pipeline_batch,
+                checkpoint_events,
+            )[0]
+            catalog.update(key, db)
+        finally:
+            db.close_connection()
+
+    return (file_counter, len(mission_filenames))
@@ -1,22 +1,49 @@
 import logging
 import time
-import os
 
-from models.mission import Mission
-from models.event import Event
-from models.primary import Primary
-from models.secondary import Secondary
-from models.parent import Parent
+from collections import deque
+from contextlib import nullcontext
+from itertools import islice
+
+from models.mission import Mission, MissionIndex
 from models.database import Database
-from models.tacview_data import Tacview
-from pathlib import Path
-from tqdm import tqdm
+from models.engagement import (
+    ENGAGEMENT_ACTIONS,
+    ENGAGEMENT_COLUMNS,
+    EngagementBuilder,
+    has_engagements,
+    rebuild_engagements,
+)
+from models.records import (
+    EVENT_COLUMNS,
+    OBJECT_COLUMNS,
+    PARENT_COLUMNS,
+    extract_event,
+)
+from models.manifest import ImportCheckpoint, ImportManifest, ImportRecord
+from models.sources import expand_sources, source_exists, source_size
+from models.tacview_data import TacviewStream, open_tacview
+from services.pipeline import EventPipeline
+from services.profiling import StageProfiler
+
+from config import (
+    CHECKPOINT_EVENTS,
+    DUPLICATE_MISSION_POLICY,
+    LOG_SUMMARY_SECONDS,
+    PIPELINE_BATCH_SIZE,
+    PIPELINE_QUEUE_DEPTH,
+)
+
+# Number of events between calls to a progress callback.
+PROGRESS_INTERVAL = 500
 
 
 def calculate_total_bytes(files: str):
     """
     Calculate the total size in bytes of all files to be processed.
     This is used to provide accurate progress tracking.
+    Compressed files count their compressed size, and a zip archive counts the
+    compressed size of every export it holds.
 
     Args:
         files: A collection of file paths to measure
@@ -26,8 +53,8 @@ def calculate_total_bytes(files: str):
     """
     total_bytes = 0
 
-    for file in files:
-        total_bytes += os.path.getsize(file)
+    for file in expand_sources(files):
+        total_bytes += source_size(file)
 
     return total_bytes
 
@@ -38,16 +65,65 @@ def calculate_file_size(file: str):
     Used for updating the progress bar after each file is processed.
 
     Args:
-        file: The path to the file
+        file: The path to the file, or "archive.zip::member.xml" for an export in an archive
 
     Returns:
-        The file size in bytes
+        The file size in bytes, as stored on disk
+    """
+    return source_size(file)
+
+
+class NullProgressBar:
+    """
+    Stands in for a tqdm progress bar when progress output is turned off.
     """
-    return os.path.getsize(file)
+
+    def update(self, n: int = 1):
+        pass
+
+    def set_postfix_str(self, text: str):
+        pass
+
+    def close(self):
+        pass
+
+
+def create_progress_bar(total_bytes: int, quiet: bool = False):
+    """
+    Create the console progress bar for an import, measured in bytes.
+
+    Args:
+        total_bytes: Size of all files to be processed
+        quiet: Return a NullProgressBar instead
+
+    Returns:
+        A tqdm progress bar, or a NullProgressBar when quiet
+    """
+    if quiet:
+        return NullProgressBar()
+    # tqdm is slow to import, so it is only loaded when a progress bar is shown.
+    from tqdm import tqdm
+
+    return tqdm(
+        total=total_bytes,
+        ncols=80,
+        unit="kb",
+        bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt}",
+    )
 
 
 def process_all_tacview_files(
-    db: Database, clear_db: bool, mission_filenames: tuple[str]
+    db: Database,
+    clear_db: bool,
+    mission_filenames: tuple[str],
+    jobs: int = 1,
+    force: bool = False,
+    duplicate_policy: str = DUPLICATE_MISSION_POLICY,
+    profiler: StageProfiler = None,
+    quiet: bool = False,
+    pipeline_depth: int = PIPELINE_QUEUE_DEPTH,
+    pipeline_batch: int = PIPELINE_BATCH_SIZE,
+    checkpoint_events: int = CHECKPOINT_EVENTS,
 ) -> tuple[int]:
     """
     Main function to process all provided Tacview XML files.
@@ -56,7 +132,17 @@ def process_all_tacview_files(
     Args:
         db: Database object for storing extracted data
         clear_db: Boolean indicating whether to clear existing database data
-        mission_filenames: Collection of Tacview XML file paths to process
+        mission_filenames: Collection of Tacview XML file paths to process. Files may be
+            compressed (.gz, .bz2, .xz) and zip archives are imported export by export
+        jobs: Number of worker processes used to parse files in parallel (1 processes files in this process)
+        force: Re-import files even if the import manifest shows they are unchanged
+        duplicate_policy: "skip", "replace" or "append" when a file's mission is already in the database
+        profiler: Optional StageProfiler that records the time of each stage per file
+        quiet: Do not show a progress bar
+        pipeline_depth: Batches of parsed events queued ahead of the writer (0 parses and writes in lock-step)
+        pipeline_batch: Events per batch passed from the parser to the writer
+        checkpoint_events: Commit a file's rows with a checkpoint every N events, so an
+            interrupted import resumes from there (None or 0 commits once per file)
 
     Returns:
         A tuple containing (number of files processed, total number of files)
@@ -64,98 +150,765 @@ def process_all_tacview_files(
     # Set start time of processing to calculate total time taken.
     start = time.perf_counter()
 
-    file_counter = 0
-    total_bytes = calculate_total_bytes(mission_filenames)
+    file_counter = skipped_counter = 0
 
     # If the -c option was passed (or checkbox ticked in GUI) in then clear the DB before importing any data.
+    # The import manifest is cleared with it.
     if clear_db:
         db.clear_table_data()
+    manifest = ImportManifest(db)
 
-    # Create a progress bar object
-    progress_bar = tqdm(
-        total=total_bytes,
-        ncols=80,
-        unit="kb",
-        bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt}",
-    )
+    # Each export inside a zip archive is imported (and counted) as a file of its own.
+    mission_filenames = expand_sources(mission_filenames)
 
+    # Mission identities are loaded once for the whole batch.
+    mission_index = MissionIndex(db)
+
+    # Files that do not exist are reported and dropped before any work starts.
+    # Files the manifest shows as already imported and unchanged are skipped.
+    import_queue = []
     for file in mission_filenames:
-        if Path(file).exists():
-            process_tacview_file(db, file)
-            file_counter += 1
-            progress_bar.set_postfix_str(file)
-            # progress_bar.set_description("Processing...")
-            progress_bar.update(calculate_file_size(file))
-        else:
+        if not source_exists(file):
             logging.error(
                 f"File name {file} does not exist and being skipped for processing."
             )
+            continue
+
+        if profiler:
+            profiler.start_file(file)
+            with profiler.stage("manifest"):
+                import_record = manifest.check_file(file, force)
+            profiler.end_file()
+        else:
+            import_record = manifest.check_file(file, force)
+
+        if import_record is None:
+            skipped_counter += 1
+        else:
+            import_queue.append((file, import_record))
+
+    total_bytes = calculate_total_bytes(file for file, _ in import_queue)
+
+    # Create a progress bar object
+    progress_bar = create_progress_bar(total_bytes, quiet)
+
+    # With the bulk profile the indexes are dropped for the batch and rebuilt once at the end.
+    bulk_load = (
+        db.bulk_load() if db.profile == "bulk" and import_queue else nullcontext()
+    )
+    with bulk_load:
+        if jobs > 1:
+            file_counter = process_files_in_parallel(
+                db,
+                manifest,
+                mission_index,
+                duplicate_policy,
+                import_queue,
+                jobs,
+                progress_bar,
+                profiler,
+                checkpoint_events,
+            )
+        else:
+            for file, import_record in import_queue:
+                try:
+                    mission_id = process_tacview_file(
+                        db,
+                        file,
+                        import_record,
+                        mission_index,
+                        duplicate_policy,
+                        profiler,
+                        pipeline_depth=pipeline_depth,
+                        pipeline_batch=pipeline_batch,
+                        checkpoint_events=checkpoint_events,
+                    )
+                    manifest.record_imported(import_record, mission_id)
+                    file_counter += 1
+                except Exception as error:
+                    # The file's transaction has already been rolled back, so move on to the next one.
+                    logging.error(
+                        f"Processing of {file} failed and was rolled back. Error: {error}"
+                    )
+                progress_bar.set_postfix_str(file)
+                # progress_bar.set_description("Processing...")
+                progress_bar.update(calculate_file_size(file))
 
     # Close the progress bar
     progress_bar.close()
 
+    if skipped_counter:
+        logging.info(
+            f"{skipped_counter} files were skipped as already imported and unchanged."
+        )
+    file_counter += skipped_counter
+
     end = time.perf_counter()
     logging.info(
-        f"{file_counter} files processed successfully in {end - start:.3f} seconds. {len(mission_filenames) - file_counter} files were not found."
+        f"{file_counter} files processed successfully in {end - start:.3f} seconds. {len(mission_filenames) - file_counter} files were not found or failed."
     )
 
     return (file_counter, len(mission_filenames))
 
 
-def process_tacview_file(db: Database, filename: str):
+def find_missions(db: Database, missions: list[str]) -> list[int]:
+    """
+    Resolve missions given by id or by name to mission ids.
+
+    Args:
+        db: Database object holding the missions
+        missions: Mission ids or names
+
+    Returns:
+        The mission ids, in the order given
+
+    Raises:
+        ValueError: If a mission is not found, or a name matches more than one mission
+    """
+    mission_ids = []
+    for mission in missions:
+        if mission.isdigit():
+            cursor = db.conn.execute("SELECT id FROM Mission WHERE id = ?", (mission,))
+            if cursor.fetchone():
+                mission_ids.append(int(mission))
+                continue
+        matches = [
+            row[0]
+            for row in db.conn.execute(
+                "SELECT id FROM Mission WHERE name = ? ORDER BY id", (mission,)
+            )
+        ]
+        if not matches:
+            raise ValueError(f"No mission with the id or name {mission}.")
+        if len(matches) > 1:
+            raise ValueError(
+                f"{len(matches)} missions are named {mission} (ids {', '.join(map(str, matches))}), "
+                "give the id of the one to delete."
+            )
+        mission_ids.append(matches[0])
+    return mission_ids
+
+
+def delete_missions(db: Database, missions: list[str]) -> list[int]:
+    """
+    Delete missions and all of their Event, Primary, Secondary and Parent rows
+    in a single transaction, then give the freed space back to the file system.
+    Their import manifest entries and checkpoints are removed too, so the files can be imported again.
+
+    Args:
+        db: Database object holding the missions
+        missions: Mission ids or names
+
+    Returns:
+        The ids of the deleted missions
+
+    Raises:
+        ValueError: If a mission is not found, or a name matches more than one mission
+    """
+    mission_ids = find_missions(db, missions)
+    # Makes sure the manifest table exists before it is written to.
+    ImportManifest(db)
+
+    with db.bulk_writer() as writer:
+        for mission_id in mission_ids:
+            Mission.delete_from_db(writer, mission_id)
+            writer.execute_sql_statement(
+                "DELETE FROM ImportManifest WHERE mission_id = ?", (mission_id,)
+            )
+            writer.execute_sql_statement(
+                "DELETE FROM ImportCheckpoint WHERE mission_id = ?", (mission_id,)
+            )
+
+    db.reclaim_space()
+    return mission_ids
+
+
+def process_files_in_parallel(
+    db: Database,
+    manifest: ImportManifest,
+    mission_index: MissionIndex,
+    duplicate_policy: str,
+    import_queue: list[tuple],
+    jobs: int,
+    progress_bar,
+    profiler: StageProfiler = None,
+    checkpoint_events: int = CHECKPOINT_EVENTS,
+) -> int:
+    """
+    Parse and extract files in a pool of worker processes while this process
+    acts as the single SQLite writer.
+
+    Results are written in the order the files were given, so mission ids are
+    the same as a sequential run. At most two files per worker are in flight
+    so extracted data cannot pile up faster than it is written.
+
+    Args:
+        db: Database object for storing extracted data
+        manifest: ImportManifest updated as each file is written
+        mission_index: MissionIndex used to detect missions already in the database
+        duplicate_policy: "skip", "replace" or "append" for missions already in the database
+        import_queue: (filename, ImportRecord) pairs to process, all files must exist
+        jobs: Number of worker processes
+        progress_bar: Progress bar updated with each file's size as it is written
+        profiler: Optional StageProfiler, the workers' parse and extract times are added to it
+        checkpoint_events: As for process_all_tacview_files. Workers parse whole files, so a
+            resumed file is parsed from the start and its committed events are left out
+
+    Returns:
+        The number of files written successfully
+    """
+    file_counter = 0
+    pending = deque()
+    queued_files = iter(import_queue)
+
+    # Imported here as multiprocessing adds to the start-up time of every run, not just parallel ones.
+    from concurrent.futures import ProcessPoolExecutor
+    from models.tacview_logging import log_directly
+
+    # Workers log straight to the log file, as the thread writing the log queue is not forked with them.
+    with ProcessPoolExecutor(max_workers=jobs, initializer=log_directly) as executor:
+        # Prime the pool, then submit one more file each time a result is written.
+        for file, import_record in islice(queued_files, jobs * 2):
+            future = executor.submit(extract_tacview_file, file, bool(profiler))
+            pending.append((file, import_record, future))
+
+        while pending:
+            file, import_record, future = pending.popleft()
+            if profiler:
+                profiler.start_file(file)
+            try:
+                with profiler.stage("wait") if profiler else nullcontext():
+                    mission_obj, event_records, stage_times = future.result()
+                if profiler:
+                    profiler.add(stage_times)
+                logging.info(f"Processing file named {file}.")
+                if import_record.checkpoint:
+                    event_records = event_records[import_record.checkpoint.events :]
+                mission_id = write_tacview_data(
+                    db,
+                    mission_obj,
+                    event_records,
+                    import_record,
+                    mission_index,
+                    duplicate_policy,
+                    profiler,
+                    checkpoint_events,
+                )
+                manifest.record_imported(import_record, mission_id)
+                file_counter += 1
+            except Exception as error:
+                # A bad file only loses its own rows; the rest of the batch continues.
+                logging.error(
+                    f"Processing of {file} failed and was rolled back. Error: {error}"
+                )
+            finally:
+                if profiler:
+                    profiler.end_file()
+
+            progress_bar.set_postfix_str(file)
+            progress_bar.update(calculate_file_size(file))
+
+            for next_file, next_record in islice(queued_files, 1):
+                future = executor.submit(
+                    extract_tacview_file, next_file, bool(profiler)
+                )
+                pending.append((next_file, next_record, future))
+
+    return file_counter
+
+
+def extract_tacview_file(filename: str, profile: bool = False) -> tuple:
+    """
+    Parse a Tacview XML file or ACMI recording and extract its mission and event records without
+    touching the database. Used by worker processes for parallel ingestion.
+
+    Args:
+        filename: Path to the Tacview XML file to extract
+        profile: Time the parse and extract stages
+
+    Returns:
+        A tuple of (Mission object, list of EventRecord, stage times or None)
+    """
+    profiler = StageProfiler() if profile else None
+    if profiler:
+        profiler.start_file(filename)
+
+    with profiler.stage("parse") if profiler else nullcontext():
+        tacview_stream = open_tacview(filename)
+    with tacview_stream:
+        mission_obj = Mission(tacview_stream.xml_full_data)
+        event_records = list(read_event_records(tacview_stream, profiler))
+
+    if profiler:
+        profiler.end_file()
+        return mission_obj, event_records, profiler.files[filename]["stages"]
+    return mission_obj, event_records, None
+
+
+def read_event_records(tacview_stream: TacviewStream, profiler: StageProfiler = None):
+    """
+    Return an iterator of EventRecord over the stream's events, timing the
+    parse and extract stages when a profiler is given.
+    """
+    if profiler is None:
+        return map(extract_event, tacview_stream.events())
+    return map(
+        profiler.timed("extract", extract_event),
+        profiler.timed_iter("parse", tacview_stream.events()),
+    )
+
+
+def report_progress(
+    event_records, tacview_stream: TacviewStream, progress, interval=PROGRESS_INTERVAL
+):
+    """
+    Yield event records unchanged, calling progress(events, bytes_read) every
+    interval events and once more after the last one.
+    """
+    events = 0
+    for events, record in enumerate(event_records, 1):
+        if events % interval == 0:
+            progress(events, tacview_stream.bytes_read)
+        yield record
+    progress(events, tacview_stream.bytes_read)
+
+
+def log_progress(filename: str, progress=None, interval: float = LOG_SUMMARY_SECONDS):
+    """
+    Return a progress callback that logs a summary of the events written and
+    their rate at DEBUG level at most every interval seconds, then calls progress.
+    Progress through a file is logged this way rather than once per event.
     """
-    Process a single Tacview XML file.
+    start = last = time.perf_counter()
+
+    def log_and_report(events, bytes_read):
+        nonlocal last
+        now = time.perf_counter()
+        if now - last >= interval:
+            last = now
+            logging.debug(
+                f"{filename}: {events} events written, {bytes_read / 1e6:.1f} MB read, "
+                f"{events / (now - start):,.0f} events/s."
+            )
+        if progress:
+            progress(events, bytes_read)
+
+    return log_and_report
+
+
+def note_event_offsets(
+    event_records,
+    tacview_stream: TacviewStream,
+    offsets: dict,
+    interval: int,
+    first: int = 0,
+):
+    """
+    Yield event records unchanged, noting the stream's event_offset after
+    every interval-th event of the file in offsets, by event number. This
+    runs with the parser, ahead of the writer, which takes the offset of each
+    checkpoint it commits from offsets.
+    """
+    for number, record in enumerate(event_records, first + 1):
+        if number % interval == 0:
+            offsets[number] = tacview_stream.event_offset
+        yield record
+
+
+def process_tacview_file(
+    db: Database,
+    filename: str,
+    import_record: ImportRecord = None,
+    mission_index: MissionIndex = None,
+    duplicate_policy: str = DUPLICATE_MISSION_POLICY,
+    profiler: StageProfiler = None,
+    progress=None,
+    pipeline_depth: int = PIPELINE_QUEUE_DEPTH,
+    pipeline_batch: int = PIPELINE_BATCH_SIZE,
+    checkpoint_events: int = CHECKPOINT_EVENTS,
+) -> int:
+    """
+    Process a single Tacview XML file or ACMI recording.
     This function extracts and stores mission, event, primary, secondary, and parent data.
 
     Args:
         db: Database object for storing extracted data
         filename: Path to the Tacview XML file to process
+        import_record: Optional manifest record written in the same transaction as the file's rows
+        mission_index: MissionIndex shared across a batch (loaded from the database if not given)
+        duplicate_policy: "skip", "replace" or "append" when the mission is already in the database
+        profiler: Optional StageProfiler that records the time of each stage
+        progress: Optional callback, called as progress(events, bytes_read) while the file is written.
+            An exception raised by the callback aborts the file and rolls it back.
+        pipeline_depth: Batches of parsed events queued ahead of the writer (0 parses and writes in lock-step)
+        pipeline_batch: Events per batch passed from the parser to the writer
+        checkpoint_events: Commit the rows with a checkpoint every N events (None or 0 for a
+            single transaction). Needs an import_record, and its checkpoint is resumed from
+
+    Returns:
+        The id of the mission created for the file, or of the existing mission if it was skipped
     """
     logging.info(f"Processing file named {filename}.")
-    # Parse the XML file by creating a Tacview object with the xml filename.
-    tacview_parsed_data = Tacview(filename)
+    if profiler:
+        profiler.start_file(filename)
+    try:
+        # Stream the XML or ACMI file. Only the header is read up front; events are parsed one at a time below.
+        resumed = import_record.checkpoint if import_record else None
+        with profiler.stage("parse") if profiler else nullcontext():
+            tacview_stream = open_tacview(filename)
+            if resumed:
+                tacview_stream = resume_tacview(tacview_stream, filename, resumed)
+
+        with tacview_stream:
+            # Create a mission object. Whether it already exists is decided by write_tacview_data.
+            mission_obj = Mission(tacview_stream.xml_full_data)
+
+            # Events are parsed in a thread of their own, a bounded number of batches ahead of the writer.
+            # A skipped duplicate never reads past the header.
+            event_records = read_event_records(tacview_stream, profiler)
+            event_offsets = None
+            if import_record and checkpoint_events:
+                event_offsets = {}
+                event_records = note_event_offsets(
+                    event_records,
+                    tacview_stream,
+                    event_offsets,
+                    checkpoint_events,
+                    resumed.events if resumed else 0,
+                )
+            pipeline = EventPipeline(
+                event_records, pipeline_depth, pipeline_batch, profiler
+            )
+            with pipeline:
+                event_records = iter(pipeline)
+                if logging.getLogger().isEnabledFor(logging.DEBUG):
+                    progress = log_progress(filename, progress)
+                if progress:
+                    event_records = report_progress(
+                        event_records, tacview_stream, progress
+                    )
+                mission_id = write_tacview_data(
+                    db,
+                    mission_obj,
+                    event_records,
+                    import_record,
+                    mission_index,
+                    duplicate_policy,
+                    profiler,
+                    checkpoint_events,
+                    event_offsets,
+                )
+            if pipeline.stats.batches:
+                logging.info(f"Parse/write pipeline: {pipeline.stats.summary()}.")
+                if profiler:
+                    profiler.add_pipeline(pipeline.stats)
+            return mission_id
+    finally:
+        if profiler:
+            profiler.end_file()
+
+
+def resume_tacview(tacview_stream, filename: str, checkpoint: ImportCheckpoint):
+    """
+    Move a newly opened stream past the events an interrupted import committed,
+    seeking to the checkpoint's offset. If the file cannot be read from there
+    it is opened again and the committed events are parsed and skipped.
 
-    # Create a mission object, check if it exists in the db and commit it to the database
-    mission_obj = Mission(tacview_parsed_data.xml_full_data)
-    mission_obj.check_mission_exists(db)
-    mission_obj.write_to_db(db)
+    Returns:
+        The stream to read the remaining events from
+    """
+    try:
+        tacview_stream.resume(checkpoint.events, checkpoint.byte_offset)
+        return tacview_stream
+    except (ValueError, OSError) as error:
+        logging.warning(
+            f"Cannot resume {filename} at byte {checkpoint.byte_offset}, parsing the "
+            f"first {checkpoint.events} events again. Error: {error}"
+        )
+    tacview_stream.close()
+    tacview_stream = open_tacview(filename)
+    tacview_stream.resume(checkpoint.events)
+    return tacview_stream
+
+
+def write_tacview_data(
+    db: Database,
+    mission_obj: Mission,
+    event_records,
+    import_record: ImportRecord = None,
+    mission_index: MissionIndex = None,
+    duplicate_policy: str = DUPLICATE_MISSION_POLICY,
+    profiler: StageProfiler = None,
+    checkpoint_events: int = CHECKPOINT_EVENTS,
+    event_offsets: dict = None,
+) -> int:
+    """
+    Write a mission and its extracted event objects to the database.
+
+    With an import_record and checkpoint_events, the rows are committed every
+    checkpoint_events events together with an ImportCheckpoint, so a crash
+    never leaves a batch half written and the import can resume after the
+    last commit. The last batch commits the engagements, the manifest entry
+    and the deletion of any replaced missions, and removes the checkpoint.
+    If the import fails, rather than being interrupted, the batches already
+    committed are deleted so the file is still rolled back as a whole.
+
+    Args:
+        db: Database object for storing extracted data
+        mission_obj: The Mission the events belong to
+        event_records: Iterable of EventRecord
+        import_record: Optional manifest record; any mission it replaces is deleted in the same transaction
+        mission_index: MissionIndex shared across a batch (loaded from the database if not given)
+        duplicate_policy: "skip", "replace" or "append" when the mission is already in the database
+        profiler: Optional StageProfiler charged with the write, flush and commit stages
+        checkpoint_events: Commit the rows with a checkpoint every N events (None or 0 for a
+            single transaction). If import_record has a checkpoint, event_records must start
+            after its events and the mission's rows are added to
+        event_offsets: Offsets in the file after the events checkpoints are taken at, by
+            event number, as filled in by note_event_offsets
 
-    # Extract the events data from the parsed XML tree.
-    event_data = tacview_parsed_data.xml_event_data
+    Returns:
+        The id of the mission created, or of the existing mission if it was skipped
+    """
+    if mission_index is None:
+        mission_index = MissionIndex(db)
+
+    resumed = import_record.checkpoint if import_record else None
+    checkpoint = resumed
+    if import_record:
+        # Stored with the entry, so it is not trusted once the mission id is given to another mission.
+        import_record.mission_identity = mission_obj.identity
+    if import_record and checkpoint_events and checkpoint is None:
+        checkpoint = ImportCheckpoint(
+            import_record.path,
+            import_record.content_hash,
+            mission_identity=mission_obj.identity,
+        )
+
+    replaced_mission_ids = []
+    if import_record:
+        # A changed file replaces the rows of its previous import, and of an interrupted one.
+        for mission_id in (
+            import_record.previous_mission_id,
+            import_record.abandoned_mission_id,
+        ):
+            if mission_id:
+                replaced_mission_ids.append(mission_id)
+
+    duplicate_ids = [
+        mission_id
+        for mission_id in mission_index.find(mission_obj)
+        if mission_id not in replaced_mission_ids
+        and not (resumed and mission_id == resumed.mission_id)
+    ]
+    if duplicate_ids:
+        if duplicate_policy == "skip":
+            logging.warning(
+                f"Mission {mission_obj.name} already exists in DB as mission {duplicate_ids[0]}, skipping."
+            )
+            if import_record:
+                import_record.write_to_db(db, duplicate_ids[0])
+            return duplicate_ids[0]
+        elif duplicate_policy == "replace":
+            logging.warning(
+                f"Mission {mission_obj.name} already exists in DB and will be replaced."
+            )
+            replaced_mission_ids.extend(duplicate_ids)
+        else:
+            logging.warning(
+                f"Mission {mission_obj.name} already exists in DB, appending a duplicate."
+            )
+    # All rows for the file are buffered by a BulkWriter and committed in a single transaction,
+    # or in batches with a checkpoint. If anything fails the whole file is rolled back, leaving
+    # no partial mission behind. Replaced missions are only deleted in the last transaction, so
+    # they stay in place until the new import is complete.
+    # Time spent pulling records from a streamed file is charged to parse and extract, not write.
+    write_stage = profiler.stage("write") if profiler else nullcontext()
+    try:
+        with write_stage, db.bulk_writer(profiler=profiler) as writer:
+            mission_id = _write_events(
+                db,
+                writer,
+                mission_obj,
+                event_records,
+                checkpoint,
+                checkpoint_events,
+                event_offsets,
+                profiler,
+            )
+            for replaced_mission_id in replaced_mission_ids:
+                Mission.delete_from_db(writer, replaced_mission_id)
+            if checkpoint is not None and checkpoint.mission_id is not None:
+                checkpoint.delete_from_db(writer)
+            if import_record:
+                import_record.write_to_db(writer, mission_id)
+    except Exception:
+        # Batches committed before the error, and in an earlier run, go as well.
+        if checkpoint is not None and checkpoint.mission_id is not None:
+            logging.error(
+                f"Deleting the {checkpoint.events} events of mission {checkpoint.mission_id} committed before the error."
+            )
+            with db.bulk_writer() as writer:
+                Mission.delete_from_db(writer, checkpoint.mission_id)
+                checkpoint.delete_from_db(writer)
+        raise
+    except KeyboardInterrupt:
+        if checkpoint is not None and checkpoint.mission_id is not None:
+            logging.warning(
+                f"Import of mission {checkpoint.mission_id} interrupted with {checkpoint.events} events committed. "
+                "It resumes from there when the file is imported again."
+            )
+        raise
+
+    mission_index.remove([*replaced_mission_ids, mission_obj.id])
+    mission_index.add(mission_obj)
+    return mission_obj.id
+
+
+def _write_events(
+    db: Database,
+    writer,
+    mission_obj: Mission,
+    event_records,
+    checkpoint: ImportCheckpoint,
+    checkpoint_events: int,
+    event_offsets: dict,
+    profiler: StageProfiler,
+) -> int:
+    """
+    Write the mission, unless it is being resumed, its events and objects,
+    its duration if the header had none, and its engagements, committing a
+    checkpoint every checkpoint_events events. Returns the mission id.
+    """
+    resumed = checkpoint is not None and checkpoint.mission_id is not None
+    if resumed:
+        mission_obj.id = checkpoint.mission_id
+        first_event = checkpoint.events
+    else:
+        mission_obj.write_to_db(writer)
+        first_event = 0
 
     logging.info("Processing event records.")
 
+    # Fire, hit and destroy events are kept to reconstruct the engagements once the events are written.
+    # A resumed mission's engagements are rebuilt from the database instead.
+    engagement_events = [] if has_engagements(db.conn) and not resumed else None
+
+    # Number of events written in this run when the next checkpoint is due.
+    next_checkpoint = None
+    if checkpoint is not None and checkpoint_events:
+        next_checkpoint = checkpoint_events - first_event % checkpoint_events
+
     # Initialise counter variables to 0. These are used to display the amount of records processed for logging.
     event_counter = primary_object_counter = secondary_object_counter = (
         parent_object_counter
     ) = 0
 
-    # Process all the events contained with the parsed data. This loop also processes the Primary, Secondary and Parent object associated with an Event.
-    for event in event_data:
-        event_obj = Event(event)
-        event_obj.write_to_db(db, mission_obj.id)
+    # Process all the events. This loop also writes the Primary, Secondary and Parent object associated with an Event.
+    # Records already hold their values in column order, so they are passed to the writer as-is.
+    insert = writer.insert
+    record = None
+    for record in event_records:
+        event_id = insert(
+            "Event", EVENT_COLUMNS, (mission_obj.id, record.time, record.action)
+        )
         event_counter += 1
+        if engagement_events is not None and record.action in ENGAGEMENT_ACTIONS:
+            engagement_events.append((event_id, record))
 
-        # Get the primary object. Every Event has at least one Primary Object
-        primary_obj = Primary(event)
-        primary_obj.write_to_db(db, event_obj.id)
+        # Every Event has at least one Primary Object
+        insert("PrimaryObject", OBJECT_COLUMNS, (event_id, *record.primary))
         primary_object_counter += 1
 
-        # Get the Secondary Object (if it exists). This object tells us what the event 'action' was performed on.
-        if Secondary.xml_object_exists(event):
-            secondary_obj = Secondary(event)
-            secondary_obj.write_to_db(db, event_obj.id)
+        # A Parent object can only appear if a secondary object is present.
+        if record.secondary is not None:
+            secondary_id = insert(
+                "SecondaryObject", OBJECT_COLUMNS, (event_id, *record.secondary)
+            )
             secondary_object_counter += 1
 
-            # Get the Parent Object (if it exists). This object tells who performed the action.
-            # A Parent object can only appear if a secondary object is present.
-            # This is why it is contained within the Secondary object's IF statement scope.
-
-            if Parent.xml_object_exists(event):
-                parent_obj = Parent(event)
-                parent_obj.write_to_db(db, event_obj.id, secondary_obj.id)
+            if record.parent is not None:
+                # ParentObject.tacview_id holds the id of the secondary object row.
+                insert(
+                    "ParentObject",
+                    PARENT_COLUMNS,
+                    (event_id, secondary_id, *record.parent),
+                )
                 parent_object_counter += 1
 
+        if event_counter == next_checkpoint:
+            # The checkpoint is committed with the batch it describes, never without it.
+            events = first_event + event_counter
+            offset = event_offsets.pop(events, None) if event_offsets else None
+            checkpoint.write_to_db(writer, mission_obj.id, events, offset)
+            writer.commit()
+            writer.begin()
+            next_checkpoint += checkpoint_events
+
+    # ACMI recordings have no duration in their header, it runs to the last event.
+    if mission_obj.duration is None:
+        if record is not None:
+            mission_obj.duration = record.time
+        elif resumed:
+            cursor = writer.conn.execute(
+                "SELECT MAX(time) FROM Event WHERE mission_id = ?", (mission_obj.id,)
+            )
+            mission_obj.duration = cursor.fetchone()[0]
+        if mission_obj.duration is not None:
+            writer.execute_sql_statement(
+                "UPDATE Mission SET duration = ? WHERE id = ?",
+                (mission_obj.duration, mission_obj.id),
+            )
+
+    engagement_counter = 0
+    if has_engagements(db.conn):
+        with profiler.stage("engagements") if profiler else nullcontext():
+            if engagement_events is not None:
+                engagement_counter = write_engagements(
+                    writer, mission_obj.id, engagement_events
+                )
+            else:
+                writer.flush()
+                engagement_counter = rebuild_engagements(writer.conn, mission_obj.id)
+
+    if profiler:
+        profiler.count_events(event_counter)
+
     logging.info(
         f"Successfully processed {event_counter} event records, {primary_object_counter} primary records, {secondary_object_counter} secondary records and {parent_object_counter} parent records."
     )
+    logging.info(f"{engagement_counter} engagements reconstructed.")
+
+    return mission_obj.id
+
+
+def write_engagements(writer, mission_id: int, engagement_events: list[tuple]) -> int:
+    """
+    Post-ingest stage: reconstruct a mission's engagements from its fire, hit
+    and destroy events in one pass, and write them in the file's transaction.
+
+    Args:
+        writer: BulkWriter the mission's rows are written with
+        mission_id: Id of the mission the events belong to
+        engagement_events: (event id, EventRecord) pairs of the mission's engagement events
+
+    Returns:
+        The number of engagements written
+    """
+    # Exports list events in time order, sorting makes sure of it like rebuild_engagements().
+    engagement_events.sort(key=lambda event: (event[1].time, event[0]))
+    builder = EngagementBuilder(mission_id)
+    for event_id, record in engagement_events:
+        builder.add(
+            event_id,
+            record.time,
+            record.action,
+            record.primary,
+            record.secondary,
+            record.parent,
+        )
+
+    engagements = builder.engagements()
+    for engagement in engagements:
+        writer.insert("Engagement", ENGAGEMENT_COLUMNS, engagement)
+    return len(engagements)
@@ -3,21 +3,49 @@ import os
 import time
 import sys
 import logging
-from art import tprint
-from colorama import Fore, Style
-from services.tacview_engine import process_all_tacview_files
-from views.tacview_gui_grid import TacviewGUIGrid
-from models.database import Database
+from services.tacview_engine import delete_missions, process_all_tacview_files
+from services.profiling import StageProfiler
+from models.database import BACKENDS, Database, open_database
+from models.mission import DUPLICATE_POLICIES
+from models.schema import (
+    SCHEMA_VERSION,
+    check_query_plans,
+    enable_incremental_vacuum,
+    normalise_storage,
+)
 
-from config import DATABASE_NAME
+from config import (
+    CATALOG_NAME,
+    CHECKPOINT_EVENTS,
+    DATABASE_BACKEND,
+    DATABASE_NAME,
+    DEFAULT_PRAGMA_PROFILE,
+    DUCKDB_DATABASE_NAME,
+    DUPLICATE_MISSION_POLICY,
+    PIPELINE_BATCH_SIZE,
+    PIPELINE_QUEUE_DEPTH,
+    SHARD_BY,
+    SHARD_DIRECTORY,
+    WATCH_PATTERN,
+    WATCH_POLL_INTERVAL,
+    WATCH_SETTLE_SECONDS,
+)
 
 
-def parse_command_line_args():
+def parse_command_line_args(argv):
     parser = argparse.ArgumentParser(
-        description="Process TacView XML into a SQLite3 database."
+        description="Process TacView XML into a SQLite3 database.",
+        epilog="Run 'tacview2db.py migrate -h' for help upgrading an existing database, "
+        "'tacview2db.py watch -h' to import new files from a folder continuously, "
+        "or 'tacview2db.py query -h' to query sharded databases.",
     )
     parser.add_argument(
-        "files", action="store", nargs="*", help="The XML filename(s) to process."
+        "files",
+        action="store",
+        nargs="*",
+        help="The XML filename(s) to process. Files may be compressed (.xml.gz, .xml.bz2, .xml.xz) "
+        "and every XML export in a .zip archive is imported. ACMI recordings (.txt.acmi, .zip.acmi) "
+        "are read directly, without exporting them to XML.",
     )
     parser.add_argument(
         "-c",
@@ -32,7 +60,396 @@ def parse_command_line_args():
         action="store_true",  # Flag argument, will be True if specified
         help="Enable verbose logging to console.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="No banner, progress bar or summary, for scheduled runs. Errors are still reported.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to parse files in parallel.",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Re-import files even if they are unchanged since their last import.",
+    )
+    parser.add_argument(
+        "--delete-mission",
+        action="append",
+        metavar="ID|NAME",
+        help="Delete a mission and all of its events before importing any file(s). Can be given more than once.",
+    )
+    parser.add_argument(
+        "-d",
+        "--duplicates",
+        choices=DUPLICATE_POLICIES,
+        default=DUPLICATE_MISSION_POLICY,
+        help="What to do when a mission is already in the database (default: %(default)s).",
+    )
+    sqlite_profile = parser.add_mutually_exclusive_group()
+    sqlite_profile.add_argument(
+        "--safe",
+        dest="sqlite_profile",
+        action="store_const",
+        const="safe",
+        help="Durable SQLite settings for incremental imports (the default).",
+    )
+    sqlite_profile.add_argument(
+        "--bulk",
+        dest="sqlite_profile",
+        action="store_const",
+        const="bulk",
+        help="Fast SQLite settings for backfilling many files: no syncs, exclusive lock, "
+        "and indexes rebuilt once after the load. Not crash safe.",
+    )
+    parser.set_defaults(sqlite_profile=DEFAULT_PRAGMA_PROFILE)
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DATABASE_BACKEND,
+        help=f"Database engine to import into: sqlite, or duckdb for a columnar database at {DUCKDB_DATABASE_NAME} "
+        "that answers statistics across many missions faster (needs the duckdb package, default: %(default)s).",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=("campaign", "month"),
+        default=SHARD_BY,
+        help="Import each mission into a shard database per campaign or per month, "
+        "listed in a catalog database, instead of the single database.",
+    )
+    parser.add_argument(
+        "--campaign",
+        metavar="NAME",
+        help="Campaign the imported files belong to when sharding by campaign "
+        "(default: the name of each file's folder).",
+    )
+    parser.add_argument(
+        "--pipeline-depth",
+        type=int,
+        default=PIPELINE_QUEUE_DEPTH,
+        metavar="BATCHES",
+        help="Batches of parsed events queued ahead of the database writer; 0 parses and "
+        "writes in lock-step in one thread (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--pipeline-batch",
+        type=int,
+        default=PIPELINE_BATCH_SIZE,
+        metavar="EVENTS",
+        help="Events per batch passed from the parser to the writer (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=CHECKPOINT_EVENTS,
+        metavar="EVENTS",
+        help="Commit each file's rows with a checkpoint every EVENTS events, so an interrupted "
+        "import resumes from the last checkpoint; 0 commits once per file (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile.json",
+        metavar="REPORT",
+        help="Time each import stage per file and write a JSON report (default: %(const)s).",
+    )
+    parser.add_argument(
+        "--pstats",
+        metavar="FILE",
+        help="Also run the import under cProfile and dump the statistics to FILE.",
+    )
+    args = parser.parse_args(argv)
+    if args.shard_by and args.delete_mission:
+        parser.error("--delete-mission works on the single database, not on shards.")
+    if args.backend != "sqlite" and (
+        args.shard_by or not (args.files or args.delete_mission)
+    ):
+        parser.error(
+            f"--backend {args.backend} imports files or deletes missions from the command line, "
+            "without --shard-by or the GUI."
+        )
+    return args
+
+
+def parse_migrate_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="tacview2db.py migrate",
+        description=f"Upgrade SQLite3 database(s) in place to schema version {SCHEMA_VERSION}.",
+    )
+    parser.add_argument(
+        "databases",
+        action="store",
+        nargs="*",
+        help="The database file(s) to upgrade. Defaults to the configured database.",
+    )
+    parser.add_argument(
+        "--check-plans",
+        action="store_true",
+        help="After migrating, verify the standard dashboard queries are served by indexes.",
+    )
+    parser.add_argument(
+        "--normalise",
+        action="store_true",
+        help="Convert the object tables to dictionary-encoded storage, keeping views with the old columns.",
+    )
+    parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="Rebuild the database once with incremental vacuum enabled, so deleted missions give their space back.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Enable verbose logging to console.",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_watch_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="tacview2db.py watch",
+        description="Keep running and import new Tacview XML files as they appear in the given folder(s).",
+    )
+    parser.add_argument(
+        "folders", action="store", nargs="+", help="The folder(s) to watch."
+    )
+    parser.add_argument(
+        "-p",
+        "--pattern",
+        default=WATCH_PATTERN,
+        help="File name pattern to import, e.g. '*.xml.gz', '*.zip' or '*.acmi' (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=WATCH_POLL_INTERVAL,
+        help="Seconds between checks of the folders and of files being written (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-s",
+        "--settle",
+        type=float,
+        default=WATCH_SETTLE_SECONDS,
+        help="Seconds a file must stay unchanged before it is imported (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Always poll the folders, even if the watchdog package is installed.",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Import the files already in the folders, then exit.",
+    )
+    parser.add_argument(
+        "-d",
+        "--duplicates",
+        choices=DUPLICATE_POLICIES,
+        default=DUPLICATE_MISSION_POLICY,
+        help="What to do when a mission is already in the database (default: %(default)s).",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Enable verbose logging to console.",
+    )
+    return parser.parse_args(argv)
+
+
+def parse_query_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="tacview2db.py query",
+        description="Run a read-only SQL query across the shard databases, as if they were one database. "
+        "Without a query, list the shards in the catalog.",
+    )
+    parser.add_argument(
+        "sql",
+        action="store",
+        nargs="?",
+        help="The SQL query. Mission, Event, PrimaryObject, SecondaryObject and ParentObject "
+        "combine every shard and have an extra shard column.",
+    )
+    parser.add_argument(
+        "-s",
+        "--shard",
+        action="append",
+        metavar="KEY",
+        help="Only query this shard. Can be given more than once (default: all shards).",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Enable verbose logging to console.",
+    )
+    return parser.parse_args(argv)
+
+
+def get_database_path(backend: str = "sqlite"):
+    """
+    Return the configured database path of a backend relative to the script location.
+    This ensures database is properly located regardless of where script is called from.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    # Imported from config module
+    database_file = DUCKDB_DATABASE_NAME if backend == "duckdb" else DATABASE_NAME
+    return os.path.join(current_dir, database_file)
+
+
+def get_catalog_paths():
+    """
+    Return the configured shard catalog and shard directory paths relative to the script location.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, CATALOG_NAME), os.path.join(
+        current_dir, SHARD_DIRECTORY
+    )
+
+
+def migrate_databases(argv):
+    """
+    Entry point for the migrate command.
+
+    Args:
+        argv: Command line arguments following 'migrate'
+
+    Returns:
+        The process exit code, non-zero if a query plan check failed
+    """
+    from colorama import Fore, Style
+
+    args = parse_migrate_args(argv)
+    setup_logging(args.verbose)
+    exit_code = 0
+
+    for database_path in args.databases or [get_database_path()]:
+        db = Database(database_path)
+        version = db.create_required_tables()
+        print(
+            f"{database_path}: schema version {Fore.YELLOW}{version}{Style.RESET_ALL}"
+        )
+
+        if args.normalise:
+            if normalise_storage(db.conn):
+                print(
+                    f"  {Fore.GREEN}Converted to normalised storage.{Style.RESET_ALL}"
+                )
+            else:
+                print("  Already uses normalised storage.")
+
+        if args.vacuum:
+            if enable_incremental_vacuum(db.conn):
+                print(f"  {Fore.GREEN}Incremental vacuum enabled.{Style.RESET_ALL}")
+            else:
+                print("  Already uses incremental vacuum.")
+
+        if args.check_plans:
+            for name, plan, uses_indexes in check_query_plans(db.conn):
+                status = f"{Fore.GREEN}OK" if uses_indexes else f"{Fore.RED}FULL SCAN"
+                print(f"  {status}{Style.RESET_ALL} {name}")
+                for detail in plan:
+                    print(f"      {detail}")
+                if not uses_indexes:
+                    exit_code = 1
+
+        db.close_connection()
+
+    return exit_code
+
+
+def watch_folders(argv):
+    """
+    Entry point for the watch command.
+
+    Args:
+        argv: Command line arguments following 'watch'
+
+    Returns:
+        The process exit code
+    """
+    from colorama import Fore, Style
+    from services.folder_watcher import FolderWatcher
+
+    args = parse_watch_args(argv)
+    setup_logging(args.verbose)
+
+    def report(source: str, mission_id: int, error: Exception):
+        if error is None:
+            print(
+                f"Imported {Fore.YELLOW}{source}{Style.RESET_ALL} as mission {mission_id}."
+            )
+        else:
+            print(f"{Fore.RED}Failed to import {source}: {error}{Style.RESET_ALL}")
+
+    # The connection stays open for as long as the watcher runs.
+    db = Database(get_database_path())
+    watcher = FolderWatcher(
+        db,
+        args.folders,
+        args.pattern,
+        args.interval,
+        args.settle,
+        args.duplicates,
+        use_native=not args.poll,
+        report=report,
+    )
+    if not args.once:
+        print(
+            f"Watching {Fore.YELLOW}{', '.join(watcher.folders)}{Style.RESET_ALL} for {args.pattern}. Press Ctrl+C to stop."
+        )
+    watcher.run(once=args.once)
+    print(f"Imported {Fore.YELLOW}{watcher.imported_count}{Style.RESET_ALL} files.")
+    db.close_connection()
+    return 0
+
+
+def query_shards(argv):
+    """
+    Entry point for the query command.
+
+    Args:
+        argv: Command line arguments following 'query'
+
+    Returns:
+        The process exit code, non-zero if the query could not be run
+    """
+    import sqlite3
+
+    from models.shards import FederatedQuery, ShardCatalog
+
+    args = parse_query_args(argv)
+    setup_logging(args.verbose)
+
+    catalog = ShardCatalog(*get_catalog_paths())
+    try:
+        if not args.sql:
+            print("key\tkind\tmissions\tevents\tpath")
+            for _, key, kind, path, missions, events in catalog.shards(args.shard):
+                print(f"{key}\t{kind}\t{missions}\t{events}\t{path}")
+            return 0
+
+        with FederatedQuery(catalog, args.shard) as query:
+            cursor = query.execute(args.sql)
+            print("\t".join(column[0] for column in cursor.description or ()))
+            for row in cursor:
+                print("\t".join("" if value is None else str(value) for value in row))
+    except (ValueError, sqlite3.Error) as error:
+        logging.error(str(error))
+        print(error, file=sys.stderr)
+        return 1
+    finally:
+        catalog.close()
+    return 0
 
 
 def setup_logging(verbose_logging):
@@ -45,19 +462,19 @@ def setup_logging(verbose_logging):
     This function sets up:
     1. File logging (always enabled, writes to app.log)
     2. Console logging (only when verbose_logging is True)
+
+    Records are written by a background thread (see models/tacview_logging.py),
+    so logging at DEBUG level does not hold up an import.
     """
-    # Set up logging configuration with a file handler by default
-    # Level DEBUG ensures all log messages are captured
+    # Imported here so the logging handlers are not loaded at start-up.
+    from models.tacview_logging import start_logging
+
     # The 'w' mode overwrites previous log files on each run
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s %(levelname)s %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[
-            logging.FileHandler("app.log", mode="w"),
-            # logging.StreamHandler(),  # Commented out to prevent duplicate logs
-        ],
+    file_handler = logging.FileHandler("app.log", mode="w")
+    file_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s %(message)s", "%Y-%m-%d %H:%M:%S")
     )
+    handlers = [file_handler]
 
     # Only add console logging if verbose flag was set
     if verbose_logging:
@@ -66,8 +483,89 @@ def setup_logging(verbose_logging):
         # Define the format for console messages
         formatter = logging.Formatter("%(asctime)s -  %(levelname)s - %(message)s")
         console.setFormatter(formatter)
-        # Add the console handler to the root logger
-        logging.getLogger("").addHandler(console)
+        handlers.append(console)
+
+    # Level DEBUG ensures all log messages are captured
+    start_logging(handlers, logging.DEBUG)
+
+
+def print_summary(args, stats: tuple[int], seconds: float, profiler: StageProfiler):
+    """
+    Print the coloured summary shown at the end of a command line import.
+    """
+    from colorama import Fore, Style
+
+    print("-" * 80)
+    print(f"{Fore.GREEN}*** Export to database complete! ***")
+    print(
+        f"Processed {Fore.YELLOW}{stats[0]}{Fore.GREEN} of {Fore.YELLOW}{stats[1]}{Fore.GREEN} files in {Fore.YELLOW}{seconds:.3f}{Fore.GREEN} seconds.{Style.RESET_ALL} "
+    )
+    if profiler:
+        print("-" * 80)
+        for line in profiler.summary():
+            print(line)
+        print(f"Stage timings written to {Fore.YELLOW}{args.profile}{Style.RESET_ALL}")
+    if args.pstats:
+        print(
+            f"cProfile statistics written to {Fore.YELLOW}{args.pstats}{Style.RESET_ALL}"
+        )
+    print(
+        f"{Fore.MAGENTA}Please refer to app.log file for more detailed information.{Style.RESET_ALL}"
+    )
+
+
+def import_sharded_files(args):
+    """
+    Import the files given on the command line into shard databases.
+
+    Returns:
+        The process exit code
+    """
+    from models.shards import ShardCatalog
+    from services.sharding import process_sharded_files
+
+    if not args.quiet:
+        from art import tprint
+
+        tprint("tacview2db", font="tarty1")
+    profiler = StageProfiler() if args.profile else None
+    if args.pstats:
+        import cProfile
+
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    start = time.perf_counter()
+
+    catalog = ShardCatalog(*get_catalog_paths())
+    try:
+        stats = process_sharded_files(
+            catalog,
+            args.cleardb,
+            args.files,
+            args.shard_by,
+            args.campaign,
+            args.jobs,
+            args.force,
+            args.duplicates,
+            profiler,
+            args.quiet,
+            args.sqlite_profile,
+            args.pipeline_depth,
+            args.pipeline_batch,
+            args.checkpoint_every,
+        )
+    finally:
+        catalog.close()
+    end = time.perf_counter()
+
+    if args.pstats:
+        cprofile.disable()
+        cprofile.dump_stats(args.pstats)
+    if profiler:
+        profiler.write_report(args.profile)
+    if not args.quiet:
+        print_summary(args, stats, end - start, profiler)
+    return 0
 
 
 def main(argv):
@@ -82,48 +580,111 @@ def main(argv):
     2. Logging setup
     3. Database initialization
     4. Choosing between CLI or GUI mode based on arguments
+
+    Returns:
+        The process exit code
     """
+    # Subcommands are recognised by the first argument, everything else is a file import.
+    if argv and argv[0] == "migrate":
+        return migrate_databases(argv[1:])
+    if argv and argv[0] == "watch":
+        return watch_folders(argv[1:])
+    if argv and argv[0] == "query":
+        return query_shards(argv[1:])
+
     # Parse command-line arguments
-    args = parse_command_line_args()
+    args = parse_command_line_args(argv)
 
     # Configure the logging based on verbose flag
     setup_logging(args.verbose)
 
-    # Set up database path relative to script location
-    # This ensures database is properly located regardless of where script is called from
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    database_file = DATABASE_NAME  # Imported from config module
-    database_path = os.path.join(current_dir, database_file)
+    if args.shard_by and args.files:
+        return import_sharded_files(args)
 
-    # Create a database connection
-    db = Database(database_path)
+    # Create a database connection. The GUI imports on a second connection, so it always uses the safe profile.
+    try:
+        db = open_database(
+            get_database_path(args.backend),
+            args.backend,
+            args.sqlite_profile if args.files else "safe",
+        )
+    except ImportError as error:
+        logging.error(str(error))
+        print(error, file=sys.stderr)
+        return 1
 
     # Set start time of processing to calculate total time taken.
     start = time.perf_counter()
 
+    if args.delete_mission:
+        try:
+            deleted = delete_missions(db, args.delete_mission)
+        except ValueError as error:
+            logging.error(str(error))
+            print(error, file=sys.stderr)
+            db.close_connection()
+            return 1
+        if not args.quiet:
+            print(f"Deleted mission(s) {', '.join(map(str, deleted))}.")
+
     # This code is for determining if the user wants to launch UI or command line.
     # Providing no arguments assumes the UI is required.
     if args.files:
-        tprint("tacview2db", font="tarty1")
+        if not args.quiet:
+            # art is only imported for the banner.
+            from art import tprint
+
+            tprint("tacview2db", font="tarty1")
+        profiler = StageProfiler() if args.profile else None
+        if args.pstats:
+            import cProfile
+
+            cprofile = cProfile.Profile()
+            cprofile.enable()
+
         # Files provided through command-line arguments
-        stats = process_all_tacview_files(db, args.cleardb, args.files)
+        stats = process_all_tacview_files(
+            db,
+            args.cleardb,
+            args.files,
+            args.jobs,
+            args.force,
+            args.duplicates,
+            profiler,
+            args.quiet,
+            args.pipeline_depth,
+            args.pipeline_batch,
+            args.checkpoint_every,
+        )
         end = time.perf_counter()
 
-        print("-" * 80)
-        print(f"{Fore.GREEN}*** Export to database complete! ***")
-        print(
-            f"Processed {Fore.YELLOW}{stats[0]}{Fore.GREEN} of {Fore.YELLOW}{stats[1]}{Fore.GREEN} files in {Fore.YELLOW}{end - start:.3f}{Fore.GREEN} seconds.{Style.RESET_ALL} "
-        )
-        print(
-            f"{Fore.MAGENTA}Please refer to app.log file for more detailed information.{Style.RESET_ALL}"
-        )
-    else:
-        # No files provided, run the UI
+        if args.pstats:
+            cprofile.disable()
+            cprofile.dump_stats(args.pstats)
+        if profiler:
+            profiler.write_report(args.profile)
+
+        if not args.quiet:
+            print_summary(args, stats, end - start, profiler)
+    elif not args.delete_mission:
+        # No files provided, run the UI. Tk is only needed here, so headless installs can leave it out.
+        try:
+            from views.tacview_gui_grid import TacviewGUIGrid
+        except ImportError as error:
+            logging.error(f"The GUI could not be started. Error: {error}")
+            print(
+                "The GUI needs Tk (the tkinter module), which is not installed. "
+                "Pass XML files to import them from the command line.",
+                file=sys.stderr,
+            )
+            db.close_connection()
+            return 1
         gui = TacviewGUIGrid(db)
         gui.run()
 
-    db.close_connection
+    db.close_connection()
+    return 0
 
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    sys.exit(main(sys.argv[1:]))
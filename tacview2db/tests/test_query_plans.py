@@ -0,0 +1,38 @@
+"""
+The dashboard queries must reach the event and object tables through their
+indexes, as tacview2db.py --check-plans reports for an existing database.
+"""
+
+import sqlite3
+
+import pytest
+
+from models.schema import DASHBOARD_QUERIES, SCHEMA_VERSION, check_query_plans, migrate
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(tmp_path / "plans.db")
+    assert migrate(conn) == SCHEMA_VERSION
+    yield conn
+    conn.close()
+
+
+def test_no_full_scans(conn):
+    results = check_query_plans(conn)
+
+    assert [name for name, _, _ in results] == list(DASHBOARD_QUERIES)
+    full_scans = {
+        name: plan for name, plan, uses_indexes in results if not uses_indexes
+    }
+    assert full_scans == {}
+
+
+def test_full_scan_is_reported(conn):
+    # Without it, the lookups of events by action scan the Event or PrimaryObject table.
+    conn.execute("DROP INDEX idx_event_action")
+
+    full_scans = [
+        name for name, _, uses_indexes in check_query_plans(conn) if not uses_indexes
+    ]
+    assert "Units destroyed with type" in full_scans
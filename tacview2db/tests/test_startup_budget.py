@@ -0,0 +1,25 @@
+"""
+The command line must start within its budget, without loading the GUI or
+the modules only some commands need, as benchmarks.startup_budget checks.
+"""
+
+from benchmarks.startup_budget import LAZY_MODULES, STARTUP_BUDGET_MS, measure_import
+
+
+def test_import_within_budget():
+    # The fastest of a few imports, as the first may wait on a cold disk cache.
+    milliseconds = min(measure_import()[0] for _ in range(5))
+    assert milliseconds <= STARTUP_BUDGET_MS
+
+
+def test_lazy_modules_not_loaded():
+    for module in ("tkinter", "views.tacview_gui_grid", "art", "tqdm"):
+        assert module in LAZY_MODULES
+
+    _, loaded = measure_import()
+    assert loaded == []
+
+
+def test_import_without_tkinter():
+    # Raises CalledProcessError if the import needs Tk, as on a headless install.
+    measure_import(block_tk=True)
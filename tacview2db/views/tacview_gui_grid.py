@@ -1,14 +1,22 @@
 import tkinter as tk
 from tkinter.ttk import Progressbar
 from tkinter import filedialog
-from services.tacview_engine import process_tacview_file
+from services.ingest_worker import IngestWorker
 from models.database import Database
+from models.sources import expand_sources, source_exists, source_size
+from models.tacview_logging import TVLogger
 
+import logging
 import os
-import time
+import queue
+
+from config import GUI_LOG_LINES
 
 
 class TacviewGUIGrid:
+    # How often the window checks the background worker for progress.
+    POLL_INTERVAL_MS = 100
+
     def __init__(self, db: Database):
         self.window = tk.Tk()
         self.window.title("Tacview2db")
@@ -23,12 +31,19 @@ class TacviewGUIGrid:
             (screenheight - height) / 2,
         )
         self.window.geometry(alignstr)
+        self.window.protocol("WM_DELETE_WINDOW", self.quit)
         # self.window.resizable(width=False, height=False)
 
         self.clear_database_var = tk.BooleanVar()
         self.db = db
+        self.worker = None
         self.create_widgets()
 
+        # Warnings and errors logged by any thread are shown in the log view when the window polls.
+        self.log_handler = TVLogger(GUI_LOG_LINES)
+        self.log_handler.setLevel(logging.WARNING)
+        logging.getLogger().addHandler(self.log_handler)
+
     def create_widgets(self):
         # Label for files listbox
         lblFiles = tk.Label(self.window, text="Files for Processing", anchor="w")
@@ -59,10 +74,21 @@ class TacviewGUIGrid:
         clear_database_checkbox.grid(row=2, column=0, padx=10, pady=5, sticky="w")
 
         # Process Button
-        btnProcess = tk.Button(
+        self.btnProcess = tk.Button(
             self.window, text="Process Files", command=self.process_files
         )
-        btnProcess.grid(row=3, column=0, columnspan=2, padx=10, pady=5, sticky="nsew")
+        self.btnProcess.grid(
+            row=3, column=0, columnspan=2, padx=10, pady=5, sticky="nsew"
+        )
+
+        # Cancel Button, rolls back the file being processed
+        self.btnCancel = tk.Button(
+            self.window,
+            text="Cancel",
+            command=self.cancel_processing,
+            state=tk.DISABLED,
+        )
+        self.btnCancel.grid(row=3, column=2, padx=10, pady=5, sticky="nw")
 
         # Label for Log Messages
         lblLogMsgs = tk.Label(self.window, text="Log Messages", anchor="w")
@@ -76,13 +102,22 @@ class TacviewGUIGrid:
         self.pgBar = Progressbar(self.window, mode="determinate")
         self.pgBar.grid(row=6, column=0, columnspan=2, padx=10, pady=5, sticky="nsew")
 
+        # Throughput of the running import
+        self.lblThroughput = tk.Label(self.window, text="", anchor="w")
+        self.lblThroughput.grid(row=7, column=0, padx=10, sticky="w")
+
         # Quit Button
-        btnQuit = tk.Button(self.window, text="Quit", command=self.window.quit)
+        btnQuit = tk.Button(self.window, text="Quit", command=self.quit)
         btnQuit.grid(row=7, column=2, padx=10, pady=10, sticky="e")
 
     def open_file_dialog(self):
         file_paths = filedialog.askopenfilenames(
-            filetypes=[("XML Files", "*.xml")], multiple=True
+            filetypes=[
+                ("Tacview XML Files", "*.xml *.xml.gz *.xml.bz2 *.xml.xz *.zip"),
+                ("XML Files", "*.xml"),
+                ("Tacview ACMI Recordings", "*.acmi *.acmi.gz *.acmi.bz2 *.acmi.xz"),
+            ],
+            multiple=True,
         )
         for file_path in file_paths:
             self.lstFiles.insert(tk.END, file_path)
@@ -93,38 +128,117 @@ class TacviewGUIGrid:
     def process_files(self):
         # self.lstLogMsgs.delete(0, tk.END)
         file_paths = self.lstFiles.get(0, tk.END)
+        if not file_paths or self.worker is not None:
+            return
         clear_database = self.clear_database_var.get()
-        start = time.perf_counter()
 
         if clear_database:
-            # Clear the database
-            self.lstLogMsgs.insert(
-                tk.END, "WARNING: Option to clear database selected.\n"
+            self.log("WARNING: Option to clear database selected.\n")
+
+        # Each export in a zip archive is imported as a file of its own.
+        file_paths = expand_sources(file_paths)
+        total_bytes = sum(
+            source_size(file_path)
+            for file_path in file_paths
+            if source_exists(file_path)
+        )
+        self.pgBar["maximum"] = total_bytes or 1
+        self.pgBar["value"] = 0
+
+        # Files are processed on a background thread with its own database connection.
+        # The window polls the worker's message queue so it stays responsive.
+        self.worker = IngestWorker(self.db.database_file, file_paths, clear_database)
+        self.btnProcess["state"] = tk.DISABLED
+        self.btnCancel["state"] = tk.NORMAL
+        self.worker.start()
+        self.window.after(self.POLL_INTERVAL_MS, self.poll_worker)
+
+    def cancel_processing(self):
+        if self.worker is not None:
+            self.log("Cancelling...\n")
+            self.btnCancel["state"] = tk.DISABLED
+            self.worker.cancel()
+
+    def poll_worker(self):
+        """
+        Apply the messages the worker has queued since the last poll, then poll again
+        until the worker has finished.
+        """
+        finished = False
+        try:
+            while True:
+                kind, payload = self.worker.messages.get_nowait()
+                finished = self.handle_worker_message(kind, payload) or finished
+        except queue.Empty:
+            pass
+        self.show_log_records()
+
+        if finished:
+            self.worker = None
+            self.btnProcess["state"] = tk.NORMAL
+            self.btnCancel["state"] = tk.DISABLED
+        else:
+            self.window.after(self.POLL_INTERVAL_MS, self.poll_worker)
+
+    def handle_worker_message(self, kind: str, payload) -> bool:
+        """
+        Update the window for one worker message. Returns True once the worker has finished.
+        """
+        if kind == "file":
+            number, file = payload
+            self.log(
+                f"Processing {file} ({number} of {len(self.worker.filenames)})...\n"
             )
-            self.db.clear_table_data()
-
-        total_bytes = sum(os.path.getsize(file_path) for file_path in file_paths)
-        self.pgBar["maximum"] = total_bytes
-
-        for file in file_paths:
-            file_size = os.path.getsize(file)
-
-            result = f"Processing {file}...\n"
-            self.lstLogMsgs.insert(tk.END, result)
-            self.window.update()
-            # self.window.update_idletasks()
-
-            process_tacview_file(self.db, file)
-
-            self.lstLogMsgs.insert(tk.END, "Finished processing.\n")
-            self.window.update()
-
-            self.pgBar["value"] += file_size
-            self.window.update()
-
-        end = time.perf_counter()
-        msg = f"Files processed in {end - start:.3f} seconds."
-        self.lstLogMsgs.insert(tk.END, msg)
+        elif kind == "skipped":
+            self.log("Skipped, already imported and unchanged.\n")
+        elif kind == "progress":
+            events, bytes_done, rate = payload
+            self.pgBar["value"] = bytes_done
+            self.lblThroughput["text"] = f"{events} events, {rate:,.0f} events/s"
+        elif kind == "file_done":
+            file, events = payload
+            self.log(f"Finished processing, {events} events written.\n")
+        # A failed or cancelled file is reported by the error or warning the worker logs.
+        elif kind == "finished":
+            self.show_log_records()
+            files, seconds, profiler = payload
+            msg = f"{files} files processed in {seconds:.3f} seconds.\n"
+            self.log(msg)
+            self.log("Time per stage:\n")
+            for line in profiler.summary():
+                self.log(f"  {line}\n")
+            self.pgBar["value"] = self.pgBar["maximum"] if files else 0
+            return True
+        self.lstLogMsgs.see(tk.END)
+        return False
+
+    def log(self, text: str):
+        """
+        Add text to the end of the log view, keeping only its last GUI_LOG_LINES lines,
+        so the widget does not slow down as it grows.
+        """
+        self.lstLogMsgs.insert(tk.END, text)
+        # The view always ends with an empty line after the last newline.
+        lines = int(self.lstLogMsgs.index("end-1c").split(".")[0])
+        if lines - 1 > GUI_LOG_LINES:
+            self.lstLogMsgs.delete("1.0", f"{lines - GUI_LOG_LINES}.0")
+
+    def show_log_records(self):
+        """
+        Add the records logged since the last poll to the log view.
+        """
+        lines = self.log_handler.drain()
+        if lines:
+            self.log("".join(f"{line}\n" for line in lines))
+            self.lstLogMsgs.see(tk.END)
+
+    def quit(self):
+        # Roll back any file in progress before the window closes.
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker.join()
+        logging.getLogger().removeHandler(self.log_handler)
+        self.window.quit()
 
     def run(self):
         self.window.mainloop()